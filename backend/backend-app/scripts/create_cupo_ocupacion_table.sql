@@ -0,0 +1,27 @@
+-- Script SQL para crear los contadores materializados de ocupación de cupos
+CREATE TABLE IF NOT EXISTS cupo_ocupacion (
+    convocatoria VARCHAR(20) NOT NULL,
+    municipio_slug VARCHAR(120) NOT NULL,  -- '*' = total de la convocatoria
+    estado_cuenta VARCHAR(20) NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (convocatoria, municipio_slug, estado_cuenta)
+);
+
+-- Carga inicial desde la tabla de usuarios (equivale a scripts/reconciliar_cupos.py)
+BEGIN;
+LOCK TABLE cupo_ocupacion IN EXCLUSIVE MODE;
+DELETE FROM cupo_ocupacion;
+INSERT INTO cupo_ocupacion (convocatoria, municipio_slug, estado_cuenta, total)
+SELECT convocatoria, municipio, estado_cuenta, count(*)
+FROM "user"
+WHERE convocatoria IS NOT NULL AND municipio IS NOT NULL AND estado_cuenta IS NOT NULL
+GROUP BY convocatoria, municipio, estado_cuenta
+UNION ALL
+SELECT convocatoria, '*', estado_cuenta, count(*)
+FROM "user"
+WHERE convocatoria IS NOT NULL AND municipio IS NOT NULL AND estado_cuenta IS NOT NULL
+GROUP BY convocatoria, estado_cuenta;
+COMMIT;
+
+COMMENT ON TABLE cupo_ocupacion IS 'Usuarios por convocatoria, municipio y estado de cuenta (mantenido por la aplicación)';
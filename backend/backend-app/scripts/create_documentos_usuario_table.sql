@@ -0,0 +1,29 @@
+-- Script SQL para crear el almacén de documentos de usuario
+-- Los bytes se guardan una sola vez por hash SHA-256 (deduplicación)
+CREATE TABLE IF NOT EXISTS documento_contenido (
+    sha256 VARCHAR(64) PRIMARY KEY,
+    contenido BYTEA NOT NULL,
+    tamano_bytes BIGINT NOT NULL,
+    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+-- Enlace (usuario, tipo de documento) -> contenido
+CREATE TABLE IF NOT EXISTS documento_usuario (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES "user"(id) ON DELETE CASCADE,
+    doc_type VARCHAR(60) NOT NULL,
+    nombre VARCHAR(255),
+    sha256 VARCHAR(64) NOT NULL REFERENCES documento_contenido(sha256),
+    tamano_bytes BIGINT NOT NULL,
+    mime_type VARCHAR(100),
+    fecha_subida TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    CONSTRAINT uq_documento_usuario_user_tipo UNIQUE (user_id, doc_type)
+);
+
+-- Crear índices para mejorar el rendimiento
+CREATE INDEX IF NOT EXISTS ix_documento_usuario_user_id ON documento_usuario(user_id);
+CREATE INDEX IF NOT EXISTS ix_documento_usuario_sha256 ON documento_usuario(sha256);
+
+-- Comentarios para documentar las tablas
+COMMENT ON TABLE documento_contenido IS 'Contenido binario de documentos direccionado por SHA-256';
+COMMENT ON TABLE documento_usuario IS 'Documentos adjuntos de cada usuario por tipo (rut_pdf, cedula_pdf, ...)';
@@ -0,0 +1,14 @@
+-- Script SQL para crear el inventario del bucket de almacenamiento
+-- Una fila por prefijo (directorio de la clave); se llena con scripts/reconstruir_inventario.py
+CREATE TABLE IF NOT EXISTS inventario_almacenamiento (
+    prefijo VARCHAR(500) PRIMARY KEY,
+    objetos BIGINT NOT NULL DEFAULT 0,
+    bytes BIGINT NOT NULL DEFAULT 0,
+    fecha_actualizacion TIMESTAMP NOT NULL DEFAULT now()
+);
+
+-- Totales por prefijo superior (prefijo LIKE 'content/video/%')
+CREATE INDEX IF NOT EXISTS ix_inventario_almacenamiento_prefijo_patron
+    ON inventario_almacenamiento (prefijo varchar_pattern_ops);
+
+COMMENT ON TABLE inventario_almacenamiento IS 'Objetos y bytes del bucket por prefijo; se actualiza con cada subida y eliminación';
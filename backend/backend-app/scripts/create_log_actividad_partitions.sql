@@ -0,0 +1,84 @@
+-- Script SQL para particionar log_actividad por mes (PostgreSQL 11+)
+-- Convierte la tabla existente: la renombra, crea la tabla particionada con el
+-- mismo nombre, copia las filas y elimina la anterior. Ejecutar una vez, en una
+-- ventana sin tráfico (psql -f); después, scripts/mantener_log_actividad.py
+-- crea las particiones futuras y elimina las que superan la retención.
+
+-- Crea (si falta) la partición del mes que contiene `mes`. Las filas de ese mes
+-- que hayan caído en la partición por defecto se mueven antes de adjuntarla.
+CREATE OR REPLACE FUNCTION log_actividad_crear_particion(mes DATE) RETURNS TEXT AS $$
+DECLARE
+    inicio DATE := date_trunc('month', mes)::DATE;
+    fin DATE := (date_trunc('month', mes) + INTERVAL '1 month')::DATE;
+    nombre TEXT := 'log_actividad_p' || to_char(mes, 'YYYYMM');
+BEGIN
+    IF to_regclass(nombre) IS NOT NULL THEN
+        RETURN nombre;
+    END IF;
+    EXECUTE format('CREATE TABLE %I (LIKE log_actividad INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', nombre);
+    IF to_regclass('log_actividad_default') IS NOT NULL THEN
+        EXECUTE format(
+            'WITH movidas AS (DELETE FROM log_actividad_default WHERE fecha >= %L AND fecha < %L RETURNING *) '
+            'INSERT INTO %I SELECT * FROM movidas', inicio, fin, nombre
+        );
+    END IF;
+    EXECUTE format('ALTER TABLE log_actividad ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', nombre, inicio, fin);
+    RETURN nombre;
+END;
+$$ LANGUAGE plpgsql;
+
+BEGIN;
+LOCK TABLE log_actividad IN ACCESS EXCLUSIVE MODE;
+
+ALTER TABLE log_actividad RENAME TO log_actividad_anterior;
+-- La secuencia de ids se conserva para la tabla nueva
+ALTER SEQUENCE log_actividad_id_seq OWNED BY NONE;
+
+-- Los índices no cambian de nombre con la tabla. Si db.create_all() ya la creó
+-- con LogActividad.__table_args__ (instalación nueva), sus nombres chocarían
+-- con los de la tabla particionada: se eliminan (la tabla anterior solo se lee
+-- una vez, completa) y se renombra la clave primaria.
+DROP INDEX IF EXISTS ix_log_actividad_usuario_accion_fecha;
+DROP INDEX IF EXISTS ix_log_actividad_usuario_fecha;
+DROP INDEX IF EXISTS ix_log_actividad_accion_fecha;
+DROP INDEX IF EXISTS ix_log_actividad_fecha_id;
+ALTER INDEX IF EXISTS log_actividad_pkey RENAME TO log_actividad_anterior_pkey;
+
+CREATE TABLE log_actividad (
+    id INTEGER NOT NULL DEFAULT nextval('log_actividad_id_seq'),
+    usuario_id INTEGER NULL,
+    accion VARCHAR(100) NOT NULL,
+    detalles TEXT NULL,
+    fecha TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, fecha)
+) PARTITION BY RANGE (fecha);
+ALTER SEQUENCE log_actividad_id_seq OWNED BY log_actividad.id;
+
+-- Índices en la tabla padre: PostgreSQL los crea en cada partición
+-- (coinciden con LogActividad.__table_args__)
+CREATE INDEX ix_log_actividad_usuario_accion_fecha ON log_actividad (usuario_id, accion, fecha);
+CREATE INDEX ix_log_actividad_usuario_fecha ON log_actividad (usuario_id, fecha);
+CREATE INDEX ix_log_actividad_accion_fecha ON log_actividad (accion, fecha);
+CREATE INDEX ix_log_actividad_fecha_id ON log_actividad (fecha, id);
+
+-- Red de seguridad para fechas sin partición (se vacía al crear la partición)
+CREATE TABLE log_actividad_default PARTITION OF log_actividad DEFAULT;
+
+-- Una partición por cada mes con datos y por los próximos 3 meses
+SELECT log_actividad_crear_particion(mes::DATE)
+FROM generate_series(
+    date_trunc('month', COALESCE((SELECT min(fecha) FROM log_actividad_anterior), NOW())),
+    date_trunc('month', NOW()) + INTERVAL '3 months',
+    INTERVAL '1 month'
+) AS mes;
+
+INSERT INTO log_actividad (id, usuario_id, accion, detalles, fecha)
+SELECT id, usuario_id, accion, detalles, COALESCE(fecha, NOW())
+FROM log_actividad_anterior;
+
+DROP TABLE log_actividad_anterior;
+COMMIT;
+
+ANALYZE log_actividad;
+
+COMMENT ON TABLE log_actividad IS 'Registro de actividad particionado por mes (fecha); retención por particiones';
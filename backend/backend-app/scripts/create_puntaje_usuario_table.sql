@@ -0,0 +1,38 @@
+-- Script SQL para crear el puntaje materializado de cada usuario
+CREATE TABLE IF NOT EXISTS puntaje_usuario (
+    usuario_id INTEGER PRIMARY KEY REFERENCES "user"(id) ON DELETE CASCADE,
+    puntaje_total NUMERIC(7, 2) NOT NULL DEFAULT 0,
+    criterios_evaluados INTEGER NOT NULL DEFAULT 0,
+    evaluacion_completa BOOLEAN NOT NULL DEFAULT FALSE,
+    fecha_inscripcion TIMESTAMP,  -- copia de user.fecha_creacion (desempate)
+    fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Índice que coincide con el ORDER BY del ranking
+CREATE INDEX IF NOT EXISTS idx_puntaje_usuario_ranking
+    ON puntaje_usuario (puntaje_total DESC, fecha_inscripcion ASC NULLS FIRST, usuario_id);
+
+-- Carga inicial (equivale a scripts/recalcular_puntajes.py)
+BEGIN;
+LOCK TABLE puntaje_usuario IN EXCLUSIVE MODE;
+INSERT INTO puntaje_usuario (usuario_id, puntaje_total, criterios_evaluados,
+                             evaluacion_completa, fecha_inscripcion, fecha_actualizacion)
+SELECT u.id,
+       COALESCE(round(sum(e.puntaje::numeric / c.max_puntaje * c.peso), 2), 0),
+       count(e.id),
+       count(e.id) = (SELECT count(*) FROM criterios_evaluacion WHERE activo),
+       u.fecha_creacion,
+       now()
+FROM "user" u
+LEFT JOIN evaluaciones e ON e.usuario_id = u.id
+LEFT JOIN criterios_evaluacion c ON c.id = e.criterio_id
+GROUP BY u.id, u.fecha_creacion
+ON CONFLICT (usuario_id) DO UPDATE SET
+    puntaje_total = EXCLUDED.puntaje_total,
+    criterios_evaluados = EXCLUDED.criterios_evaluados,
+    evaluacion_completa = EXCLUDED.evaluacion_completa,
+    fecha_inscripcion = EXCLUDED.fecha_inscripcion,
+    fecha_actualizacion = EXCLUDED.fecha_actualizacion;
+COMMIT;
+
+COMMENT ON TABLE puntaje_usuario IS 'Puntaje ponderado por usuario (mantenido por la aplicación)';
@@ -0,0 +1,26 @@
+-- Script SQL para crear la cola de exportaciones en segundo plano
+CREATE TABLE IF NOT EXISTS trabajo_exportacion (
+    id SERIAL PRIMARY KEY,
+    tipo VARCHAR(40) NOT NULL,  -- usuarios, cupos, fases, rankings
+    estado VARCHAR(20) NOT NULL DEFAULT 'pendiente',  -- pendiente, en_proceso, completado, error
+    progreso INTEGER NOT NULL DEFAULT 0,
+    mensaje TEXT,
+    huella VARCHAR(64) NOT NULL,  -- sha256 del estado de los datos de origen
+    solicitado_por INTEGER REFERENCES "user"(id) ON DELETE SET NULL,
+    archivo BYTEA,
+    nombre_archivo VARCHAR(255),
+    mime_type VARCHAR(100),
+    tamano_bytes BIGINT,
+    worker VARCHAR(100),
+    intentos INTEGER NOT NULL DEFAULT 0,
+    fecha_creacion TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    fecha_inicio TIMESTAMP,
+    fecha_fin TIMESTAMP
+);
+
+-- Cola: SELECT ... WHERE estado = 'pendiente' ORDER BY id FOR UPDATE SKIP LOCKED
+CREATE INDEX IF NOT EXISTS idx_trabajo_exportacion_cola ON trabajo_exportacion (estado, id);
+-- Reutilización de resultados con la misma huella
+CREATE INDEX IF NOT EXISTS idx_trabajo_exportacion_huella ON trabajo_exportacion (tipo, huella);
+
+COMMENT ON TABLE trabajo_exportacion IS 'Exportaciones generadas por scripts/export_worker.py';
@@ -0,0 +1,20 @@
+-- Índices para el directorio de usuarios del administrador (GET /api/admin/users)
+-- CONCURRENTLY no bloquea escrituras; ejecutar fuera de una transacción (psql -f).
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Búsqueda "contiene" (ILIKE '%término%') por columna; el OR se resuelve con BitmapOr
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_nombre_trgm
+    ON "user" USING gin (nombre gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_apellido_trgm
+    ON "user" USING gin (apellido gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_email_trgm
+    ON "user" USING gin (email gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_numero_documento_trgm
+    ON "user" USING gin (numero_documento gin_trgm_ops);
+
+-- Paginación por cursor; coincide con ORDEN_DIRECTORIO (user_search_service.py)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_directorio
+    ON "user" (fecha_creacion DESC NULLS LAST, id DESC);
+
+-- Estadísticas al día para el conteo aproximado (EXPLAIN)
+ANALYZE "user";
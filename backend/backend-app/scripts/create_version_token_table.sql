@@ -0,0 +1,12 @@
+-- Script SQL para crear la versión de tokens JWT por usuario (revocación)
+-- Sin clave foránea a "user": la fila debe sobrevivir al borrado del usuario
+CREATE TABLE IF NOT EXISTS version_token (
+    usuario_id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0,
+    fecha_actualizacion TIMESTAMP NOT NULL DEFAULT now()
+);
+
+-- Lectura incremental de la caché de revocaciones (cambios recientes)
+CREATE INDEX IF NOT EXISTS ix_version_token_fecha_actualizacion ON version_token (fecha_actualizacion);
+
+COMMENT ON TABLE version_token IS 'Versión vigente de los tokens de cada usuario; se incrementa al cambiar rol o estado';
@@ -0,0 +1,81 @@
+"""
+Procesa la cola de exportaciones (tabla trabajo_exportacion).
+
+Uso:
+    python scripts/export_worker.py                  # 2 procesos, sondeo cada 5 s
+    python scripts/export_worker.py --procesos 4
+    python scripts/export_worker.py --una-vez        # vaciar la cola y terminar (cron)
+
+Cada proceso toma trabajos con SELECT ... FOR UPDATE SKIP LOCKED, así que se
+pueden ejecutar varios workers (incluso en máquinas distintas) sin duplicar trabajo.
+"""
+import argparse
+import multiprocessing
+import os
+import socket
+import sys
+import time
+
+# Asegurar que podamos importar src.*
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_APP_DIR = os.path.dirname(CURRENT_DIR)
+if BACKEND_APP_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_APP_DIR)
+
+# Cada cuántos ciclos se reencolan trabajos abandonados y se purgan los viejos
+CICLOS_MANTENIMIENTO = 60
+
+
+def ejecutar_worker(numero, intervalo, una_vez):
+    # La aplicación (y su pool de conexiones) se crea dentro de cada proceso
+    from src.main import app
+    from src.services import export_jobs
+
+    nombre = f'{socket.gethostname()}:{os.getpid()}:{numero}'
+    ciclo = 0
+    with app.app_context():
+        while True:
+            if ciclo % CICLOS_MANTENIMIENTO == 0 and numero == 0:
+                try:
+                    recuperados = export_jobs.recuperar_abandonados()
+                    purgados = export_jobs.purgar()
+                    if recuperados or purgados:
+                        print(f'[{nombre}] {recuperados} abandonados recuperados, {purgados} purgados')
+                except Exception as e:
+                    export_jobs.db.session.rollback()
+                    print(f'[{nombre}] Error en mantenimiento: {str(e)}')
+            ciclo += 1
+
+            try:
+                procesado = export_jobs.procesar_siguiente(nombre)
+            except Exception as e:
+                export_jobs.db.session.rollback()
+                print(f'[{nombre}] Error al procesar cola: {str(e)}')
+                procesado = False
+
+            if not procesado:
+                if una_vez:
+                    return
+                time.sleep(intervalo)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Worker de exportaciones en segundo plano')
+    parser.add_argument('--procesos', type=int, default=2, help='Número de procesos (default: 2)')
+    parser.add_argument('--intervalo', type=float, default=5, help='Segundos entre sondeos con la cola vacía')
+    parser.add_argument('--una-vez', action='store_true', help='Procesar lo pendiente y terminar')
+    args = parser.parse_args()
+
+    procesos = [
+        multiprocessing.Process(target=ejecutar_worker, args=(numero, args.intervalo, args.una_vez))
+        for numero in range(max(1, args.procesos))
+    ]
+    for proceso in procesos:
+        proceso.start()
+    try:
+        for proceso in procesos:
+            proceso.join()
+    except KeyboardInterrupt:
+        for proceso in procesos:
+            proceso.terminate()
+    print('OK: worker de exportaciones detenido')
@@ -0,0 +1,76 @@
+"""
+Mantiene las particiones mensuales de log_actividad (PostgreSQL).
+
+Uso:
+    python scripts/mantener_log_actividad.py          # crea las particiones de los próximos 3 meses
+    python scripts/mantener_log_actividad.py 24       # además elimina las de hace más de 24 meses
+
+Requiere haber ejecutado scripts/create_log_actividad_partitions.sql. Pensado
+para ejecutarse mensualmente (cron): eliminar una partición es instantáneo y
+no deja filas muertas, a diferencia de un DELETE sobre la tabla.
+"""
+import os
+import sys
+from datetime import date
+
+# Asegurar que podamos importar src.*
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_APP_DIR = os.path.dirname(CURRENT_DIR)
+if BACKEND_APP_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_APP_DIR)
+
+from src.main import app  # noqa: E402
+from src.models import db  # noqa: E402
+
+# Meses futuros con partición ya creada
+MESES_ADELANTE = 3
+
+
+def sumar_meses(fecha, meses):
+    total = fecha.year * 12 + fecha.month - 1 + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def crear_particiones(conexion, meses_adelante=MESES_ADELANTE):
+    """Crear las particiones del mes actual y de los siguientes `meses_adelante`"""
+    actual = date.today().replace(day=1)
+    return [
+        conexion.exec_driver_sql(
+            'SELECT log_actividad_crear_particion(%(mes)s)', {'mes': sumar_meses(actual, i)}
+        ).scalar()
+        for i in range(meses_adelante + 1)
+    ]
+
+
+def eliminar_particiones(conexion, meses_retencion):
+    """Separar y eliminar las particiones de meses anteriores a la retención"""
+    limite = sumar_meses(date.today().replace(day=1), -meses_retencion).strftime('log_actividad_p%Y%m')
+    particiones = conexion.exec_driver_sql(
+        """SELECT c.relname
+           FROM pg_inherits i
+           JOIN pg_class c ON c.oid = i.inhrelid
+           WHERE i.inhparent = 'log_actividad'::regclass
+             AND c.relname ~ '^log_actividad_p[0-9]{6}$'
+           ORDER BY c.relname"""
+    ).scalars().all()
+    eliminadas = [nombre for nombre in particiones if nombre < limite]
+    for nombre in eliminadas:
+        conexion.exec_driver_sql(f'ALTER TABLE log_actividad DETACH PARTITION "{nombre}"')
+        conexion.exec_driver_sql(f'DROP TABLE "{nombre}"')
+    return eliminadas
+
+
+if __name__ == '__main__':
+    meses_retencion = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    if meses_retencion is not None and meses_retencion < 1:
+        print('La retención debe ser de al menos 1 mes')
+        sys.exit(1)
+    with app.app_context():
+        try:
+            with db.engine.begin() as conexion:
+                creadas = crear_particiones(conexion)
+                eliminadas = eliminar_particiones(conexion, meses_retencion) if meses_retencion else []
+        except Exception as e:
+            print(f'Error al mantener particiones de log_actividad: {str(e)}')
+            sys.exit(1)
+        print(f"OK: particiones vigentes hasta {creadas[-1]}; eliminadas: {', '.join(eliminadas) or 'ninguna'}")
@@ -0,0 +1,65 @@
+"""
+Migra los documentos BYTEA de la tabla "user" al almacén documento_usuario.
+
+Uso:
+    python scripts/migrate_documentos_usuario.py            # copia los documentos
+    python scripts/migrate_documentos_usuario.py --purgar   # copia y vacía las columnas históricas
+
+La copia es idempotente: se puede ejecutar varias veces. Cada tipo de
+documento se migra en su propia transacción y el hash se calcula en
+PostgreSQL, de modo que los bytes nunca pasan por este proceso.
+"""
+import os
+import sys
+
+# Asegurar que podamos importar src.*
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_APP_DIR = os.path.dirname(CURRENT_DIR)
+if BACKEND_APP_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_APP_DIR)
+
+from src.main import app  # noqa: E402
+from src.models import db  # noqa: E402
+from src.constants.documentos import DOCUMENTOS_USUARIO  # noqa: E402
+
+SQL_TABLAS = os.path.join(CURRENT_DIR, 'create_documentos_usuario_table.sql')
+
+SQL_COPIAR_CONTENIDO = """
+    INSERT INTO documento_contenido (sha256, contenido, tamano_bytes)
+    SELECT DISTINCT ON (h) h, {col}, length({col})
+    FROM (SELECT encode(sha256({col}), 'hex') AS h, {col} FROM "user" WHERE {col} IS NOT NULL) t
+    ON CONFLICT (sha256) DO NOTHING
+"""
+
+SQL_COPIAR_ENLACE = """
+    INSERT INTO documento_usuario (user_id, doc_type, nombre, sha256, tamano_bytes)
+    SELECT id, '{col}', {col_nombre}, encode(sha256({col}), 'hex'), length({col})
+    FROM "user" WHERE {col} IS NOT NULL
+    ON CONFLICT (user_id, doc_type) DO NOTHING
+"""
+
+SQL_PURGAR = """
+    UPDATE "user" u SET {col} = NULL
+    FROM documento_usuario d
+    WHERE d.user_id = u.id AND d.doc_type = '{col}' AND u.{col} IS NOT NULL
+"""
+
+if __name__ == '__main__':
+    purgar = '--purgar' in sys.argv
+    with app.app_context():
+        engine = db.engine
+        with engine.begin() as conn:
+            with open(SQL_TABLAS, encoding='utf-8') as f:
+                conn.exec_driver_sql(f.read())
+
+        for col, col_nombre in DOCUMENTOS_USUARIO.items():
+            with engine.begin() as conn:
+                conn.exec_driver_sql(SQL_COPIAR_CONTENIDO.format(col=col))
+                res = conn.exec_driver_sql(SQL_COPIAR_ENLACE.format(col=col, col_nombre=col_nombre))
+                copiados = res.rowcount
+                purgados = 0
+                if purgar:
+                    purgados = conn.exec_driver_sql(SQL_PURGAR.format(col=col)).rowcount
+            print(f'{col}: {copiados} copiados, {purgados} purgados')
+
+        print('OK: documentos migrados a documento_usuario')
@@ -0,0 +1,32 @@
+"""
+Reconstruye la tabla puntaje_usuario a partir de las evaluaciones.
+
+Uso:
+    python scripts/recalcular_puntajes.py
+
+Necesario solo tras cambios hechos fuera de la aplicación (SQL directo,
+restauraciones); la aplicación mantiene la tabla al guardar evaluaciones
+y criterios.
+"""
+import os
+import sys
+
+# Asegurar que podamos importar src.*
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_APP_DIR = os.path.dirname(CURRENT_DIR)
+if BACKEND_APP_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_APP_DIR)
+
+from src.main import app  # noqa: E402
+from src.models import db, PuntajeUsuario  # noqa: E402
+
+if __name__ == '__main__':
+    with app.app_context():
+        try:
+            filas = PuntajeUsuario.recalcular(db.session.connection())
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f'Error al recalcular puntajes: {str(e)}')
+            sys.exit(1)
+        print(f'OK: puntaje_usuario recalculado ({filas} filas)')
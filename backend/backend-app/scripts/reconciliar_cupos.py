@@ -0,0 +1,33 @@
+"""
+Recalcula la tabla cupo_ocupacion a partir de la tabla "user".
+
+Uso:
+    python scripts/reconciliar_cupos.py              # todas las convocatorias
+    python scripts/reconciliar_cupos.py 1            # solo la convocatoria '1'
+
+Pensado para ejecutarse periódicamente (cron) o tras cambios masivos hechos
+fuera de la aplicación (SQL directo, restauraciones).
+"""
+import os
+import sys
+
+# Asegurar que podamos importar src.*
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_APP_DIR = os.path.dirname(CURRENT_DIR)
+if BACKEND_APP_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_APP_DIR)
+
+from src.main import app  # noqa: E402
+from src.models import db, CupoOcupacion  # noqa: E402
+
+if __name__ == '__main__':
+    convocatoria = sys.argv[1] if len(sys.argv) > 1 else None
+    with app.app_context():
+        try:
+            filas = CupoOcupacion.reconciliar(convocatoria)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f'Error al reconciliar cupos: {str(e)}')
+            sys.exit(1)
+        print(f"OK: cupo_ocupacion reconciliado ({filas} filas, convocatoria={convocatoria or 'todas'})")
@@ -0,0 +1,35 @@
+"""
+Reconstruye la tabla inventario_almacenamiento recorriendo todo el almacenamiento
+(el bucket de S3 o el directorio local, según STORAGE_BACKEND).
+
+Uso:
+    python scripts/reconstruir_inventario.py
+
+La aplicación mantiene el inventario con cada subida y eliminación; este
+script lo corrige tras cambios hechos fuera de ella (consola de AWS, reglas
+de ciclo de vida, subidas directas abandonadas). Pensado para ejecutarse
+periódicamente (cron).
+"""
+import os
+import sys
+
+# Asegurar que podamos importar src.*
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_APP_DIR = os.path.dirname(CURRENT_DIR)
+if BACKEND_APP_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_APP_DIR)
+
+from src.main import app  # noqa: E402
+from src.services import storage_inventory  # noqa: E402
+from src.services.s3_service import s3_service  # noqa: E402
+from src.services.storage_backend import obtener_almacenamiento  # noqa: E402
+
+if __name__ == '__main__':
+    with app.app_context():
+        try:
+            almacenamiento = obtener_almacenamiento()
+            objetos, total = storage_inventory.reconstruir(almacenamiento.listar())
+        except Exception as e:
+            print(f'Error al reconstruir el inventario de almacenamiento: {str(e)}')
+            sys.exit(1)
+        print(f'OK: {objetos} objetos, {s3_service.format_file_size(total)} en {almacenamiento.ubicacion}')
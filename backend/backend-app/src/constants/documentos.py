@@ -0,0 +1,35 @@
+# Documentos adjuntos en la inscripción.
+# Clave: tipo de documento (nombre histórico de la columna BYTEA en "user")
+# Valor: columna de "user" que guarda el nombre original del archivo
+DOCUMENTOS_USUARIO = {
+    # Documentos específicos obligatorios
+    'doc_terminos_pdf': 'doc_terminos_pdf_nombre',
+    'doc_uso_imagen_pdf': 'doc_uso_imagen_pdf_nombre',
+    'doc_plan_negocio_xls': 'doc_plan_negocio_nombre',
+    'doc_vecindad_pdf': 'doc_vecindad_pdf_nombre',
+    # Documentos condicionales según tipo de persona
+    'rut_pdf': 'rut_pdf_nombre',
+    'cedula_pdf': 'cedula_pdf_nombre',
+    'cedula_representante_pdf': 'cedula_representante_pdf_nombre',
+    'cert_existencia_pdf': 'cert_existencia_pdf_nombre',
+    # Documentación diferencial (subsanable/opcional)
+    'ruv_pdf': 'ruv_pdf_nombre',
+    'sisben_pdf': 'sisben_pdf_nombre',
+    'grupo_etnico_pdf': 'grupo_etnico_pdf_nombre',
+    'arn_pdf': 'arn_pdf_nombre',
+    'discapacidad_pdf': 'discapacidad_pdf_nombre',
+    # Documentación de control (obligatoria)
+    'antecedentes_fiscales_pdf': 'antecedentes_fiscales_pdf_nombre',
+    'antecedentes_disciplinarios_pdf': 'antecedentes_disciplinarios_pdf_nombre',
+    'antecedentes_judiciales_pdf': 'antecedentes_judiciales_pdf_nombre',
+    'redam_pdf': 'redam_pdf_nombre',
+    'inhabilidades_sexuales_pdf': 'inhabilidades_sexuales_pdf_nombre',
+    'declaracion_capacidad_legal_pdf': 'declaracion_capacidad_legal_pdf_nombre',
+    # Certificación de funcionamiento
+    'matricula_mercantil_pdf': 'matricula_mercantil_pdf_nombre',
+    'facturas_6meses_pdf': 'facturas_6meses_pdf_nombre',
+    'publicaciones_redes_pdf': 'publicaciones_redes_pdf_nombre',
+    'registro_ventas_pdf': 'registro_ventas_pdf_nombre',
+}
+
+TIPOS_DOCUMENTO_USUARIO = list(DOCUMENTOS_USUARIO.keys())
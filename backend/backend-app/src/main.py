@@ -6,6 +6,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 from flask import Flask, send_from_directory
 from flask_cors import CORS
 from src.models import db
+from src.services.activity_log import registro_actividad
 from src.routes.user import user_bp
 from src.routes.admin import admin_bp
 from src.routes.content import content_bp
@@ -18,6 +19,7 @@ from src.routes.activos import activos_bp
 from src.routes.evidencias import evidencias_bp
 from src.routes.criterios import criterios_bp
 from src.routes.evaluaciones import evaluaciones_bp
+from src.routes.documentos import documentos_bp
 from src.config import config
 
 # Determinar el entorno
@@ -52,6 +54,7 @@ app.register_blueprint(activos_bp, url_prefix='/api')
 app.register_blueprint(evidencias_bp, url_prefix='/api')
 app.register_blueprint(criterios_bp, url_prefix='/api')
 app.register_blueprint(evaluaciones_bp, url_prefix='/api')
+app.register_blueprint(documentos_bp, url_prefix='/api')
 
 # Configurar base de datos directamente para producción
 if os.getenv('FLASK_ENV', '').strip() == 'production':
@@ -59,6 +62,7 @@ if os.getenv('FLASK_ENV', '').strip() == 'production':
 
 # Inicializar base de datos
 db.init_app(app)
+registro_actividad.init_app(app)
 with app.app_context():
     db.create_all()
 
@@ -21,4 +21,10 @@ from .usuario_activo import UsuarioActivo
 from .evidencia_funcionamiento import EvidenciaFuncionamiento
 from .criterio_evaluacion import CriterioEvaluacion
 from .evaluacion import Evaluacion
-from .sorteo import Sorteo
\ No newline at end of file
+from .sorteo import Sorteo
+from .documento_usuario import DocumentoContenido, DocumentoUsuario
+from .cupo_ocupacion import CupoOcupacion
+from .puntaje_usuario import PuntajeUsuario
+from .trabajo_exportacion import TrabajoExportacion
+from .version_token import VersionToken
+from .inventario_almacenamiento import InventarioAlmacenamiento
@@ -0,0 +1,217 @@
+from datetime import datetime
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from . import db
+from .user import User
+
+# Fila que acumula el total de la convocatoria (todas las municipalidades)
+MUNICIPIO_GLOBAL = '*'
+# Estados que ocupan cupo
+ESTADOS_CONFIRMADOS = ('activa', 'inactiva')
+
+
+class CupoOcupacion(db.Model):
+    """Contador materializado de usuarios por (convocatoria, municipio, estado_cuenta).
+
+    Se mantiene en la misma transacción que cualquier alta, baja o cambio de
+    estado/municipio/convocatoria de un usuario (ver `_actualizar_contadores`).
+    """
+    __tablename__ = 'cupo_ocupacion'
+
+    convocatoria = db.Column(db.String(20), primary_key=True)
+    municipio_slug = db.Column(db.String(120), primary_key=True)  # '*' = total global
+    estado_cuenta = db.Column(db.String(20), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    fecha_actualizacion = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<CupoOcupacion {self.convocatoria}/{self.municipio_slug}/{self.estado_cuenta}: {self.total}>'
+
+    def to_dict(self):
+        return {
+            'convocatoria': self.convocatoria,
+            'municipio_slug': self.municipio_slug,
+            'estado_cuenta': self.estado_cuenta,
+            'total': self.total
+        }
+
+    @staticmethod
+    def aplicar_deltas(connection, deltas):
+        """Sumar deltas {(convocatoria, municipio, estado): n} con un único upsert.
+
+        Las claves se ordenan para que todas las transacciones bloqueen las
+        filas en el mismo orden (la fila global '*' primero).
+        """
+        filas = [
+            {'convocatoria': c, 'municipio_slug': m, 'estado_cuenta': e, 'total': n}
+            for (c, m, e), n in sorted(deltas.items()) if n
+        ]
+        if not filas:
+            return
+        tabla = CupoOcupacion.__table__
+        stmt = pg_insert(tabla).values(filas)
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=['convocatoria', 'municipio_slug', 'estado_cuenta'],
+            set_={'total': tabla.c.total + stmt.excluded.total, 'fecha_actualizacion': datetime.utcnow()}
+        ))
+
+    @staticmethod
+    def aplicar_cambios(connection, cambios):
+        """Aplicar cambios [(clave_anterior, clave_nueva)] de usuarios modificados fuera del ORM.
+
+        Cada clave es (convocatoria, municipio, estado_cuenta) o None. Sirve para
+        UPDATE masivos, que no pasan por `_actualizar_contadores`.
+        """
+        deltas = {}
+        for anterior, nueva in cambios:
+            if anterior != nueva:
+                _sumar(deltas, _clave(*anterior) if anterior else None, -1)
+                _sumar(deltas, _clave(*nueva) if nueva else None, 1)
+        CupoOcupacion.aplicar_deltas(connection, deltas)
+
+    @staticmethod
+    def confirmados(convocatoria, municipio_slug, bloquear=False):
+        """
+        Usuarios que ocupan cupo en el municipio y en toda la convocatoria
+
+        Args:
+            convocatoria: Convocatoria a consultar
+            municipio_slug: Municipio a consultar
+            bloquear: True para bloquear las filas (SELECT ... FOR UPDATE) hasta el commit
+
+        Returns:
+            tuple: (confirmados_municipio, confirmados_global)
+        """
+        municipios = sorted({MUNICIPIO_GLOBAL, municipio_slug})
+        if bloquear:
+            # Las filas deben existir para poder bloquearlas
+            db.session.execute(
+                pg_insert(CupoOcupacion.__table__)
+                .values([
+                    {'convocatoria': convocatoria, 'municipio_slug': m, 'estado_cuenta': e, 'total': 0}
+                    for m in municipios for e in ESTADOS_CONFIRMADOS
+                ])
+                .on_conflict_do_nothing()
+            )
+
+        query = db.session.query(CupoOcupacion.municipio_slug, CupoOcupacion.total).filter(
+            CupoOcupacion.convocatoria == convocatoria,
+            CupoOcupacion.municipio_slug.in_(municipios),
+            CupoOcupacion.estado_cuenta.in_(ESTADOS_CONFIRMADOS)
+        ).order_by(CupoOcupacion.municipio_slug, CupoOcupacion.estado_cuenta)
+        if bloquear:
+            query = query.with_for_update()
+
+        muni_total, global_total = 0, 0
+        for muni, total in query.all():
+            if muni == MUNICIPIO_GLOBAL:
+                global_total += total
+            else:
+                muni_total += total
+        return muni_total, global_total
+
+    @staticmethod
+    def conteos_por_municipio(convocatoria):
+        """Filas (municipio, estado_cuenta, total) de una convocatoria, sin la fila global"""
+        return db.session.query(
+            CupoOcupacion.municipio_slug, CupoOcupacion.estado_cuenta, CupoOcupacion.total
+        ).filter(
+            CupoOcupacion.convocatoria == convocatoria,
+            CupoOcupacion.municipio_slug != MUNICIPIO_GLOBAL,
+            CupoOcupacion.total > 0
+        ).all()
+
+    @staticmethod
+    def reconciliar(convocatoria=None):
+        """
+        Recalcular los contadores a partir de la tabla "user"
+
+        Bloquea la tabla de contadores mientras recalcula para que ningún
+        registro concurrente quede fuera. No hace commit.
+
+        Returns:
+            int: Número de filas de contador escritas
+        """
+        filtro = 'AND convocatoria = :convocatoria' if convocatoria else ''
+        params = {'convocatoria': convocatoria} if convocatoria else {}
+        db.session.execute(text('LOCK TABLE cupo_ocupacion IN EXCLUSIVE MODE'))
+        db.session.execute(text(f'DELETE FROM cupo_ocupacion WHERE TRUE {filtro}'), params)
+        resultado = db.session.execute(text(f"""
+            INSERT INTO cupo_ocupacion (convocatoria, municipio_slug, estado_cuenta, total, fecha_actualizacion)
+            SELECT convocatoria, municipio, estado_cuenta, count(*), now()
+            FROM "user"
+            WHERE convocatoria IS NOT NULL AND municipio IS NOT NULL AND estado_cuenta IS NOT NULL {filtro}
+            GROUP BY convocatoria, municipio, estado_cuenta
+            UNION ALL
+            SELECT convocatoria, '{MUNICIPIO_GLOBAL}', estado_cuenta, count(*), now()
+            FROM "user"
+            WHERE convocatoria IS NOT NULL AND municipio IS NOT NULL AND estado_cuenta IS NOT NULL {filtro}
+            GROUP BY convocatoria, estado_cuenta
+        """), params)
+        return resultado.rowcount
+
+
+def _clave(convocatoria, municipio, estado_cuenta):
+    if not convocatoria or not municipio or not estado_cuenta:
+        return None
+    return convocatoria, municipio, estado_cuenta
+
+
+def _sumar(deltas, clave, n):
+    """Sumar n a la clave y a su fila global"""
+    if clave is None:
+        return
+    for c in (clave, (clave[0], MUNICIPIO_GLOBAL, clave[2])):
+        deltas[c] = deltas.get(c, 0) + n
+
+
+def _valor_anterior(estado, atributo):
+    """Valor de un atributo antes de los cambios pendientes de esta sesión"""
+    historial = estado.attrs[atributo].history
+    if historial.deleted:
+        return historial.deleted[0]
+    if historial.unchanged:
+        return historial.unchanged[0]
+    return getattr(estado.object, atributo)
+
+
+@event.listens_for(Session, 'after_flush')
+def _actualizar_contadores(session, flush_context):
+    """Mantener cupo_ocupacion en la misma transacción que los cambios de usuarios"""
+    deltas = {}
+
+    def sumar(clave, n):
+        _sumar(deltas, clave, n)
+
+    for obj in session.new:
+        if isinstance(obj, User):
+            sumar(_clave(obj.convocatoria, obj.municipio, obj.estado_cuenta), 1)
+
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            estado = inspect(obj)
+            sumar(_clave(
+                _valor_anterior(estado, 'convocatoria'),
+                _valor_anterior(estado, 'municipio'),
+                _valor_anterior(estado, 'estado_cuenta')
+            ), -1)
+
+    for obj in session.dirty:
+        if not isinstance(obj, User):
+            continue
+        estado = inspect(obj)
+        if not any(estado.attrs[a].history.has_changes() for a in ('convocatoria', 'municipio', 'estado_cuenta')):
+            continue
+        anterior = _clave(
+            _valor_anterior(estado, 'convocatoria'),
+            _valor_anterior(estado, 'municipio'),
+            _valor_anterior(estado, 'estado_cuenta')
+        )
+        nueva = _clave(obj.convocatoria, obj.municipio, obj.estado_cuenta)
+        if anterior != nueva:
+            sumar(anterior, -1)
+            sumar(nueva, 1)
+
+    if deltas:
+        CupoOcupacion.aplicar_deltas(session.connection(), deltas)
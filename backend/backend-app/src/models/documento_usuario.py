@@ -0,0 +1,59 @@
+from datetime import datetime
+import hashlib
+from . import db
+
+class DocumentoContenido(db.Model):
+    """Contenido binario de un documento, direccionado por su hash SHA-256.
+
+    Dos usuarios (o dos tipos de documento) que suben el mismo archivo
+    comparten una única fila.
+    """
+    __tablename__ = 'documento_contenido'
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    contenido = db.Column(db.LargeBinary, nullable=False)  # BYTEA
+    tamano_bytes = db.Column(db.BigInteger, nullable=False)
+    fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<DocumentoContenido {self.sha256[:12]} ({self.tamano_bytes} bytes)>'
+
+    @staticmethod
+    def calcular_hash(contenido):
+        """Calcula el hash SHA-256 (hex) de un contenido binario"""
+        return hashlib.sha256(contenido).hexdigest()
+
+
+class DocumentoUsuario(db.Model):
+    """Documento adjunto de un usuario, identificado por (user_id, doc_type)"""
+    __tablename__ = 'documento_usuario'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'doc_type', name='uq_documento_usuario_user_tipo'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    doc_type = db.Column(db.String(60), nullable=False)  # rut_pdf, cedula_pdf, doc_plan_negocio_xls, ...
+    nombre = db.Column(db.String(255), nullable=True)  # Nombre original del archivo
+    sha256 = db.Column(db.String(64), db.ForeignKey('documento_contenido.sha256'), nullable=False, index=True)
+    tamano_bytes = db.Column(db.BigInteger, nullable=False)
+    mime_type = db.Column(db.String(100), nullable=True)
+    fecha_subida = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    # El contenido sólo se carga cuando se accede explícitamente
+    contenido = db.relationship('DocumentoContenido', lazy='select')
+
+    def __repr__(self):
+        return f'<DocumentoUsuario User:{self.user_id} Tipo:{self.doc_type}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'doc_type': self.doc_type,
+            'nombre': self.nombre,
+            'sha256': self.sha256,
+            'tamano_bytes': self.tamano_bytes,
+            'mime_type': self.mime_type,
+            'fecha_subida': self.fecha_subida.isoformat() if self.fecha_subida else None
+        }
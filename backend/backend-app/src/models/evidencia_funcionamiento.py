@@ -7,9 +7,9 @@ class EvidenciaFuncionamiento(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
     tipo = db.Column(db.String(10), nullable=False)  # formal, informal
-    archivo1 = db.Column(db.LargeBinary, nullable=True)  # BYTEA
+    archivo1 = db.deferred(db.Column(db.LargeBinary, nullable=True), group='archivos')  # BYTEA
     archivo1_nombre = db.Column(db.String(255), nullable=True)
-    archivo2 = db.Column(db.LargeBinary, nullable=True)  # BYTEA
+    archivo2 = db.deferred(db.Column(db.LargeBinary, nullable=True), group='archivos')  # BYTEA
     archivo2_nombre = db.Column(db.String(255), nullable=True)
     observaciones = db.Column(db.Text, nullable=True)
     fecha_subida = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
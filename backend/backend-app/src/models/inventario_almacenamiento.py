@@ -0,0 +1,51 @@
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from . import db
+
+
+class InventarioAlmacenamiento(db.Model):
+    """Objetos y bytes del bucket por prefijo (directorio de la clave).
+
+    Una fila por prefijo hoja, p. ej. 'uploads/2025/03/14' o
+    'content/video/2025/03/14'; los totales de un prefijo superior se suman
+    por LIKE. Se actualiza con cada subida y eliminación hechas por la
+    aplicación (ver services/storage_inventory.py) y se reconstruye desde el
+    bucket con scripts/reconstruir_inventario.py.
+    """
+    __tablename__ = 'inventario_almacenamiento'
+
+    prefijo = db.Column(db.String(500), primary_key=True)
+    objetos = db.Column(db.BigInteger, nullable=False, default=0)
+    bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    fecha_actualizacion = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<InventarioAlmacenamiento {self.prefijo}: {self.objetos} objetos, {self.bytes} bytes>'
+
+    def to_dict(self):
+        return {
+            'prefijo': self.prefijo,
+            'objetos': self.objetos,
+            'bytes': self.bytes,
+            'fecha_actualizacion': self.fecha_actualizacion.isoformat() if self.fecha_actualizacion else None
+        }
+
+    @staticmethod
+    def aplicar_deltas(connection, deltas):
+        """Sumar deltas {prefijo: (objetos, bytes)} con un único upsert (claves ordenadas)"""
+        filas = [
+            {'prefijo': prefijo, 'objetos': objetos, 'bytes': tamano, 'fecha_actualizacion': datetime.utcnow()}
+            for prefijo, (objetos, tamano) in sorted(deltas.items()) if objetos or tamano
+        ]
+        if not filas:
+            return
+        tabla = InventarioAlmacenamiento.__table__
+        stmt = pg_insert(tabla).values(filas)
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=['prefijo'],
+            set_={
+                'objetos': tabla.c.objetos + stmt.excluded.objetos,
+                'bytes': tabla.c.bytes + stmt.excluded.bytes,
+                'fecha_actualizacion': stmt.excluded.fecha_actualizacion
+            }
+        ))
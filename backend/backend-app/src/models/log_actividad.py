@@ -1,34 +1,57 @@
 from datetime import datetime
 from . import db, User
 
+# Marca para distinguir "usuario no cargado" de "usuario inexistente" en to_dict
+_SIN_CARGAR = object()
+
 
 class LogActividad(db.Model):
+    """Registro de actividad.
+
+    En PostgreSQL la tabla está particionada por mes sobre `fecha`
+    (scripts/create_log_actividad_partitions.sql) y la clave primaria es
+    (id, fecha); la retención se hace eliminando particiones antiguas
+    (scripts/mantener_log_actividad.py).
+    """
     __tablename__ = 'log_actividad'
+    __table_args__ = (
+        # Historial de un tipo de acción de un usuario (fases, rechazos)
+        db.Index('ix_log_actividad_usuario_accion_fecha', 'usuario_id', 'accion', 'fecha'),
+        # Actividad reciente de un usuario (paneles de estudiante e instructor)
+        db.Index('ix_log_actividad_usuario_fecha', 'usuario_id', 'fecha'),
+        # Listado del administrador filtrado por acción
+        db.Index('ix_log_actividad_accion_fecha', 'accion', 'fecha'),
+        # Listado del administrador sin filtros; coincide con ORDEN_LOGS (log_query_service.py)
+        db.Index('ix_log_actividad_fecha_id', 'fecha', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     usuario_id = db.Column(db.Integer, nullable=True)
     accion = db.Column(db.String(100), nullable=False)
     detalles = db.Column(db.Text, nullable=True)
-    fecha = db.Column(db.DateTime, default=datetime.utcnow)
+    # Clave de partición: no puede ser nula
+    fecha = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
-    def to_dict(self):
-        # Intentar enriquecer con datos del usuario si existe
-        usuario_nombre = None
-        usuario_email = None
-        if self.usuario_id:
-            try:
-                user = User.query.get(self.usuario_id)
-                if user:
-                    usuario_nombre = f"{user.nombre} {user.apellido}"
-                    usuario_email = user.email
-            except Exception:
-                pass
+    def to_dict(self, usuario=_SIN_CARGAR):
+        """
+        Args:
+            usuario: Fila con nombre, apellido y email ya cargada (o None si
+                no existe); si no se pasa se consulta aquí
+        """
+        if usuario is _SIN_CARGAR:
+            usuario = None
+            # Intentar enriquecer con datos del usuario si existe
+            if self.usuario_id:
+                try:
+                    usuario = User.query.get(self.usuario_id)
+                except Exception:
+                    pass
         return {
             'id': self.id,
             'usuario_id': self.usuario_id,
-            'usuario_nombre': usuario_nombre,
-            'usuario_email': usuario_email,
+            'usuario_nombre': f"{usuario.nombre} {usuario.apellido}" if usuario else None,
+            'usuario_email': usuario.email if usuario else None,
             'accion': self.accion,
             'detalles': self.detalles,
             'fecha': self.fecha.isoformat() if self.fecha else None
-        }
\ No newline at end of file
+        }
@@ -0,0 +1,174 @@
+from datetime import datetime
+from sqlalchemy import bindparam, event, inspect, text
+from sqlalchemy.orm import Session
+from . import db
+from .user import User
+from .evaluacion import Evaluacion
+from .criterio_evaluacion import CriterioEvaluacion
+
+# Atributos de un criterio que alteran el puntaje o la completitud de todos los usuarios
+ATRIBUTOS_CRITERIO = ('peso', 'max_puntaje', 'activo')
+
+_AGREGADO = """
+    SELECT u.id AS usuario_id,
+           COALESCE(round(sum(e.puntaje::numeric / c.max_puntaje * c.peso), 2), 0) AS puntaje_total,
+           count(e.id) AS criterios_evaluados,
+           count(e.id) = (SELECT count(*) FROM criterios_evaluacion WHERE activo) AS evaluacion_completa,
+           u.fecha_creacion AS fecha_inscripcion,
+           now() AS fecha_actualizacion
+    FROM "user" u
+    LEFT JOIN evaluaciones e ON e.usuario_id = u.id
+    LEFT JOIN criterios_evaluacion c ON c.id = e.criterio_id
+    {filtro}
+    GROUP BY u.id, u.fecha_creacion
+"""
+
+_UPSERT = """
+    INSERT INTO puntaje_usuario (usuario_id, puntaje_total, criterios_evaluados,
+                                 evaluacion_completa, fecha_inscripcion, fecha_actualizacion)
+    {agregado}
+    ON CONFLICT (usuario_id) DO UPDATE SET
+        puntaje_total = EXCLUDED.puntaje_total,
+        criterios_evaluados = EXCLUDED.criterios_evaluados,
+        evaluacion_completa = EXCLUDED.evaluacion_completa,
+        fecha_inscripcion = EXCLUDED.fecha_inscripcion,
+        fecha_actualizacion = EXCLUDED.fecha_actualizacion
+"""
+
+
+class PuntajeUsuario(db.Model):
+    """Puntaje ponderado materializado de cada usuario.
+
+    Se recalcula en la misma transacción en que cambian sus evaluaciones y se
+    reconstruye completo cuando cambia el peso, el puntaje máximo o el estado
+    de un criterio (ver `_actualizar_puntajes`).
+    """
+    __tablename__ = 'puntaje_usuario'
+
+    usuario_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    puntaje_total = db.Column(db.Numeric(7, 2), nullable=False, default=0)
+    criterios_evaluados = db.Column(db.Integer, nullable=False, default=0)
+    evaluacion_completa = db.Column(db.Boolean, nullable=False, default=False)
+    fecha_inscripcion = db.Column(db.DateTime, nullable=True)  # Copia de user.fecha_creacion (desempate)
+    fecha_actualizacion = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index(
+            'idx_puntaje_usuario_ranking',
+            puntaje_total.desc(),
+            fecha_inscripcion.asc().nulls_first(),
+            usuario_id
+        ),
+    )
+
+    # Orden del ranking: puntaje descendente, inscripción más antigua primero
+    ORDEN_RANKING = (
+        puntaje_total.desc(),
+        fecha_inscripcion.asc().nulls_first(),
+        usuario_id.asc()
+    )
+
+    def __repr__(self):
+        return f'<PuntajeUsuario {self.usuario_id}: {self.puntaje_total}>'
+
+    def to_dict(self):
+        return {
+            'usuario_id': self.usuario_id,
+            'puntaje_total': float(self.puntaje_total or 0),
+            'criterios_evaluados': self.criterios_evaluados,
+            'evaluacion_completa': self.evaluacion_completa,
+            'fecha_actualizacion': self.fecha_actualizacion.isoformat() if self.fecha_actualizacion else None
+        }
+
+    @staticmethod
+    def recalcular(connection, usuario_ids=None):
+        """
+        Recalcular el puntaje de algunos usuarios (o de todos)
+
+        Con `usuario_ids` se bloquean primero sus filas para que el cálculo vea
+        las evaluaciones ya confirmadas por transacciones concurrentes. Sin
+        `usuario_ids` se bloquea la tabla completa. No hace commit.
+
+        Args:
+            connection: Conexión de la transacción en curso
+            usuario_ids: IDs a recalcular (None = todos)
+
+        Returns:
+            int: Número de filas escritas
+        """
+        if usuario_ids is None:
+            connection.execute(text('LOCK TABLE puntaje_usuario IN EXCLUSIVE MODE'))
+            return connection.execute(text(_UPSERT.format(agregado=_AGREGADO.format(filtro='')))).rowcount
+
+        ids = sorted(set(usuario_ids))
+        if not ids:
+            return 0
+        parametro = bindparam('ids', expanding=True)
+        connection.execute(text("""
+            INSERT INTO puntaje_usuario (usuario_id, puntaje_total, criterios_evaluados,
+                                         evaluacion_completa, fecha_inscripcion, fecha_actualizacion)
+            SELECT id, 0, 0, false, fecha_creacion, now() FROM "user" WHERE id IN :ids
+            ON CONFLICT (usuario_id) DO NOTHING
+        """).bindparams(parametro), {'ids': ids})
+        connection.execute(text("""
+            SELECT usuario_id FROM puntaje_usuario WHERE usuario_id IN :ids
+            ORDER BY usuario_id FOR UPDATE
+        """).bindparams(parametro), {'ids': ids})
+        return connection.execute(
+            text(_UPSERT.format(agregado=_AGREGADO.format(filtro='WHERE u.id IN :ids'))).bindparams(parametro),
+            {'ids': ids}
+        ).rowcount
+
+    @staticmethod
+    def obtener_puntaje(usuario_id):
+        """Puntaje total materializado de un usuario (0.0 si aún no tiene fila)"""
+        puntaje = (
+            db.session.query(PuntajeUsuario.puntaje_total)
+            .filter(PuntajeUsuario.usuario_id == usuario_id)
+            .scalar()
+        )
+        return float(puntaje or 0)
+
+
+def _usuario_anterior(evaluacion):
+    historial = inspect(evaluacion).attrs.usuario_id.history
+    return historial.deleted[0] if historial.deleted else None
+
+
+@event.listens_for(Session, 'after_flush')
+def _actualizar_puntajes(session, flush_context):
+    """Mantener puntaje_usuario en la misma transacción que evaluaciones y criterios"""
+    reconstruir = False
+    usuario_ids = set()
+
+    for obj in session.new:
+        if isinstance(obj, Evaluacion):
+            usuario_ids.add(obj.usuario_id)
+        elif isinstance(obj, User):
+            usuario_ids.add(obj.id)
+        elif isinstance(obj, CriterioEvaluacion):
+            reconstruir = True
+
+    for obj in session.deleted:
+        if isinstance(obj, Evaluacion):
+            usuario_ids.add(_usuario_anterior(obj) or obj.usuario_id)
+        elif isinstance(obj, CriterioEvaluacion):
+            reconstruir = True
+
+    for obj in session.dirty:
+        if isinstance(obj, Evaluacion):
+            estado = inspect(obj)
+            if any(estado.attrs[a].history.has_changes() for a in ('puntaje', 'criterio_id', 'usuario_id')):
+                usuario_ids.add(obj.usuario_id)
+                anterior = _usuario_anterior(obj)
+                if anterior is not None:
+                    usuario_ids.add(anterior)
+        elif isinstance(obj, CriterioEvaluacion):
+            estado = inspect(obj)
+            if any(estado.attrs[a].history.has_changes() for a in ATRIBUTOS_CRITERIO):
+                reconstruir = True
+
+    if reconstruir:
+        PuntajeUsuario.recalcular(session.connection())
+    elif usuario_ids:
+        PuntajeUsuario.recalcular(session.connection(), usuario_ids)
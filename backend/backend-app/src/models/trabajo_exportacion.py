@@ -0,0 +1,60 @@
+from datetime import datetime
+from . import db
+
+
+class TrabajoExportacion(db.Model):
+    """Exportación encolada para generarse en segundo plano.
+
+    Un proceso aparte (scripts/export_worker.py) toma los trabajos pendientes,
+    genera el archivo y lo guarda en `archivo`. `huella` identifica el estado
+    de los datos de origen: mientras no cambie, un trabajo completado se
+    reutiliza en lugar de generar el reporte otra vez.
+    """
+    __tablename__ = 'trabajo_exportacion'
+
+    ESTADOS = ('pendiente', 'en_proceso', 'completado', 'error')
+
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(40), nullable=False)  # usuarios, cupos, fases, rankings
+    estado = db.Column(db.String(20), nullable=False, default='pendiente')
+    progreso = db.Column(db.Integer, nullable=False, default=0)  # 0-100
+    mensaje = db.Column(db.Text, nullable=True)  # Detalle del error, si lo hubo
+    huella = db.Column(db.String(64), nullable=False)
+    solicitado_por = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'), nullable=True)
+
+    # Resultado
+    archivo = db.deferred(db.Column(db.LargeBinary, nullable=True))  # BYTEA
+    nombre_archivo = db.Column(db.String(255), nullable=True)
+    mime_type = db.Column(db.String(100), nullable=True)
+    tamano_bytes = db.Column(db.BigInteger, nullable=True)
+
+    # Ejecución
+    worker = db.Column(db.String(100), nullable=True)
+    intentos = db.Column(db.Integer, nullable=False, default=0)
+    fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    fecha_inicio = db.Column(db.DateTime, nullable=True)
+    fecha_fin = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('idx_trabajo_exportacion_cola', 'estado', 'id'),
+        db.Index('idx_trabajo_exportacion_huella', 'tipo', 'huella'),
+    )
+
+    def __repr__(self):
+        return f'<TrabajoExportacion {self.id} {self.tipo}: {self.estado}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'tipo': self.tipo,
+            'estado': self.estado,
+            'progreso': self.progreso,
+            'mensaje': self.mensaje,
+            'nombre_archivo': self.nombre_archivo,
+            'tamano_bytes': self.tamano_bytes,
+            'solicitado_por': self.solicitado_por,
+            'intentos': self.intentos,
+            'fecha_creacion': self.fecha_creacion.isoformat() if self.fecha_creacion else None,
+            'fecha_inicio': self.fecha_inicio.isoformat() if self.fecha_inicio else None,
+            'fecha_fin': self.fecha_fin.isoformat() if self.fecha_fin else None
+        }
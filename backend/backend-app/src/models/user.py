@@ -1,7 +1,11 @@
 from datetime import datetime, timedelta
 from werkzeug.security import generate_password_hash, check_password_hash  # pyright: ignore[reportMissingImports]
 import secrets
+from sqlalchemy import select
+from sqlalchemy.orm import deferred, column_property, undefer_group
+from ..constants.documentos import DOCUMENTOS_USUARIO
 from . import db
+from .documento_usuario import DocumentoUsuario
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -20,48 +24,48 @@ class User(db.Model):
     tipo_documento = db.Column(db.String(50), nullable=False)
     numero_documento = db.Column(db.String(20), unique=True, nullable=False)
     # Documentos específicos obligatorios
-    doc_terminos_pdf = db.Column(db.LargeBinary, nullable=True)
+    doc_terminos_pdf = deferred(db.Column(db.LargeBinary, nullable=True), group='documentos')
     doc_terminos_pdf_nombre = db.Column(db.String(255), nullable=True)
-    doc_uso_imagen_pdf = db.Column(db.LargeBinary, nullable=True)
+    doc_uso_imagen_pdf = deferred(db.Column(db.LargeBinary, nullable=True), group='documentos')
     doc_uso_imagen_pdf_nombre = db.Column(db.String(255), nullable=True)
-    doc_plan_negocio_xls = db.Column(db.LargeBinary, nullable=True)
+    doc_plan_negocio_xls = deferred(db.Column(db.LargeBinary, nullable=True), group='documentos')
     doc_plan_negocio_nombre = db.Column(db.String(255), nullable=True)
-    doc_vecindad_pdf = db.Column(db.LargeBinary, nullable=True)
+    doc_vecindad_pdf = deferred(db.Column(db.LargeBinary, nullable=True), group='documentos')
     doc_vecindad_pdf_nombre = db.Column(db.String(255), nullable=True)
     # Video opcional
     video_url = db.Column(db.String(500), nullable=True)
     # Documentos condicionales según tipo de persona
-    rut_pdf = db.Column(db.LargeBinary, nullable=True)
+    rut_pdf = deferred(db.Column(db.LargeBinary, nullable=True), group='documentos')
     rut_pdf_nombre = db.Column(db.String(255), nullable=True)
-    cedula_pdf = db.Column(db.LargeBinary, nullable=True)  # Para Persona Natural
+    cedula_pdf = deferred(db.Column(db.LargeBinary, nullable=True), group='documentos')  # Para Persona Natural
     cedula_pdf_nombre = db.Column(db.String(255), nullable=True)
-    cedula_representante_pdf = db.Column(db.LargeBinary, nullable=True)  # Para Persona Jurídica
+    cedula_representante_pdf = deferred(db.Column(db.LargeBinary, nullable=True), group='documentos')  # Para Persona Jurídica
     cedula_representante_pdf_nombre = db.Column(db.String(255), nullable=True)
-    cert_existencia_pdf = db.Column(db.LargeBinary, nullable=True)  # Solo Persona Jurídica
+    cert_existencia_pdf = deferred(db.Column(db.LargeBinary, nullable=True), group='documentos')  # Solo Persona Jurídica
     cert_existencia_pdf_nombre = db.Column(db.String(255), nullable=True)
     # Documentación diferencial (subsanable/opcional)
-    ruv_pdf = db.Column(db.LargeBinary, nullable=True)
+    ruv_pdf = deferred(db.Column(db.LargeBinary, nullable=True), group='documentos')
     ruv_pdf_nombre = db.Column(db.String(255), nullable=True)
-    sisben_pdf = db.Column(db.LargeBinary, nullable=True)
+    sisben_pdf = deferred(db.Column(db.LargeBinary, nullable=True), group='documentos')
     sisben_pdf_nombre = db.Column(db.String(255), nullable=True)
-    grupo_etnico_pdf = db.Column(db.LargeBinary, nullable=True)
+    grupo_etnico_pdf = deferred(db.Column(db.LargeBinary, nullable=True), group='documentos')
     grupo_etnico_pdf_nombre = db.Column(db.String(255), nullable=True)
-    arn_pdf = db.Column(db.LargeBinary, nullable=True)
+    arn_pdf = deferred(db.Column(db.LargeBinary, nullable=True), group='documentos')
     arn_pdf_nombre = db.Column(db.String(255), nullable=True)
-    discapacidad_pdf = db.Column(db.LargeBinary, nullable=True)
+    discapacidad_pdf = deferred(db.Column(db.LargeBinary, nullable=True), group='documentos')
     discapacidad_pdf_nombre = db.Column(db.String(255), nullable=True)
     # Documentación de control (obligatoria)
-    antecedentes_fiscales_pdf = db.Column(db.LargeBinary, nullable=True)
+    antecedentes_fiscales_pdf = deferred(db.Column(db.LargeBinary, nullable=True), group='documentos')
     antecedentes_fiscales_pdf_nombre = db.Column(db.String(255), nullable=True)
-    antecedentes_disciplinarios_pdf = db.Column(db.LargeBinary, nullable=True)
+    antecedentes_disciplinarios_pdf = deferred(db.Column(db.LargeBinary, nullable=True), group='documentos')
     antecedentes_disciplinarios_pdf_nombre = db.Column(db.String(255), nullable=True)
-    antecedentes_judiciales_pdf = db.Column(db.LargeBinary, nullable=True)
+    antecedentes_judiciales_pdf = deferred(db.Column(db.LargeBinary, nullable=True), group='documentos')
     antecedentes_judiciales_pdf_nombre = db.Column(db.String(255), nullable=True)
-    redam_pdf = db.Column(db.LargeBinary, nullable=True)
+    redam_pdf = deferred(db.Column(db.LargeBinary, nullable=True), group='documentos')
     redam_pdf_nombre = db.Column(db.String(255), nullable=True)
-    inhabilidades_sexuales_pdf = db.Column(db.LargeBinary, nullable=True)
+    inhabilidades_sexuales_pdf = deferred(db.Column(db.LargeBinary, nullable=True), group='documentos')
     inhabilidades_sexuales_pdf_nombre = db.Column(db.String(255), nullable=True)
-    declaracion_capacidad_legal_pdf = db.Column(db.LargeBinary, nullable=True)
+    declaracion_capacidad_legal_pdf = deferred(db.Column(db.LargeBinary, nullable=True), group='documentos')
     declaracion_capacidad_legal_pdf_nombre = db.Column(db.String(255), nullable=True)
     # Estado y resultado de control
     estado_control = db.Column(db.String(20), default='pendiente')  # pendiente | completo
@@ -70,14 +74,14 @@ class User(db.Model):
     # Certificación de Funcionamiento del Emprendimiento
     emprendimiento_formalizado = db.Column(db.Boolean, nullable=True)  # True = formalizado, False = informal
     # Documentos para emprendimientos formalizados
-    matricula_mercantil_pdf = db.Column(db.LargeBinary, nullable=True)
+    matricula_mercantil_pdf = deferred(db.Column(db.LargeBinary, nullable=True), group='documentos')
     matricula_mercantil_pdf_nombre = db.Column(db.String(255), nullable=True)
-    facturas_6meses_pdf = db.Column(db.LargeBinary, nullable=True)
+    facturas_6meses_pdf = deferred(db.Column(db.LargeBinary, nullable=True), group='documentos')
     facturas_6meses_pdf_nombre = db.Column(db.String(255), nullable=True)
     # Documentos para emprendimientos informales
-    publicaciones_redes_pdf = db.Column(db.LargeBinary, nullable=True)
+    publicaciones_redes_pdf = deferred(db.Column(db.LargeBinary, nullable=True), group='documentos')
     publicaciones_redes_pdf_nombre = db.Column(db.String(255), nullable=True)
-    registro_ventas_pdf = db.Column(db.LargeBinary, nullable=True)
+    registro_ventas_pdf = deferred(db.Column(db.LargeBinary, nullable=True), group='documentos')
     registro_ventas_pdf_nombre = db.Column(db.String(255), nullable=True)
     
     # Financiación de Otras Fuentes
@@ -202,5 +206,32 @@ class User(db.Model):
             # Gestión de fases (con verificaciones seguras)
             'fase_actual': getattr(self, 'fase_actual', 'inscripcion'),
             'fecha_entrada_fase': getattr(self, 'fecha_entrada_fase', None).isoformat() if hasattr(self, 'fecha_entrada_fase') and getattr(self, 'fecha_entrada_fase', None) else None,
-            'fase_completada': getattr(self, 'fase_completada', False)
+            'fase_completada': getattr(self, 'fase_completada', False),
+            # Presencia de documentos (calculada en SQL, sin cargar los archivos)
+            'documentos': self.documentos_presentes()
         }
+
+    def documentos_presentes(self):
+        """Diccionario {doc_type: bool} con los documentos cargados"""
+        return {doc_type: bool(getattr(self, f'tiene_{doc_type}')) for doc_type in DOCUMENTOS_USUARIO}
+
+    @classmethod
+    def query_light(cls):
+        """Consulta para listados: sin columnas binarias y con los indicadores de documentos en la misma fila"""
+        return cls.query.options(undefer_group('documentos_presentes'))
+
+
+# Indicadores "tiene_<doc_type>": el documento está en el almacén documento_usuario
+# o todavía en la columna histórica de "user". Se calculan con IS NOT NULL / EXISTS
+# y nunca transfieren los bytes.
+for _doc_type in DOCUMENTOS_USUARIO:
+    setattr(User, f'tiene_{_doc_type}', column_property(
+        User.__table__.c[_doc_type].isnot(None) |
+        select(DocumentoUsuario.id).where(
+            DocumentoUsuario.user_id == User.id,
+            DocumentoUsuario.doc_type == _doc_type
+        ).exists(),
+        deferred=True,
+        group='documentos_presentes'
+    ))
+del _doc_type
@@ -0,0 +1,64 @@
+from datetime import datetime
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from . import db
+from .user import User
+
+# Cambios de usuario que invalidan los tokens ya emitidos (los llevan en sus claims)
+ATRIBUTOS_TOKEN = ('rol', 'estado_cuenta')
+
+
+class VersionToken(db.Model):
+    """Versión de los tokens de un usuario.
+
+    Cada token lleva la versión vigente al emitirse; cuando cambia el rol o
+    el estado de la cuenta (o se elimina el usuario) la versión se incrementa
+    y los tokens anteriores dejan de aceptarse. Solo hay filas para usuarios
+    que alguna vez cambiaron. No tiene clave foránea a "user" a propósito: la
+    fila debe sobrevivir al borrado del usuario para revocar sus tokens.
+    """
+    __tablename__ = 'version_token'
+
+    usuario_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    fecha_actualizacion = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<VersionToken {self.usuario_id}: {self.version}>'
+
+    @staticmethod
+    def incrementar(connection, usuario_ids):
+        """Incrementar la versión de varios usuarios con un único upsert"""
+        # Hora de la base de datos: es con la que comparan todos los procesos
+        filas = [
+            {'usuario_id': usuario_id, 'version': 1, 'fecha_actualizacion': func.now()}
+            for usuario_id in sorted(set(usuario_ids))
+        ]
+        if not filas:
+            return
+        tabla = VersionToken.__table__
+        stmt = pg_insert(tabla).values(filas)
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=['usuario_id'],
+            set_={'version': tabla.c.version + 1, 'fecha_actualizacion': func.now()}
+        ))
+
+
+@event.listens_for(Session, 'after_flush')
+def _revocar_tokens(session, flush_context):
+    """Incrementar la versión de tokens en la misma transacción que el cambio de rol/estado"""
+    usuario_ids = set()
+
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            usuario_ids.add(obj.id)
+
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            estado = inspect(obj)
+            if any(estado.attrs[a].history.has_changes() for a in ATRIBUTOS_TOKEN):
+                usuario_ids.add(obj.id)
+
+    if usuario_ids:
+        VersionToken.incrementar(session.connection(), usuario_ids)
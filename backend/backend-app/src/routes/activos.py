@@ -1,7 +1,8 @@
 from flask import Blueprint, jsonify, request, session
-from src.models import db, Activo, UsuarioActivo, User, LogActividad
+from src.models import db, Activo, UsuarioActivo, User
 from datetime import datetime
-from src.routes.admin import require_admin  # Reutilizar el decorador de admin
+from src.services.activity_log import registrar_actividad
+from src.services.identity_service import require_admin, usuario_actual
 
 activos_bp = Blueprint('activos', __name__)
 
@@ -30,12 +31,7 @@ def create_activo():
         db.session.add(new_activo)
         db.session.commit()
 
-        db.session.add(LogActividad(
-            usuario_id=session.get('user_id'),
-            accion='crear_activo',
-            detalles=f"Activo '{nombre}' creado por admin."
-        ))
-        db.session.commit()
+        registrar_actividad(session.get('user_id'), 'crear_activo', f"Activo '{nombre}' creado por admin.")
 
         return jsonify({'message': 'Activo creado exitosamente', 'activo': new_activo.to_dict()}), 201
 
@@ -48,7 +44,7 @@ def get_activos():
     """Listar activos disponibles (activos para todos, inactivos solo para admin)"""
     try:
         user_id = session.get('user_id')
-        user = User.query.get(user_id) if user_id else None
+        user = usuario_actual() if user_id else None
         
         if user and user.rol == 'admin':
             activos = Activo.query.all()
@@ -86,12 +82,7 @@ def update_activo(activo_id):
 
         db.session.commit()
 
-        db.session.add(LogActividad(
-            usuario_id=session.get('user_id'),
-            accion='actualizar_activo',
-            detalles=f"Activo '{activo.nombre}' (ID: {activo.id}) actualizado por admin."
-        ))
-        db.session.commit()
+        registrar_actividad(session.get('user_id'), 'actualizar_activo', f"Activo '{activo.nombre}' (ID: {activo.id}) actualizado por admin.")
 
         return jsonify({'message': 'Activo actualizado exitosamente', 'activo': activo.to_dict()}), 200
 
@@ -121,12 +112,7 @@ def assign_activo_to_user(activo_id, user_id):
         db.session.add(new_assignment)
         db.session.commit()
 
-        db.session.add(LogActividad(
-            usuario_id=session.get('user_id'),
-            accion='asignar_activo',
-            detalles=f"Activo '{activo.nombre}' (ID: {activo_id}) asignado a usuario {user.email} (ID: {user_id}) por admin."
-        ))
-        db.session.commit()
+        registrar_actividad(session.get('user_id'), 'asignar_activo', f"Activo '{activo.nombre}' (ID: {activo_id}) asignado a usuario {user.email} (ID: {user_id}) por admin.")
 
         return jsonify({'message': 'Activo asignado exitosamente', 'asignacion': new_assignment.to_dict()}), 201
 
@@ -143,7 +129,7 @@ def update_usuario_activo_status(asignacion_id):
             return jsonify({'error': 'No autorizado'}), 401
 
         # Verificar si es admin o el usuario propietario
-        user = User.query.get(user_id)
+        user = usuario_actual()
         asignacion = UsuarioActivo.query.get_or_404(asignacion_id)
         
         if user.rol != 'admin' and asignacion.user_id != user_id:
@@ -184,12 +170,7 @@ def update_usuario_activo_status(asignacion_id):
         if new_estado and new_estado != old_estado:
             detalles_log += f" Estado: {old_estado} -> {new_estado}."
 
-        db.session.add(LogActividad(
-            usuario_id=user_id,
-            accion='actualizar_activo_usuario',
-            detalles=detalles_log
-        ))
-        db.session.commit()
+        registrar_actividad(user_id, 'actualizar_activo_usuario', detalles_log)
 
         return jsonify({'message': 'Estado del activo asignado actualizado exitosamente', 'asignacion': asignacion.to_dict()}), 200
 
@@ -221,7 +202,7 @@ def get_activos_usuario(user_id):
         
         # Solo el usuario puede ver sus activos, o un admin
         if session_user_id != user_id:
-            user = User.query.get(session_user_id)
+            user = usuario_actual()
             if not user or user.rol != 'admin':
                 return jsonify({'error': 'No autorizado para ver estos activos'}), 403
         
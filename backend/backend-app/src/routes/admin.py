@@ -1,78 +1,53 @@
-from flask import Blueprint, jsonify, request, session, send_file  # pyright: ignore[reportMissingImports]
-from src.models import db, User, Curso, Inscripcion, LogActividad, CuposConfig, MunicipioCupo, Notificacion
-from datetime import datetime, timedelta
-import csv
-import io
-import tempfile
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from openpyxl.utils import get_column_letter
+from flask import Blueprint, jsonify, request, session  # pyright: ignore[reportMissingImports]
+from src.models import db, User, Curso, Inscripcion, CuposConfig, MunicipioCupo, CupoOcupacion, TrabajoExportacion
+from src.services.document_streaming import responder_documento_usuario, responder_blob
+from src.services.metrics_service import metricas_dashboard, metricas_certificados, metricas_fases
+from src.services import export_jobs
+from src.services.import_service import importar_usuarios_csv
+from src.services.activity_log import registrar_actividad
+from src.services.log_query_service import consulta_logs, pagina_logs, MAX_POR_PAGINA as MAX_LOGS_POR_PAGINA
+from src.services.bulk_user_service import (
+    FASES_VALIDAS, SeleccionInvalida, condicion_seleccion, actualizar_cuentas, cambiar_fase
+)
+from src.services.user_search_service import (
+    filtrar_busqueda, pagina_por_cursor, contar_exacto, contar_aproximado, ORDEN_DIRECTORIO, MAX_POR_PAGINA
+)
+from src.services.identity_service import require_admin
+from datetime import datetime
 
 admin_bp = Blueprint('admin', __name__)
 
-def require_admin(f):
-    """Decorador para requerir rol de administrador"""
-    def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
-            return jsonify({'error': 'No autorizado'}), 401
-        
-        user = User.query.get(session['user_id'])
-        if not user or user.rol != 'admin':
-            return jsonify({'error': 'Acceso denegado. Se requiere rol de administrador'}), 403
-        
-        return f(*args, **kwargs)
-    decorated_function.__name__ = f.__name__
-    return decorated_function
-
 @admin_bp.route('/dashboard/metrics', methods=['GET'])
 @require_admin
 def get_dashboard_metrics():
     """Obtener métricas generales del dashboard"""
     try:
-        # Total de usuarios registrados
-        total_usuarios = User.query.count()
-        
-        # Usuarios por estado
-        usuarios_activos = User.query.filter_by(estado_cuenta='activa').count()
-        usuarios_inactivos = User.query.filter_by(estado_cuenta='inactiva').count()
-        usuarios_suspendidos = User.query.filter_by(estado_cuenta='suspendida').count()
-        
-        # Usuarios por rol
-        estudiantes = User.query.filter_by(rol='estudiante').count()
-        instructores = User.query.filter_by(rol='instructor').count()
-        admins = User.query.filter_by(rol='admin').count()
-        
-        # Cursos activos
-        cursos_activos = Curso.query.filter_by(activo=True).count()
-        total_cursos = Curso.query.count()
+        # Conteos de usuarios y cursos (una consulta por tabla)
+        usuarios, cursos = metricas_dashboard()
         
         # Inscripciones (simulado por ahora)
         total_inscripciones = 0
         inscripciones_activas = 0
         
-        # Usuarios registrados en los últimos 30 días
-        fecha_limite = datetime.utcnow() - timedelta(days=30)
-        nuevos_usuarios = User.query.filter(User.fecha_creacion >= fecha_limite).count()
-        
         # Actividad reciente (simulado por ahora)
         actividad_reciente = 0
         
         return jsonify({
             'usuarios': {
-                'total': total_usuarios,
-                'activos': usuarios_activos,
-                'inactivos': usuarios_inactivos,
-                'suspendidos': usuarios_suspendidos,
-                'nuevos_30_dias': nuevos_usuarios
+                'total': usuarios['total'],
+                'activos': usuarios['activos'],
+                'inactivos': usuarios['inactivos'],
+                'suspendidos': usuarios['suspendidos'],
+                'nuevos_30_dias': usuarios['nuevos_30_dias']
             },
             'roles': {
-                'estudiantes': estudiantes,
-                'instructores': instructores,
-                'administradores': admins
+                'estudiantes': usuarios['estudiantes'],
+                'instructores': usuarios['instructores'],
+                'administradores': usuarios['admins']
             },
             'cursos': {
-                'total': total_cursos,
-                'activos': cursos_activos
+                'total': cursos['total'],
+                'activos': cursos['activos']
             },
             'inscripciones': {
                 'total': total_inscripciones,
@@ -113,15 +88,7 @@ def cupos_config():
         cfg = CuposConfig(modo=modo, cupo_global_max=cupo_global_max, convocatoria=convocatoria)
         db.session.add(cfg)
         db.session.commit()
-        try:
-            db.session.add(LogActividad(
-                usuario_id=session.get('user_id'),
-                accion='config_cupo_actualizada',
-                detalles=f"modo={modo}, cupo_global_max={cupo_global_max}, convocatoria={convocatoria}"
-            ))
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
+        registrar_actividad(session.get('user_id'), 'config_cupo_actualizada', f"modo={modo}, cupo_global_max={cupo_global_max}, convocatoria={convocatoria}")
         return jsonify({'message': 'Configuración actualizada', 'config': cfg.to_dict()}), 200
     except Exception as e:
         db.session.rollback()
@@ -156,15 +123,7 @@ def cupos_municipios():
                 else:
                     db.session.add(MunicipioCupo(municipio_slug=slug, subregion=it.get('subregion') or '', cupo_max=cupo))
         db.session.commit()
-        try:
-            db.session.add(LogActividad(
-                usuario_id=session.get('user_id'),
-                accion='municipio_cupo_actualizado',
-                detalles=f"items={len(items)}"
-            ))
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
+        registrar_actividad(session.get('user_id'), 'municipio_cupo_actualizado', f"items={len(items)}")
         return jsonify({'message': 'Cupos de municipios actualizados'}), 200
     except Exception as e:
         db.session.rollback()
@@ -184,10 +143,8 @@ def cupos_estado():
         municipios = MunicipioCupo.query.all()
         muni_info = {m.municipio_slug: {'subregion': m.subregion, 'cupo_max': int(m.cupo_max)} for m in municipios}
 
-        # Conteos por municipio
-        q_base = db.session.query(User.municipio, User.estado_cuenta, db.func.count(User.id)).filter(
-            User.convocatoria == convocatoria
-        ).group_by(User.municipio, User.estado_cuenta).all()
+        # Conteos por municipio (contadores materializados)
+        q_base = CupoOcupacion.conteos_por_municipio(convocatoria)
 
         confirmados_map = {}
         espera_map = {}
@@ -266,114 +223,55 @@ def cupos_estado():
         return jsonify({'error': f'Error al obtener estado de cupos: {str(e)}'}), 500
 
 
+@admin_bp.route('/cupos/reconciliar', methods=['POST'])
+@require_admin
+def cupos_reconciliar():
+    """Recalcular los contadores de ocupación de cupos desde la tabla de usuarios"""
+    try:
+        convocatoria = (request.json or {}).get('convocatoria') if request.is_json else None
+        filas = CupoOcupacion.reconciliar(convocatoria)
+        db.session.commit()
+        registrar_actividad(session.get('user_id'), 'cupos_reconciliados', f"convocatoria={convocatoria or 'todas'}, filas={filas}")
+        return jsonify({'message': 'Contadores de cupos reconciliados', 'filas': filas}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Error al reconciliar cupos: {str(e)}'}), 500
+
+
 @admin_bp.route('/cupos/estado/export', methods=['GET'])
 @require_admin
 def cupos_estado_export():
-    """Exportar estado de cupos en Excel"""
+    """Exportar estado de cupos en Excel (se encola; descargar desde /exportaciones/<id>/descarga)"""
     try:
-        # Reusar lógica del endpoint anterior
-        cfg = CuposConfig.query.order_by(CuposConfig.id.desc()).first()
-        convocatoria = cfg.convocatoria if cfg else '2025'
-        municipios = MunicipioCupo.query.all()
-        muni_info = {m.municipio_slug: {'subregion': m.subregion, 'cupo_max': int(m.cupo_max)} for m in municipios}
-        q_base = db.session.query(User.municipio, User.estado_cuenta, db.func.count(User.id)).filter(
-            User.convocatoria == convocatoria
-        ).group_by(User.municipio, User.estado_cuenta).all()
-        confirmados_map, espera_map = {}, {}
-        for muni, estado, cnt in q_base:
-            if muni is None:
-                continue
-            if estado in ('activa', 'inactiva'):
-                confirmados_map[muni] = confirmados_map.get(muni, 0) + int(cnt)
-            elif estado == 'lista_espera':
-                espera_map[muni] = espera_map.get(muni, 0) + int(cnt)
-        
-        # Crear workbook de Excel
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Estado de Cupos"
-        
-        # Estilos para el encabezado
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="2E75B6", end_color="2E75B6", fill_type="solid")
-        header_alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-        thin_border = Border(
-            left=Side(style='thin'), right=Side(style='thin'),
-            top=Side(style='thin'), bottom=Side(style='thin')
-        )
-        
-        # Estilos para datos
-        data_alignment = Alignment(horizontal="center", vertical="center")
-        green_fill = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")  # Verde para disponible
-        red_fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")    # Rojo para agotado
-        yellow_fill = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid") # Amarillo para ocupación alta
-        
-        # Encabezados
-        headers = ['Subregión', 'Municipio', 'Cupo Máximo', 'Confirmados', 'Lista Espera', 'Disponibles', '% Ocupación']
-        
-        # Escribir encabezados con formato
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = thin_border
-        
-        # Datos con formato condicional
-        for row, (muni, info) in enumerate(sorted(muni_info.items(), key=lambda x: (x[1]['subregion'], x[0])), 2):
-            cupo_max = info['cupo_max']
-            conf = confirmados_map.get(muni, 0)
-            esp = espera_map.get(muni, 0)
-            disp = max(0, cupo_max - conf)
-            pct = round((conf / cupo_max * 100.0), 2) if cupo_max > 0 else 0.0
-            
-            data = [info['subregion'], muni, cupo_max, conf, esp, disp, f"{pct}%"]
-            
-            # Escribir datos con formato condicional
-            for col, value in enumerate(data, 1):
-                cell = ws.cell(row=row, column=col, value=value)
-                cell.alignment = data_alignment
-                cell.border = thin_border
-                
-                # Aplicar colores según ocupación (columna % Ocupación)
-                if col == 7:  # Columna de porcentaje
-                    if pct >= 100:
-                        cell.fill = red_fill  # Rojo si está al 100% o más
-                    elif pct >= 80:
-                        cell.fill = yellow_fill  # Amarillo si está entre 80-99%
-                    else:
-                        cell.fill = green_fill  # Verde si está por debajo del 80%
-        
-        # Ajustar ancho de columnas
-        for col in range(1, len(headers) + 1):
-            column_letter = get_column_letter(col)
-            ws.column_dimensions[column_letter].width = 15
-        
-        # Crear archivo en memoria
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        return output.getvalue(), 200, {
-            'Content-Type': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            'Content-Disposition': 'attachment; filename=estado_cupos.xlsx'
-        }
+        respuesta, status = export_jobs.solicitar('cupos', session.get('user_id'))
+        return jsonify(respuesta), status
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': f'Error al exportar: {str(e)}'}), 500
 
 @admin_bp.route('/users', methods=['GET'])
 @require_admin
 def get_users():
-    """Obtener lista de usuarios con filtros"""
+    """Obtener lista de usuarios con filtros
+
+    Con `cursor` (vacío para la primera página) se pagina por keyset sobre
+    (fecha_creacion, id) y se devuelve `next_cursor`; si no, se usa `page`.
+    `conteo` elige el total: exacto, aproximado (estimación del planificador)
+    o ninguno. Por defecto es exacto con `page` y aproximado con `cursor`.
+    """
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
+        cursor = request.args.get('cursor')
         estado = request.args.get('estado')
         rol = request.args.get('rol')
         search = request.args.get('search')
         estado_control = request.args.get('estado_control')
+        conteo = request.args.get('conteo', 'exacto' if cursor is None else 'aproximado')
+        if conteo not in ('exacto', 'aproximado', 'ninguno'):
+            return jsonify({'error': 'conteo debe ser exacto, aproximado o ninguno'}), 400
         
-        query = User.query
+        query = User.query_light()
         
         # Aplicar filtros
         if estado:
@@ -383,23 +281,42 @@ def get_users():
         if estado_control:
             query = query.filter_by(estado_control=estado_control)
         if search:
-            search_term = f"%{search}%"
-            query = query.filter(
-                (User.nombre.ilike(search_term)) |
-                (User.apellido.ilike(search_term)) |
-                (User.email.ilike(search_term)) |
-                (User.numero_documento.ilike(search_term))
-            )
+            query = filtrar_busqueda(query, search)
+        
+        total = None
+        if conteo == 'exacto':
+            total = contar_exacto(query)
+        elif conteo == 'aproximado':
+            total = contar_aproximado(query)
+        
+        if cursor is not None:
+            try:
+                users, next_cursor = pagina_por_cursor(query, cursor, per_page)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            return jsonify({
+                'users': [user.to_dict() for user in users],
+                'pagination': {
+                    'per_page': min(max(per_page, 1), MAX_POR_PAGINA),
+                    'total': total,
+                    'total_aproximado': conteo == 'aproximado',
+                    'next_cursor': next_cursor,
+                    'has_next': next_cursor is not None
+                }
+            }), 200
         
         # Ordenar por fecha de creación (más recientes primero)
-        query = query.order_by(User.fecha_creacion.desc())
+        query = query.order_by(*ORDEN_DIRECTORIO)
         
-        # Paginación
+        # Paginación (el total ya se calculó arriba)
         pagination = query.paginate(
             page=page, 
             per_page=per_page, 
-            error_out=False
+            error_out=False,
+            count=False
         )
+        pagination.total = total
         
         users = pagination.items
         
@@ -408,9 +325,10 @@ def get_users():
             'pagination': {
                 'page': page,
                 'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_next': pagination.has_next,
+                'total': total,
+                'total_aproximado': conteo == 'aproximado',
+                'pages': pagination.pages if total is not None else None,
+                'has_next': pagination.has_next if total is not None else len(users) == per_page,
                 'has_prev': pagination.has_prev
             }
         }), 200
@@ -460,42 +378,58 @@ def update_user(user_id):
 @admin_bp.route('/users/bulk-update', methods=['POST'])
 @require_admin
 def bulk_update_users():
-    """Actualización masiva de usuarios"""
+    """Actualización masiva de usuarios (por IDs o por filtros) con un único UPDATE"""
     try:
-        data = request.json
-        user_ids = data.get('user_ids', [])
+        data = request.json or {}
         updates = data.get('updates', {})
+        estado_cuenta = updates.get('estado_cuenta')
+        rol = updates.get('rol')
         
-        if not user_ids:
-            return jsonify({'error': 'No se proporcionaron IDs de usuarios'}), 400
+        if estado_cuenta is None and rol is None:
+            return jsonify({'error': 'No se proporcionaron cambios'}), 400
         
-        users = User.query.filter(User.id.in_(user_ids)).all()
+        condicion = condicion_seleccion(data.get('user_ids'), data.get('filtros'))
+        actualizados = actualizar_cuentas(condicion, estado_cuenta=estado_cuenta, rol=rol, admin_id=session['user_id'])
+        db.session.commit()
         
-        for user in users:
-            if 'estado_cuenta' in updates:
-                user.estado_cuenta = updates['estado_cuenta']
-            if 'rol' in updates:
-                user.rol = updates['rol']
-            
-            user.fecha_actualizacion = datetime.utcnow()
+        return jsonify({
+            'message': f'{actualizados} usuarios actualizados exitosamente',
+            'actualizados': actualizados
+        }), 200
         
-        # Registrar actividad (temporalmente comentado por problemas de mapeo)
-        # log = LogActividad(
-        #     usuario_id=session['user_id'],
-        #     accion='actualizacion_masiva_usuarios',
-        #     detalles=f'Actualización masiva de {len(users)} usuarios'
-        # )
-        # db.session.add(log)
+    except SeleccionInvalida as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Error en actualización masiva: {str(e)}'}), 500
+
+@admin_bp.route('/users/bulk-phase', methods=['POST'])
+@require_admin
+def bulk_update_phase():
+    """Cambiar la fase de varios usuarios (por IDs o por filtros) en una transacción"""
+    try:
+        data = request.json or {}
+        nueva_fase = data.get('nueva_fase')
         
+        if nueva_fase not in FASES_VALIDAS:
+            return jsonify({'error': 'Fase no válida'}), 400
+        
+        condicion = condicion_seleccion(data.get('user_ids'), data.get('filtros'))
+        actualizados, fecha = cambiar_fase(condicion, nueva_fase)
         db.session.commit()
         
         return jsonify({
-            'message': f'{len(users)} usuarios actualizados exitosamente'
+            'message': f'{actualizados} usuarios movidos a la fase {nueva_fase}',
+            'actualizados': actualizados,
+            'fase_actual': nueva_fase,
+            'fecha_entrada_fase': fecha.isoformat()
         }), 200
         
+    except SeleccionInvalida as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
-        return jsonify({'error': f'Error en actualización masiva: {str(e)}'}), 500
+        return jsonify({'error': f'Error al actualizar fases: {str(e)}'}), 500
 
 @admin_bp.route('/users/import', methods=['POST'])
 @require_admin
@@ -512,44 +446,9 @@ def import_users():
         if not file.filename.endswith('.csv'):
             return jsonify({'error': 'El archivo debe ser CSV'}), 400
         
-        # Leer CSV
-        stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-        csv_reader = csv.DictReader(stream)
-        
-        imported_count = 0
-        errors = []
-        
-        for row_num, row in enumerate(csv_reader, 2):  # Empezar en 2 porque la fila 1 es header
-            try:
-                # Validar campos requeridos
-                required_fields = ['nombre', 'apellido', 'email', 'password', 'tipo_documento', 'numero_documento']
-                for field in required_fields:
-                    if not row.get(field):
-                        errors.append(f"Fila {row_num}: Campo '{field}' es requerido")
-                        continue
-                
-                # Verificar si el email ya existe
-                if User.query.filter_by(email=row['email']).first():
-                    errors.append(f"Fila {row_num}: Email '{row['email']}' ya existe")
-                    continue
-                
-                # Crear usuario
-                user = User(
-                    nombre=row['nombre'],
-                    apellido=row['apellido'],
-                    email=row['email'],
-                    tipo_documento=row['tipo_documento'],
-                    numero_documento=row['numero_documento'],
-                    rol=row.get('rol', 'estudiante'),
-                    estado_cuenta=row.get('estado_cuenta', 'inactiva')
-                )
-                user.set_password(row['password'])
-                
-                db.session.add(user)
-                imported_count += 1
-                
-            except Exception as e:
-                errors.append(f"Fila {row_num}: Error - {str(e)}")
+        # Procesar por lotes (duplicados en una consulta, hashes en paralelo, INSERT múltiple)
+        resultado = importar_usuarios_csv(file.stream)
+        imported_count = resultado['importados']
         
         if imported_count > 0:
             # Registrar actividad (temporalmente comentado por problemas de mapeo)
@@ -565,7 +464,8 @@ def import_users():
         return jsonify({
             'message': f'Importación completada',
             'imported_count': imported_count,
-            'errors': errors
+            'errors': [f"Fila {e['fila']}: {e['error']}" for e in resultado['errores']],
+            'error_rows': resultado['errores']
         }), 200
         
     except Exception as e:
@@ -575,281 +475,21 @@ def import_users():
 @admin_bp.route('/users/export', methods=['GET'])
 @require_admin
 def export_users():
-    """Exportar todos los usuarios a Excel con formato profesional para auditorías"""
+    """Exportar todos los usuarios a Excel con formato profesional para auditorías
+
+    El archivo lo genera el worker de exportaciones: se devuelve el trabajo
+    (202) y se descarga desde /exportaciones/<id>/descarga al completarse.
+    """
     try:
-        # Obtener todos los usuarios
-        users = User.query.all()
-        
-        # Crear workbook de Excel
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Usuarios Registrados"
-        
-        # Crear segunda hoja para detalle de cursos
-        ws_cursos = wb.create_sheet("Detalle Cursos por Usuario")
-        
-        # Estilos para el encabezado
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="2E75B6", end_color="2E75B6", fill_type="solid")
-        header_alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-        thin_border = Border(
-            left=Side(style='thin'), right=Side(style='thin'),
-            top=Side(style='thin'), bottom=Side(style='thin')
-        )
-        
-        # Estilos para datos
-        data_alignment = Alignment(horizontal="center", vertical="center")
-        green_fill = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")  # Verde claro para ✔️
-        red_fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")    # Rojo claro para ❌
-        yellow_fill = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid") # Amarillo para pendiente
-        
-        # Encabezados organizados según el formulario multistep + datos de cursos
-        headers = [
-            # PASO 1: Información básica
-            'ID', 'Nombre', 'Apellido', 'Email', 'Municipio', 'Tipo Documento', 'Número Documento', 
-            'Tipo Persona', 'Emprendimiento', 'Sector', 'Estado Cuenta', 'Fecha Creación',
-            
-            # PASO 2: Documentación obligatoria
-            'TDR', 'Uso Imagen', 'Plan Negocio', 'Vecindad', 'Video',
-            
-            # PASO 3: Documentación según tipo de persona
-            'RUT', 'Cédula', 'Cédula Representante', 'Cert. Existencia',
-            
-            # PASO 4: Documentación diferencial (subsanable)
-            'RUV', 'SISBEN', 'Grupo Étnico', 'ARN', 'Discapacidad',
-            
-            # PASO 5: Documentación de control (obligatoria)
-            'Fiscales', 'Disciplinarios', 'Judiciales', 'REDAM', 'Inhab. Sexuales', 'Capacidad Legal',
-            'Estado Control', 'Resultado Certificados',
-            
-            # PASO 6: Certificación de funcionamiento
-            'Formalizado', 'Matrícula Mercantil', 'Facturas 6M', 'Publicaciones Redes', 'Registro Ventas',
-            
-            # PASO 7: Financiación de otras fuentes
-            'Financiado Estado', 'Regalías', 'Cámara Comercio', 'Incubadoras', 'Otro Financ.',
-            
-            # PASO 8: Declaraciones y aceptaciones
-            'Declara Veraz', 'Declara No Beneficiario', 'Acepta Términos',
-            
-            # Estado del proceso
-            'Paso Actual', 'Formulario Enviado', 'Estado Inscripción',
-            
-                # NUEVOS: Datos de cursos
-                'Cursos Asignados', 'Cursos Completados', 'Avance Cursos (%)', 'Fase Actual',
-                
-                # NUEVOS: Datos de evidencias
-                'Evidencias Estado', 'Tipo Emprendimiento'
-        ]
-        
-        # Escribir encabezados con formato
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = thin_border
-        
-        # Datos de usuarios
-        for row, user in enumerate(users, 2):
-            # Función helper para estado de documento
-            def doc_status(doc_field, is_optional=False):
-                if doc_field:
-                    return "✔️"
-                elif is_optional:
-                    return "⚠️"  # Pendiente/subsanable
-                else:
-                    return "❌"
-            
-            # Obtener datos de cursos del usuario
-            from src.models import UsuarioCurso, EvidenciaFuncionamiento
-            cursos_asignados = UsuarioCurso.query.filter_by(user_id=user.id).count()
-            cursos_completados = UsuarioCurso.query.filter_by(user_id=user.id, estado='completado').count()
-            avance_cursos = round((cursos_completados / cursos_asignados * 100) if cursos_asignados > 0 else 0, 2)
-            
-            # Datos de evidencias
-            evidencia = EvidenciaFuncionamiento.query.filter_by(user_id=user.id).first()
-            evidencias_estado = evidencia.estado_revision if evidencia else 'Sin evidencias'
-            tipo_emprendimiento = evidencia.tipo if evidencia else 'N/A'
-            
-            # Datos básicos
-            data = [
-                user.id,
-                user.nombre or '',
-                user.apellido or '',
-                user.email or '',
-                user.municipio or '',
-                user.tipo_documento or '',
-                user.numero_documento or '',
-                user.tipo_persona or '',
-                user.emprendimiento_nombre or '',
-                user.emprendimiento_sector or '',
-                user.estado_cuenta or '',
-                user.fecha_creacion.strftime('%Y-%m-%d %H:%M') if user.fecha_creacion else '',
-                
-                # Documentación obligatoria
-                doc_status(user.doc_terminos_pdf),
-                doc_status(user.doc_uso_imagen_pdf),
-                doc_status(user.doc_plan_negocio_xls),
-                doc_status(user.doc_vecindad_pdf),
-                doc_status(user.video_url),
-                
-                # Documentación según tipo de persona
-                doc_status(user.rut_pdf),
-                doc_status(user.cedula_pdf),
-                doc_status(user.cedula_representante_pdf),
-                doc_status(user.cert_existencia_pdf),
-                
-                # Documentación diferencial (subsanable)
-                doc_status(user.ruv_pdf, is_optional=True),
-                doc_status(user.sisben_pdf, is_optional=True),
-                doc_status(user.grupo_etnico_pdf, is_optional=True),
-                doc_status(user.arn_pdf, is_optional=True),
-                doc_status(user.discapacidad_pdf, is_optional=True),
-                
-                # Documentación de control
-                doc_status(user.antecedentes_fiscales_pdf),
-                doc_status(user.antecedentes_disciplinarios_pdf),
-                doc_status(user.antecedentes_judiciales_pdf),
-                doc_status(user.redam_pdf),
-                doc_status(user.inhabilidades_sexuales_pdf),
-                doc_status(user.declaracion_capacidad_legal_pdf),
-                user.estado_control or 'pendiente',
-                'RECHAZADO AUTOMÁTICO' if user.resultado_certificados == 'inhabilidad_detectada' and user.estado_cuenta == 'rechazada' else (user.resultado_certificados or 'pendiente'),
-                
-                # Certificación de funcionamiento
-                'Sí' if user.emprendimiento_formalizado else 'No' if user.emprendimiento_formalizado is not None else 'N/A',
-                doc_status(user.matricula_mercantil_pdf),
-                doc_status(user.facturas_6meses_pdf),
-                doc_status(user.publicaciones_redes_pdf),
-                doc_status(user.registro_ventas_pdf),
-                
-                # Financiación
-                'Sí' if user.financiado_estado else 'No' if user.financiado_estado is not None else 'N/A',
-                '✔️' if user.financiado_regalias else '❌',
-                '✔️' if user.financiado_camara_comercio else '❌',
-                '✔️' if user.financiado_incubadoras else '❌',
-                '✔️' if user.financiado_otro else '❌',
-                
-                # Declaraciones
-                '✔️' if user.declara_veraz else '❌',
-                '✔️' if user.declara_no_beneficiario else '❌',
-                '✔️' if user.acepta_terminos else '❌',
-                
-                # Estado del proceso
-                user.paso_actual or 1,
-                'Sí' if user.formulario_enviado else 'No',
-                user.estado_inscripcion or 'borrador',
-                
-                # Datos de cursos
-                cursos_asignados,
-                cursos_completados,
-                f"{avance_cursos}%",
-                getattr(user, 'fase_actual', 'N/A') or 'N/A',
-                
-                # Datos de evidencias
-                evidencias_estado,
-                tipo_emprendimiento
-            ]
-            
-            # Escribir datos con formato condicional
-            for col, value in enumerate(data, 1):
-                cell = ws.cell(row=row, column=col, value=value)
-                cell.alignment = data_alignment
-                cell.border = thin_border
-                
-                # Aplicar colores según el valor
-                if value == "✔️":
-                    cell.fill = green_fill
-                elif value == "❌":
-                    cell.fill = red_fill
-                elif value == "⚠️":
-                    cell.fill = yellow_fill
-        
-        # Ajustar ancho de columnas
-        for col in range(1, len(headers) + 1):
-            column_letter = get_column_letter(col)
-            ws.column_dimensions[column_letter].width = 15
-        
-        # === SEGUNDA HOJA: Detalle de Cursos por Usuario ===
-        
-        # Encabezados para la hoja de cursos
-        headers_cursos = [
-            'Usuario ID', 'Nombre Usuario', 'Email Usuario', 'Curso ID', 'Título Curso', 
-            'Tipo Curso', 'Estado Curso', 'Progreso (%)', 'Fecha Asignación', 'Fecha Inicio', 
-            'Fecha Completado', 'Fecha Última Actividad'
-        ]
-        
-        # Escribir encabezados de cursos
-        for col, header in enumerate(headers_cursos, 1):
-            cell = ws_cursos.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = thin_border
-        
-        # Obtener todas las asignaciones de cursos
-        from src.models import UsuarioCurso
-        asignaciones = UsuarioCurso.query.join(User).join(Curso).all()
-        
-        # Escribir datos de cursos
-        for row, asignacion in enumerate(asignaciones, 2):
-            curso_data = [
-                asignacion.user_id,
-                f"{asignacion.user.nombre or ''} {asignacion.user.apellido or ''}".strip(),
-                asignacion.user.email or '',
-                asignacion.curso_id,
-                asignacion.curso.titulo or '',
-                asignacion.curso.tipo or '',
-                asignacion.estado or '',
-                f"{asignacion.progreso}%",
-                asignacion.fecha_asignacion.strftime('%Y-%m-%d %H:%M') if asignacion.fecha_asignacion else '',
-                asignacion.fecha_inicio.strftime('%Y-%m-%d %H:%M') if asignacion.fecha_inicio else '',
-                asignacion.fecha_completado.strftime('%Y-%m-%d %H:%M') if asignacion.fecha_completado else '',
-                asignacion.fecha_ultima_actividad.strftime('%Y-%m-%d %H:%M') if asignacion.fecha_ultima_actividad else ''
-            ]
-            
-            # Escribir datos con formato
-            for col, value in enumerate(curso_data, 1):
-                cell = ws_cursos.cell(row=row, column=col, value=value)
-                cell.alignment = data_alignment
-                cell.border = thin_border
-                
-                # Aplicar colores según el estado del curso
-                if asignacion.estado == 'completado':
-                    cell.fill = green_fill
-                elif asignacion.estado == 'en_progreso':
-                    cell.fill = yellow_fill
-                elif asignacion.estado == 'pendiente':
-                    cell.fill = red_fill
-        
-        # Ajustar ancho de columnas para la hoja de cursos
-        for col in range(1, len(headers_cursos) + 1):
-            column_letter = get_column_letter(col)
-            ws_cursos.column_dimensions[column_letter].width = 18
-        
-        # Crear archivo en memoria
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
+        respuesta, status = export_jobs.solicitar('usuarios', session['user_id'])
         
         # Registrar actividad
-        try:
-            log = LogActividad(
-                usuario_id=session['user_id'],
-                accion='exportar_usuarios_excel',
-                detalles=f'Exportados {len(users)} usuarios a Excel'
-            )
-            db.session.add(log)
-            db.session.commit()
-        except Exception as log_error:
-            print(f"Error al registrar log: {log_error}")
+        registrar_actividad(session['user_id'], 'exportar_usuarios_excel', f"Exportación de usuarios a Excel (trabajo {respuesta['trabajo']['id']})")
         
-        return output.getvalue(), 200, {
-            'Content-Type': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            'Content-Disposition': 'attachment; filename=usuarios_registrados.xlsx'
-        }
+        return jsonify(respuesta), status
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': f'Error en exportación: {str(e)}'}), 500
 
 @admin_bp.route('/users/<int:user_id>/certificados', methods=['PUT'])
@@ -878,28 +518,16 @@ def actualizar_resultado_certificados(user_id):
             # Log de auditoría del rechazo automático
             detalle_rechazo = f"RECHAZO AUTOMÁTICO: Usuario {user.nombre} {user.apellido} (ID: {user.id}) rechazado automáticamente por inhabilidad detectada en certificados de control. Estado anterior: {estado_anterior}. Resultado anterior: {resultado_anterior}"
             
-            db.session.add(LogActividad(
-                usuario_id=session['user_id'],
-                accion='rechazo_automatico_certificados',
-                detalles=detalle_rechazo
-            ))
+            registrar_actividad(session['user_id'], 'rechazo_automatico_certificados', detalle_rechazo, sincrono=True)
             
             # Log también en el usuario afectado
-            db.session.add(LogActividad(
-                usuario_id=user.id,
-                accion='cuenta_rechazada_automaticamente',
-                detalles=f"Cuenta rechazada automáticamente por inhabilidad detectada en certificados de control. Administrador que marcó: {session.get('user_email', 'N/A')}"
-            ))
+            registrar_actividad(user.id, 'cuenta_rechazada_automaticamente', f"Cuenta rechazada automáticamente por inhabilidad detectada en certificados de control. Administrador que marcó: {session.get('user_email', 'N/A')}", sincrono=True)
             
         elif resultado == 'limpio' and user.estado_cuenta == 'rechazada':
             # Si se marca como limpio y estaba rechazada, revertir a inactiva para revisión manual
             user.estado_cuenta = 'inactiva'
             
-            db.session.add(LogActividad(
-                usuario_id=session['user_id'],
-                accion='revertir_rechazo_certificados',
-                detalles=f"Rechazo revertido para usuario {user.nombre} {user.apellido} (ID: {user.id}). Certificados marcados como limpios. Estado cambiado a inactiva para revisión."
-            ))
+            registrar_actividad(session['user_id'], 'revertir_rechazo_certificados', f"Rechazo revertido para usuario {user.nombre} {user.apellido} (ID: {user.id}). Certificados marcados como limpios. Estado cambiado a inactiva para revisión.", sincrono=True)
         
         db.session.commit()
         
@@ -918,21 +546,18 @@ def actualizar_resultado_certificados(user_id):
 def estadisticas_certificados():
     """Obtener estadísticas de certificados de control y rechazos automáticos"""
     try:
-        # Estadísticas generales
-        total_usuarios = User.query.count()
-        control_completo = User.query.filter_by(estado_control='completo').count()
-        control_pendiente = User.query.filter_by(estado_control='pendiente').count()
-        
-        # Resultados de certificados
-        resultado_pendiente = User.query.filter_by(resultado_certificados='pendiente').count()
-        resultado_limpio = User.query.filter_by(resultado_certificados='limpio').count()
-        resultado_inhabilidad = User.query.filter_by(resultado_certificados='inhabilidad_detectada').count()
-        
-        # Rechazos automáticos
-        rechazados_automaticamente = User.query.filter_by(estado_cuenta='rechazada', resultado_certificados='inhabilidad_detectada').count()
+        # Estadísticas generales, resultados y rechazos automáticos (una sola consulta)
+        conteos = metricas_certificados()
+        total_usuarios = conteos['total']
+        control_completo = conteos['control_completo']
+        control_pendiente = conteos['control_pendiente']
+        resultado_pendiente = conteos['resultado_pendiente']
+        resultado_limpio = conteos['resultado_limpio']
+        resultado_inhabilidad = conteos['resultado_inhabilidad']
+        rechazados_automaticamente = conteos['rechazados_automaticamente']
         
         # Logs de rechazos automáticos recientes
-        rechazos_recientes = LogActividad.query.filter_by(accion='rechazo_automatico_certificados').order_by(LogActividad.fecha.desc()).limit(10).all()
+        rechazos_recientes, _ = pagina_logs(consulta_logs(accion='rechazo_automatico_certificados'), por_pagina=10)
         
         return jsonify({
             'estadisticas_generales': {
@@ -949,7 +574,7 @@ def estadisticas_certificados():
                 'total': rechazados_automaticamente,
                 'porcentaje': round((rechazados_automaticamente / total_usuarios * 100), 2) if total_usuarios > 0 else 0
             },
-            'rechazos_recientes': [log.to_dict() for log in rechazos_recientes]
+            'rechazos_recientes': rechazos_recientes
         }), 200
         
     except Exception as e:
@@ -958,25 +583,37 @@ def estadisticas_certificados():
 @admin_bp.route('/logs', methods=['GET'])
 @require_admin
 def get_logs():
-    """Obtener logs de actividad"""
+    """
+    Obtener logs de actividad, del más reciente al más antiguo
+
+    Filtros: usuario_id, accion, desde y hasta (fechas ISO; acotan las
+    particiones que se leen). Se pagina por keyset: la respuesta trae
+    `next_cursor`, que se envía como `cursor` para pedir la página siguiente.
+    """
     try:
-        page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 50, type=int)
         usuario_id = request.args.get('usuario_id', type=int)
         accion = request.args.get('accion')
+        cursor = request.args.get('cursor')
         
-        # Por ahora retornamos logs vacíos para evitar errores
-        logs = []
+        try:
+            desde = datetime.fromisoformat(request.args['desde']) if request.args.get('desde') else None
+            hasta = datetime.fromisoformat(request.args['hasta']) if request.args.get('hasta') else None
+        except ValueError:
+            return jsonify({'error': 'desde y hasta deben ser fechas ISO (AAAA-MM-DD)'}), 400
+        
+        query = consulta_logs(usuario_id=usuario_id, accion=accion, desde=desde, hasta=hasta)
+        try:
+            logs, next_cursor = pagina_logs(query, cursor, per_page)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         return jsonify({
             'logs': logs,
             'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': 0,
-                'pages': 1,
-                'has_next': False,
-                'has_prev': False
+                'per_page': min(max(per_page, 1), MAX_LOGS_POR_PAGINA),
+                'next_cursor': next_cursor,
+                'has_next': next_cursor is not None
             }
         }), 200
         
@@ -1188,38 +825,20 @@ def get_instructors():
 @admin_bp.route('/users/<int:user_id>/documento', methods=['GET'])
 @require_admin
 def download_user_documento(user_id):
-    """Descargar/ver documento de identidad PDF del usuario"""
+    """Ver documento de identidad PDF del usuario (cédula o cédula del representante)"""
     try:
-        user = User.query.get_or_404(user_id)
-        if not user.documento_pdf:
-            return jsonify({'error': 'El usuario no tiene documento PDF cargado'}), 404
-        
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-        tmp.write(user.documento_pdf)
-        tmp.flush()
-        tmp.seek(0)
-        
-        filename = user.documento_pdf_nombre or 'documento.pdf'
-        return send_file(tmp.name, mimetype='application/pdf', as_attachment=False, download_name=filename)
+        tipo_persona = db.session.query(User.tipo_persona).filter(User.id == user_id).scalar()
+        doc_type = 'cedula_representante_pdf' if tipo_persona == 'juridica' else 'cedula_pdf'
+        return responder_documento_usuario(user_id, doc_type)
     except Exception as e:
         return jsonify({'error': f'Error al descargar documento: {str(e)}'}), 500
 
 @admin_bp.route('/users/<int:user_id>/requisitos', methods=['GET'])
 @require_admin
 def download_user_requisitos(user_id):
-    """Descargar/ver requisitos PDF del usuario"""
+    """Ver términos de referencia firmados (requisitos) PDF del usuario"""
     try:
-        user = User.query.get_or_404(user_id)
-        if not user.requisitos_pdf:
-            return jsonify({'error': 'El usuario no tiene requisitos PDF cargados'}), 404
-        
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-        tmp.write(user.requisitos_pdf)
-        tmp.flush()
-        tmp.seek(0)
-        
-        filename = user.requisitos_pdf_nombre or 'requisitos.pdf'
-        return send_file(tmp.name, mimetype='application/pdf', as_attachment=False, download_name=filename)
+        return responder_documento_usuario(user_id, 'doc_terminos_pdf')
     except Exception as e:
         return jsonify({'error': f'Error al descargar requisitos: {str(e)}'}), 500
 
@@ -1230,21 +849,16 @@ def download_user_requisitos(user_id):
 def get_phase_stats():
     """Obtener estadísticas de fases de usuarios"""
     try:
-        # Estadísticas generales
-        total_users = User.query.count()
-        
-        # Usuarios por fase
-        inscripcion = User.query.filter_by(fase_actual='inscripcion').count()
-        formacion = User.query.filter_by(fase_actual='formacion').count()
-        entrega_activos = User.query.filter_by(fase_actual='entrega_activos').count()
-        
-        # Usuarios con fases completadas
-        fases_completadas = User.query.filter_by(fase_completada=True).count()
-        
-        # Progreso por fase
-        inscripcion_completada = User.query.filter_by(fase_actual='inscripcion', fase_completada=True).count()
-        formacion_completada = User.query.filter_by(fase_actual='formacion', fase_completada=True).count()
-        entrega_completada = User.query.filter_by(fase_actual='entrega_activos', fase_completada=True).count()
+        # Usuarios por fase y progreso (una sola consulta)
+        conteos = metricas_fases()
+        total_users = conteos['total']
+        inscripcion = conteos['inscripcion']
+        formacion = conteos['formacion']
+        entrega_activos = conteos['entrega_activos']
+        fases_completadas = conteos['fases_completadas']
+        inscripcion_completada = conteos['inscripcion_completada']
+        formacion_completada = conteos['formacion_completada']
+        entrega_completada = conteos['entrega_completada']
         
         return jsonify({
             'total_users': total_users,
@@ -1313,53 +927,23 @@ def get_all_users():
 def update_user_phase(user_id):
     """Actualizar la fase de un usuario específico"""
     try:
-        user = User.query.get_or_404(user_id)
-        data = request.json
+        data = request.json or {}
         nueva_fase = data.get('nueva_fase')
         
         # Validar fase válida
-        fases_validas = ['inscripcion', 'formacion', 'entrega_activos']
-        if nueva_fase not in fases_validas:
+        if nueva_fase not in FASES_VALIDAS:
             return jsonify({'error': 'Fase no válida'}), 400
         
-        # Obtener fase actual
-        fase_actual = getattr(user, 'fase_actual', 'inscripcion')
-        
-        # Actualizar fase
-        user.fase_actual = nueva_fase
-        user.fecha_entrada_fase = datetime.utcnow()
-        user.fase_completada = False
-        
-        db.session.commit()
-        
-        # Crear notificación de cambio de fase
-        mensajes = {
-            'inscripcion': 'Tu emprendimiento ha pasado a la fase de Inscripción y Selección',
-            'formacion': 'Tu emprendimiento ha pasado a la fase de Formación',
-            'entrega_activos': 'Tu emprendimiento ha pasado a la fase de Entrega de Activos Productivos'
-        }
-        
-        mensaje = mensajes.get(nueva_fase, f'Tu emprendimiento ha pasado a la fase: {nueva_fase}')
-        
-        notificacion = Notificacion(
-            user_id=user.id,
-            mensaje=mensaje,
-            fase_nueva=nueva_fase
-        )
-        db.session.add(notificacion)
-        
-        # Log de actividad
-        db.session.add(LogActividad(
-            usuario_id=user.id,
-            accion='cambio_fase_admin',
-            detalles=f"Administrador cambió fase de {fase_actual} a {nueva_fase}"
-        ))
+        # Fase, notificación y log en una sola transacción
+        actualizados, fecha = cambiar_fase(User.id == user_id, nueva_fase)
+        if not actualizados:
+            return jsonify({'error': 'Usuario no encontrado'}), 404
         db.session.commit()
         
         return jsonify({
             'message': f'Fase actualizada exitosamente a {nueva_fase}',
             'fase_actual': nueva_fase,
-            'fecha_entrada_fase': user.fecha_entrada_fase.isoformat()
+            'fecha_entrada_fase': fecha.isoformat()
         }), 200
         
     except Exception as e:
@@ -1369,69 +953,83 @@ def update_user_phase(user_id):
 @admin_bp.route('/export/phases', methods=['GET'])
 @require_admin
 def export_phase_report():
-    """Exportar reporte de fases en Excel"""
+    """Exportar reporte de fases en Excel (se encola; descargar desde /exportaciones/<id>/descarga)"""
     try:
-        users = User.query.all()
-        
-        # Crear workbook
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Reporte de Fases"
-        
-        # Estilos
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        header_alignment = Alignment(horizontal="center", vertical="center")
-        
-        # Encabezados
-        headers = [
-            'ID', 'Nombre', 'Apellido', 'Email', 'Teléfono', 'Municipio',
-            'Emprendimiento', 'Sector', 'Tipo Persona', 'Fase Actual',
-            'Fecha Entrada Fase', 'Fase Completada', 'Estado Inscripción',
-            'Formulario Enviado', 'Fecha Creación', 'Estado Cuenta'
-        ]
-        
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-        
-        # Datos
-        for row, user in enumerate(users, 2):
-            ws.cell(row=row, column=1, value=user.id)
-            ws.cell(row=row, column=2, value=user.nombre)
-            ws.cell(row=row, column=3, value=user.apellido)
-            ws.cell(row=row, column=4, value=user.email)
-            ws.cell(row=row, column=5, value=user.telefono)
-            ws.cell(row=row, column=6, value=user.municipio)
-            ws.cell(row=row, column=7, value=user.emprendimiento_nombre)
-            ws.cell(row=row, column=8, value=user.emprendimiento_sector)
-            ws.cell(row=row, column=9, value=user.tipo_persona)
-            ws.cell(row=row, column=10, value=getattr(user, 'fase_actual', 'inscripcion'))
-            ws.cell(row=row, column=11, value=user.fecha_entrada_fase.strftime('%Y-%m-%d %H:%M:%S') if hasattr(user, 'fecha_entrada_fase') and user.fecha_entrada_fase else 'N/A')
-            ws.cell(row=row, column=12, value='Sí' if getattr(user, 'fase_completada', False) else 'No')
-            ws.cell(row=row, column=13, value=user.estado_inscripcion)
-            ws.cell(row=row, column=14, value='Sí' if user.formulario_enviado else 'No')
-            ws.cell(row=row, column=15, value=user.fecha_creacion.strftime('%Y-%m-%d %H:%M:%S') if user.fecha_creacion else 'N/A')
-            ws.cell(row=row, column=16, value=user.estado_cuenta)
-        
-        # Ajustar ancho de columnas
-        for col in range(1, len(headers) + 1):
-            ws.column_dimensions[get_column_letter(col)].width = 15
-        
-        # Guardar en archivo temporal
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx')
-        wb.save(tmp.name)
-        tmp.flush()
-        tmp.seek(0)
-        
-        return send_file(
-            tmp.name,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=f'reporte_fases_{datetime.now().strftime("%Y%m%d")}.xlsx'
-        )
+        respuesta, status = export_jobs.solicitar('fases', session['user_id'])
+        return jsonify(respuesta), status
         
     except Exception as e:
-        return jsonify({'error': f'Error al exportar reporte: {str(e)}'}), 500 
\ No newline at end of file
+        db.session.rollback()
+        return jsonify({'error': f'Error al exportar reporte: {str(e)}'}), 500 
+
+@admin_bp.route('/exportaciones', methods=['POST'])
+@require_admin
+def solicitar_exportacion():
+    """Encolar una exportación para generarla en segundo plano
+
+    Si los datos no han cambiado desde la última exportación del mismo tipo,
+    se devuelve ese trabajo (ya completado o aún en curso) en lugar de otro nuevo.
+    """
+    try:
+        data = request.get_json() or {}
+        tipo = data.get('tipo')
+        if tipo not in export_jobs.TIPOS_EXPORTACION:
+            return jsonify({
+                'error': 'Tipo de exportación no válido',
+                'tipos_validos': list(export_jobs.TIPOS_EXPORTACION)
+            }), 400
+
+        respuesta, status = export_jobs.solicitar(tipo, session['user_id'])
+
+        registrar_actividad(session['user_id'], 'solicitar_exportacion', f"Exportación {tipo} (trabajo {respuesta['trabajo']['id']})")
+
+        return jsonify(respuesta), status
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Error al solicitar exportación: {str(e)}'}), 500
+
+@admin_bp.route('/exportaciones', methods=['GET'])
+@require_admin
+def list_exportaciones():
+    """Últimas exportaciones (opcionalmente filtradas por tipo)"""
+    try:
+        query = TrabajoExportacion.query
+        tipo = request.args.get('tipo')
+        if tipo:
+            query = query.filter_by(tipo=tipo)
+        limite = min(request.args.get('limit', 20, type=int), 100)
+        trabajos = query.order_by(TrabajoExportacion.id.desc()).limit(limite).all()
+        return jsonify({'trabajos': [trabajo.to_dict() for trabajo in trabajos]}), 200
+
+    except Exception as e:
+        return jsonify({'error': f'Error al obtener exportaciones: {str(e)}'}), 500
+
+@admin_bp.route('/exportaciones/<int:trabajo_id>', methods=['GET'])
+@require_admin
+def get_exportacion(trabajo_id):
+    """Estado y progreso de una exportación"""
+    trabajo = TrabajoExportacion.query.get(trabajo_id)
+    if not trabajo:
+        return jsonify({'error': 'Exportación no encontrada'}), 404
+    return jsonify({'trabajo': trabajo.to_dict()}), 200
+
+@admin_bp.route('/exportaciones/<int:trabajo_id>/descarga', methods=['GET'])
+@require_admin
+def descargar_exportacion(trabajo_id):
+    """Descargar el archivo de una exportación completada (soporta Range y ETag)"""
+    trabajo = TrabajoExportacion.query.get(trabajo_id)
+    if not trabajo:
+        return jsonify({'error': 'Exportación no encontrada'}), 404
+    if trabajo.estado != 'completado':
+        return jsonify({'error': 'La exportación aún no está lista', 'trabajo': trabajo.to_dict()}), 409
+
+    return responder_blob(
+        TrabajoExportacion.archivo,
+        TrabajoExportacion.id == trabajo_id,
+        trabajo.tamano_bytes,
+        trabajo.nombre_archivo,
+        trabajo.mime_type,
+        f'{trabajo.id}-{trabajo.huella[:16]}',
+        as_attachment=True
+    )
@@ -1,23 +1,11 @@
-from flask import Blueprint, jsonify, request, session
-from src.models import db, User, Curso, Modulo, Leccion
+from flask import Blueprint, jsonify, request
+from src.models import db, Curso, Modulo, Leccion
+from src.services.curso_service import cargar_arbol
+from src.services.identity_service import require_admin
 from datetime import datetime
 
 content_bp = Blueprint('content', __name__)
 
-def require_admin(f):
-    """Decorador para requerir rol de administrador"""
-    def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
-            return jsonify({'error': 'No autorizado'}), 401
-        
-        user = User.query.get(session['user_id'])
-        if not user or user.rol != 'admin':
-            return jsonify({'error': 'Acceso denegado. Se requiere rol de administrador'}), 403
-        
-        return f(*args, **kwargs)
-    decorated_function.__name__ = f.__name__
-    return decorated_function
-
 # ==================== RUTAS PARA MÓDULOS ====================
 
 @content_bp.route('/courses/<int:course_id>/modules', methods=['GET'])
@@ -28,17 +16,16 @@ def get_modules(course_id):
         # Verificar que el curso existe
         curso = Curso.query.get_or_404(course_id)
         
-        # Obtener módulos ordenados por orden
-        modulos = Modulo.query.filter_by(curso_id=course_id).order_by(Modulo.orden).all()
+        # Obtener módulos ordenados por orden y sus totales de lecciones
+        arbol = cargar_arbol([course_id])
         
         # Obtener información adicional para cada módulo
         module_dicts = []
-        for modulo in modulos:
+        for modulo in arbol.modulos(course_id):
             module_dict = modulo.to_dict()
             
-            # Obtener total de lecciones
-            total_lecciones = Leccion.query.filter_by(modulo_id=modulo.id).count()
-            module_dict['total_lecciones'] = total_lecciones
+            # Total de lecciones
+            module_dict['total_lecciones'] = arbol.total_lecciones(modulo.id)
             
             module_dicts.append(module_dict)
         
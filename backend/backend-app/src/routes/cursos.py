@@ -1,23 +1,11 @@
 from flask import Blueprint, jsonify, request, session
-from src.models import db, Curso, UsuarioCurso, User, LogActividad
+from src.models import db, Curso, UsuarioCurso, User
+from src.services.activity_log import registrar_actividad
+from src.services.identity_service import require_admin, usuario_actual
 from datetime import datetime
 
 cursos_bp = Blueprint('cursos', __name__)
 
-def require_admin(f):
-    """Decorador para requerir rol de administrador"""
-    def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
-            return jsonify({'error': 'No autorizado'}), 401
-        
-        user = User.query.get(session['user_id'])
-        if not user or user.rol != 'admin':
-            return jsonify({'error': 'Acceso denegado. Se requiere rol de administrador'}), 403
-        
-        return f(*args, **kwargs)
-    decorated_function.__name__ = f.__name__
-    return decorated_function
-
 @cursos_bp.route('/cursos', methods=['GET'])
 def get_cursos():
     """Obtener todos los cursos disponibles"""
@@ -25,7 +13,7 @@ def get_cursos():
         # Filtrar solo cursos activos para usuarios normales
         user_id = session.get('user_id')
         if user_id:
-            user = User.query.get(user_id)
+            user = usuario_actual()
             if user and user.rol == 'admin':
                 # Admin ve todos los cursos
                 cursos = Curso.query.order_by(Curso.created_at.desc()).all()
@@ -76,12 +64,7 @@ def create_curso():
         db.session.commit()
         
         # Log de actividad
-        db.session.add(LogActividad(
-            usuario_id=session['user_id'],
-            accion='curso_creado',
-            detalles=f"Curso creado: {curso.titulo}"
-        ))
-        db.session.commit()
+        registrar_actividad(session['user_id'], 'curso_creado', f"Curso creado: {curso.titulo}")
         
         return jsonify({
             'message': 'Curso creado exitosamente',
@@ -119,12 +102,7 @@ def update_curso(curso_id):
         db.session.commit()
         
         # Log de actividad
-        db.session.add(LogActividad(
-            usuario_id=session['user_id'],
-            accion='curso_actualizado',
-            detalles=f"Curso actualizado: {curso.titulo}"
-        ))
-        db.session.commit()
+        registrar_actividad(session['user_id'], 'curso_actualizado', f"Curso actualizado: {curso.titulo}")
         
         return jsonify({
             'message': 'Curso actualizado exitosamente',
@@ -163,12 +141,7 @@ def asignar_curso(curso_id, user_id):
         db.session.commit()
         
         # Log de actividad
-        db.session.add(LogActividad(
-            usuario_id=session['user_id'],
-            accion='curso_asignado',
-            detalles=f"Curso '{curso.titulo}' asignado a {user.nombre} {user.apellido}"
-        ))
-        db.session.commit()
+        registrar_actividad(session['user_id'], 'curso_asignado', f"Curso '{curso.titulo}' asignado a {user.nombre} {user.apellido}")
         
         return jsonify({
             'message': f'Curso asignado exitosamente a {user.nombre} {user.apellido}',
@@ -192,7 +165,7 @@ def update_curso_usuario(asignacion_id):
         # Verificar que el usuario puede modificar esta asignación
         if asignacion.user_id != user_id:
             # Solo admin puede modificar asignaciones de otros usuarios
-            user = User.query.get(user_id)
+            user = usuario_actual()
             if not user or user.rol != 'admin':
                 return jsonify({'error': 'No autorizado para modificar esta asignación'}), 403
         
@@ -228,12 +201,7 @@ def update_curso_usuario(asignacion_id):
         db.session.commit()
         
         # Log de actividad
-        db.session.add(LogActividad(
-            usuario_id=asignacion.user_id,
-            accion='curso_actualizado',
-            detalles=f"Curso '{asignacion.curso.titulo}' cambió de {estado_anterior} a {asignacion.estado}"
-        ))
-        db.session.commit()
+        registrar_actividad(asignacion.user_id, 'curso_actualizado', f"Curso '{asignacion.curso.titulo}' cambió de {estado_anterior} a {asignacion.estado}")
         
         return jsonify({
             'message': 'Estado del curso actualizado exitosamente',
@@ -268,7 +236,7 @@ def get_cursos_usuario(user_id):
         
         # Solo el usuario puede ver sus cursos, o un admin
         if session_user_id != user_id:
-            user = User.query.get(session_user_id)
+            user = usuario_actual()
             if not user or user.rol != 'admin':
                 return jsonify({'error': 'No autorizado para ver estos cursos'}), 403
         
@@ -0,0 +1,42 @@
+from flask import Blueprint, jsonify, request, session
+from src.models import db, User
+from src.services.document_streaming import responder_documento_usuario, responder_archivo_evidencia
+
+documentos_bp = Blueprint('documentos', __name__)
+
+def _rol_sesion():
+    """Rol del usuario en sesión (sin cargar la fila completa)"""
+    user_id = session.get('user_id')
+    if not user_id:
+        return None, None
+    return user_id, db.session.query(User.rol).filter(User.id == user_id).scalar()
+
+@documentos_bp.route('/documentos/usuarios/<int:user_id>/<doc_type>', methods=['GET'])
+def get_documento_usuario(user_id, doc_type):
+    """Ver/descargar un documento de usuario en streaming (admin o el propio usuario)"""
+    try:
+        session_user_id, rol = _rol_sesion()
+        if not session_user_id:
+            return jsonify({'error': 'No autorizado'}), 401
+        if rol != 'admin' and session_user_id != user_id:
+            return jsonify({'error': 'Acceso denegado'}), 403
+
+        descargar = request.args.get('descargar', 'false').lower() == 'true'
+        return responder_documento_usuario(user_id, doc_type, as_attachment=descargar)
+    except Exception as e:
+        return jsonify({'error': f'Error al obtener documento: {str(e)}'}), 500
+
+@documentos_bp.route('/documentos/evidencias/<int:evidencia_id>/<int:numero>', methods=['GET'])
+def get_archivo_evidencia(evidencia_id, numero):
+    """Ver/descargar un archivo de evidencia en streaming (solo admin)"""
+    try:
+        session_user_id, rol = _rol_sesion()
+        if not session_user_id:
+            return jsonify({'error': 'No autorizado'}), 401
+        if rol != 'admin':
+            return jsonify({'error': 'Acceso denegado. Se requiere rol de administrador'}), 403
+
+        descargar = request.args.get('descargar', 'true').lower() == 'true'
+        return responder_archivo_evidencia(evidencia_id, numero, as_attachment=descargar)
+    except Exception as e:
+        return jsonify({'error': f'Error al obtener archivo: {str(e)}'}), 500
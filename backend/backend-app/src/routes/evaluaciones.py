@@ -1,12 +1,10 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, session
 from datetime import datetime
-from src.models import db, Evaluacion, CriterioEvaluacion, User, Sorteo
+from src.models import db, Evaluacion, CriterioEvaluacion, User, Sorteo, PuntajeUsuario
+from src.services.ranking_service import consulta_ranking, fila_a_registro, empates_materializados
+from src.services import export_jobs
+from src.services.identity_service import require_admin
 import logging
-import pandas as pd
-from io import BytesIO
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment
-from openpyxl.utils.dataframe import dataframe_to_rows
 
 logger = logging.getLogger(__name__)
 
@@ -110,8 +108,8 @@ def crear_evaluacion():
         
         db.session.commit()
         
-        # Calcular nuevo puntaje total
-        puntaje_total = Evaluacion.obtener_puntaje_total_usuario(data['usuario_id'])
+        # Puntaje total ya recalculado en la misma transacción
+        puntaje_total = PuntajeUsuario.obtener_puntaje(data['usuario_id'])
         
         return jsonify({
             'message': 'Evaluación guardada exitosamente',
@@ -153,8 +151,8 @@ def eliminar_evaluacion(evaluacion_id):
         db.session.delete(evaluacion)
         db.session.commit()
         
-        # Recalcular puntaje total
-        puntaje_total = Evaluacion.obtener_puntaje_total_usuario(usuario_id)
+        # Puntaje total ya recalculado en la misma transacción
+        puntaje_total = PuntajeUsuario.obtener_puntaje(usuario_id)
         
         return jsonify({
             'message': 'Evaluación eliminada exitosamente',
@@ -170,31 +168,33 @@ def eliminar_evaluacion(evaluacion_id):
 def get_rankings():
     """Obtener rankings de usuarios ordenados por puntaje total"""
     try:
-        # Obtener usuarios que no son admin
-        usuarios = User.query.filter(User.rol != 'admin').all()
+        # Puntaje descendente y, en empate, fecha de inscripción ascendente
+        query = consulta_ranking()
         
-        rankings_data = []
-        for usuario in usuarios:
-            puntaje_total = Evaluacion.obtener_puntaje_total_usuario(usuario.id)
-            evaluacion_completa = Evaluacion.verificar_evaluacion_completa(usuario.id)
-            
-            rankings_data.append({
-                'id': usuario.id,
-                'nombre': usuario.nombre,
-                'apellido': usuario.apellido,
-                'email': usuario.email,
-                'municipio': usuario.municipio,
-                'emprendimiento_nombre': usuario.emprendimiento_nombre,
-                'puntaje_total': puntaje_total,
-                'evaluacion_completa': evaluacion_completa,
-                'fecha_inscripcion': usuario.fecha_creacion.isoformat() if usuario.fecha_creacion else None
-            })
+        # Sin ?page se devuelve el ranking completo
+        if 'page' not in request.args:
+            return jsonify({
+                'rankings': [fila_a_registro(fila) for fila in query.all()]
+            }), 200
         
-        # Ordenar por puntaje total (descendente) y luego por fecha de inscripción (ascendente)
-        rankings_data.sort(key=lambda x: (-x['puntaje_total'], x['fecha_inscripcion'] or ''))
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('per_page', 50, type=int), 500)
+        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        inicio = (page - 1) * per_page
         
         return jsonify({
-            'rankings': rankings_data
+            'rankings': [
+                {**fila_a_registro(fila), 'posicion': inicio + i}
+                for i, fila in enumerate(pagination.items, 1)
+            ],
+            'pagination': {
+                'page': page,
+                'per_page': per_page,
+                'total': pagination.total,
+                'pages': pagination.pages,
+                'has_next': pagination.has_next,
+                'has_prev': pagination.has_prev
+            }
         }), 200
         
     except Exception as e:
@@ -205,84 +205,17 @@ def get_rankings():
 
 @evaluaciones_bp.route('/admin/evaluaciones/exportar', methods=['GET'])
 def exportar_rankings():
-    """Exportar rankings a Excel"""
+    """Exportar rankings a Excel
+
+    Se encola en el worker de exportaciones; el archivo (con la hoja de
+    detalle por criterio) se descarga desde /api/admin/exportaciones/<id>/descarga.
+    """
     try:
-        # Obtener rankings
-        usuarios = User.query.filter(User.rol != 'admin').all()
-        
-        rankings_data = []
-        for usuario in usuarios:
-            puntaje_total = Evaluacion.obtener_puntaje_total_usuario(usuario.id)
-            evaluacion_completa = Evaluacion.verificar_evaluacion_completa(usuario.id)
-            
-            # Obtener evaluaciones detalladas
-            evaluaciones = Evaluacion.query.filter_by(usuario_id=usuario.id).all()
-            evaluaciones_dict = {}
-            for eval in evaluaciones:
-                evaluaciones_dict[eval.criterio.codigo] = {
-                    'puntaje': eval.puntaje,
-                    'max_puntaje': eval.criterio.max_puntaje,
-                    'peso': float(eval.criterio.peso),
-                    'observaciones': eval.observaciones or ''
-                }
-            
-            rankings_data.append({
-                'posicion': 0,  # Se calculará después
-                'nombre_completo': f"{usuario.nombre} {usuario.apellido}",
-                'email': usuario.email,
-                'municipio': usuario.municipio,
-                'emprendimiento_nombre': usuario.emprendimiento_nombre or 'Sin nombre',
-                'puntaje_total': puntaje_total,
-                'evaluacion_completa': 'Completa' if evaluacion_completa else 'Pendiente',
-                'fecha_inscripcion': usuario.fecha_creacion.strftime('%Y-%m-%d') if usuario.fecha_creacion else '',
-                **evaluaciones_dict
-            })
-        
-        # Ordenar por puntaje total y asignar posiciones
-        rankings_data.sort(key=lambda x: x['puntaje_total'], reverse=True)
-        for i, ranking in enumerate(rankings_data, 1):
-            ranking['posicion'] = i
-        
-        # Crear DataFrame
-        df = pd.DataFrame(rankings_data)
-        
-        # Crear archivo Excel
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            # Hoja principal con rankings
-            df_main = df[['posicion', 'nombre_completo', 'email', 'municipio', 'emprendimiento_nombre', 
-                         'puntaje_total', 'evaluacion_completa', 'fecha_inscripcion']].copy()
-            df_main.to_excel(writer, sheet_name='Rankings', index=False)
-            
-            # Hoja detallada con evaluaciones por criterio
-            criterios = CriterioEvaluacion.query.filter_by(activo=True).order_by(CriterioEvaluacion.orden).all()
-            criterios_columns = ['posicion', 'nombre_completo', 'email', 'municipio']
-            
-            # Crear columnas dinámicamente solo si existen en el DataFrame
-            for criterio in criterios:
-                col_puntaje = f'{criterio.codigo}_puntaje'
-                col_max = f'{criterio.codigo}_max'
-                col_peso = f'{criterio.codigo}_peso'
-                col_obs = f'{criterio.codigo}_observaciones'
-                
-                if col_puntaje in df.columns:
-                    criterios_columns.extend([col_puntaje, col_max, col_peso, col_obs])
-            
-            # Filtrar solo las columnas que existen
-            criterios_columns = [col for col in criterios_columns if col in df.columns]
-            
-            if criterios_columns:
-                df_detallado = df[criterios_columns].copy()
-                df_detallado.to_excel(writer, sheet_name='Evaluaciones Detalladas', index=False)
-        
-        output.seek(0)
-        
-        return output.getvalue(), 200, {
-            'Content-Type': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            'Content-Disposition': f'attachment; filename=rankings_evaluaciones_{datetime.now().strftime("%Y%m%d")}.xlsx'
-        }
+        respuesta, status = export_jobs.solicitar('rankings', session.get('user_id'))
+        return jsonify(respuesta), status
         
     except Exception as e:
+        db.session.rollback()
         logger.error(f"Error exporting rankings: {str(e)}")
         import traceback
         traceback.print_exc()
@@ -292,40 +225,8 @@ def exportar_rankings():
 def get_empates():
     """Obtener usuarios con empates en puntaje para sorteo"""
     try:
-        # Obtener rankings con desempate automático
-        usuarios = User.query.filter(User.rol != 'admin').all()
-        
-        rankings_data = []
-        for usuario in usuarios:
-            puntaje_total = Evaluacion.obtener_puntaje_total_usuario(usuario.id)
-            evaluacion_completa = Evaluacion.verificar_evaluacion_completa(usuario.id)
-            
-            rankings_data.append({
-                'id': usuario.id,
-                'nombre': usuario.nombre,
-                'apellido': usuario.apellido,
-                'email': usuario.email,
-                'municipio': usuario.municipio,
-                'emprendimiento_nombre': usuario.emprendimiento_nombre,
-                'puntaje_total': puntaje_total,
-                'evaluacion_completa': evaluacion_completa,
-                'fecha_inscripcion': usuario.fecha_creacion.isoformat() if usuario.fecha_creacion else None
-            })
-        
-        # Ordenar por puntaje total (descendente) y luego por fecha de inscripción (ascendente)
-        rankings_data.sort(key=lambda x: (-x['puntaje_total'], x['fecha_inscripcion'] or ''))
-        
-        # Identificar empates
-        empates = {}
-        for i, usuario in enumerate(rankings_data):
-            puntaje = usuario['puntaje_total']
-            if puntaje not in empates:
-                empates[puntaje] = []
-            empates[puntaje].append({**usuario, 'posicion': i + 1})
-        
-        # Filtrar solo empates con más de un participante
-        empates_filtrados = {puntaje: participantes for puntaje, participantes in empates.items() 
-                           if len(participantes) > 1 and puntaje > 0}
+        # Solo empates con más de un participante y puntaje mayor que cero
+        empates_filtrados = empates_materializados()
         
         return jsonify({
             'empates': empates_filtrados,
@@ -338,6 +239,24 @@ def get_empates():
         traceback.print_exc()
         return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
 
+@evaluaciones_bp.route('/admin/evaluaciones/puntajes/recalcular', methods=['POST'])
+@require_admin
+def recalcular_puntajes():
+    """Reconstruir la tabla puntaje_usuario a partir de las evaluaciones"""
+    try:
+        filas = PuntajeUsuario.recalcular(db.session.connection())
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Puntajes recalculados exitosamente',
+            'filas': filas
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error recalculating puntajes: {str(e)}")
+        return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
+
 @evaluaciones_bp.route('/admin/evaluaciones/sorteo', methods=['POST'])
 def ejecutar_sorteo():
     """Ejecutar sorteo público para desempate"""
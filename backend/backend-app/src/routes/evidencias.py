@@ -1,8 +1,10 @@
-from flask import Blueprint, jsonify, request, session, send_file
-from src.models import db, EvidenciaFuncionamiento, User, LogActividad
+from flask import Blueprint, jsonify, request, session
+from src.models import db, EvidenciaFuncionamiento
 from datetime import datetime
-from src.routes.admin import require_admin
-import io
+from src.services.activity_log import registrar_actividad
+from src.services.identity_service import require_admin, usuario_actual
+from src.services.document_streaming import responder_archivo_evidencia
+from src.services.metrics_service import metricas_evidencias
 
 evidencias_bp = Blueprint('evidencias', __name__)
 
@@ -15,12 +17,12 @@ def upload_evidencias():
             return jsonify({'error': 'No autorizado'}), 401
 
         # Verificar que el usuario esté en fase seguimiento
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user:
             return jsonify({'error': 'Usuario no encontrado'}), 404
         
         # Verificar fase actual
-        fase_actual = getattr(user, 'fase_actual', None)
+        fase_actual = user.fase_actual
         if fase_actual != 'seguimiento':
             return jsonify({'error': 'Solo disponible en fase de seguimiento'}), 403
 
@@ -59,12 +61,7 @@ def upload_evidencias():
         db.session.commit()
 
         # Log de actividad
-        db.session.add(LogActividad(
-            usuario_id=user_id,
-            accion='subir_evidencias',
-            detalles=f"Evidencias de funcionamiento subidas. Tipo: {tipo}. Archivos: {archivo1.filename}, {archivo2.filename}"
-        ))
-        db.session.commit()
+        registrar_actividad(user_id, 'subir_evidencias', f"Evidencias de funcionamiento subidas. Tipo: {tipo}. Archivos: {archivo1.filename}, {archivo2.filename}")
 
         return jsonify({
             'message': 'Evidencias subidas exitosamente',
@@ -109,7 +106,7 @@ def get_evidencias_usuario(user_id):
         
         # Solo el usuario puede ver sus evidencias, o un admin
         if session_user_id != user_id:
-            user = User.query.get(session_user_id)
+            user = usuario_actual()
             if not user or user.rol != 'admin':
                 return jsonify({'error': 'No autorizado para ver estas evidencias'}), 403
 
@@ -215,24 +212,14 @@ def update_evidencia(evidencia_id):
                 db.session.commit()
 
                 # Log de cambio de fase
-                db.session.add(LogActividad(
-                    usuario_id=user.id,
-                    accion='completar_fase_seguimiento',
-                    detalles=f"Fase de seguimiento completada tras aprobación de evidencias de funcionamiento"
-                ))
-                db.session.commit()
+                registrar_actividad(user.id, 'completar_fase_seguimiento', f"Fase de seguimiento completada tras aprobación de evidencias de funcionamiento")
 
         # Log de actividad
         detalles_log = f"Evidencia de funcionamiento (ID: {evidencia_id}) actualizada por admin."
         if nueva_estado and nueva_estado != estado_anterior:
             detalles_log += f" Estado: {estado_anterior} -> {nueva_estado}."
 
-        db.session.add(LogActividad(
-            usuario_id=session.get('user_id'),
-            accion='revisar_evidencias',
-            detalles=detalles_log
-        ))
-        db.session.commit()
+        registrar_actividad(session.get('user_id'), 'revisar_evidencias', detalles_log)
 
         return jsonify({
             'message': 'Evidencia actualizada exitosamente',
@@ -248,22 +235,7 @@ def update_evidencia(evidencia_id):
 def download_archivo(evidencia_id, numero):
     """Descargar un archivo específico de una evidencia (solo admin)"""
     try:
-        evidencia = EvidenciaFuncionamiento.query.get_or_404(evidencia_id)
-        
-        archivo_info = evidencia.get_archivo_info(numero)
-        if not archivo_info or not archivo_info['contenido']:
-            return jsonify({'error': 'Archivo no encontrado'}), 404
-
-        # Crear archivo en memoria
-        archivo_io = io.BytesIO(archivo_info['contenido'])
-        
-        return send_file(
-            archivo_io,
-            as_attachment=True,
-            download_name=archivo_info['nombre'],
-            mimetype='application/pdf'
-        )
-
+        return responder_archivo_evidencia(evidencia_id, numero, as_attachment=True)
     except Exception as e:
         return jsonify({'error': f'Error al descargar archivo: {str(e)}'}), 500
 
@@ -272,22 +244,8 @@ def download_archivo(evidencia_id, numero):
 def get_evidencias_estadisticas():
     """Obtener estadísticas de evidencias (solo admin)"""
     try:
-        total_evidencias = EvidenciaFuncionamiento.query.count()
-        evidencias_pendientes = EvidenciaFuncionamiento.query.filter_by(estado_revision='pendiente').count()
-        evidencias_aprobadas = EvidenciaFuncionamiento.query.filter_by(estado_revision='aprobado').count()
-        evidencias_rechazadas = EvidenciaFuncionamiento.query.filter_by(estado_revision='rechazado').count()
-        
-        evidencias_formales = EvidenciaFuncionamiento.query.filter_by(tipo='formal').count()
-        evidencias_informales = EvidenciaFuncionamiento.query.filter_by(tipo='informal').count()
-
-        return jsonify({
-            'total': total_evidencias,
-            'pendientes': evidencias_pendientes,
-            'aprobadas': evidencias_aprobadas,
-            'rechazadas': evidencias_rechazadas,
-            'formales': evidencias_formales,
-            'informales': evidencias_informales
-        }), 200
+        # Todos los conteos en una sola consulta
+        return jsonify(metricas_evidencias()), 200
 
     except Exception as e:
         return jsonify({'error': f'Error al obtener estadísticas: {str(e)}'}), 500
@@ -1,12 +1,17 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_cors import cross_origin
 from werkzeug.utils import secure_filename
-import boto3
 import os
-import uuid
 from datetime import datetime, timedelta
 from ..models import db, User, Curso, Modulo, Leccion, Recurso, Inscripcion, LogActividad
 from ..services.auth_service import token_required, instructor_required
+from ..services.curso_service import cargar_arbol, contar_inscripciones
+from ..services.identity_service import usuario_actual
+from ..services.activity_log import registrar_actividad
+from ..services.storage_client import obtener_cliente_s3
+from ..services.direct_upload import iniciar_carga, confirmar_carga, CargaInvalida
+from ..services import storage_inventory
+from ..services.storage_backend import obtener_almacenamiento, almacenamiento_de
 import logging
 
 # Configurar logging
@@ -17,50 +22,25 @@ instructor_bp = Blueprint('instructor', __name__)
 
 # Configuración de S3
 def get_s3_client():
-    """Obtener cliente de S3"""
-    return boto3.client(
-        's3',
-        aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-        aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-        region_name=os.getenv('AWS_REGION', 'us-east-1')
-    )
+    """Obtener cliente de S3 (compartido por el proceso, con pool de conexiones)"""
+    return obtener_cliente_s3()
 
 def upload_to_s3(file, folder='content'):
-    """Subir archivo a S3"""
-    try:
-        s3_client = get_s3_client()
-        bucket_name = os.getenv('S3_BUCKET_NAME')
-        
-        # Generar nombre único para el archivo
-        file_extension = os.path.splitext(file.filename)[1]
-        unique_filename = f"{folder}/{uuid.uuid4()}{file_extension}"
-        
-        # Subir archivo
-        s3_client.upload_fileobj(
-            file,
-            bucket_name,
-            unique_filename,
-            ExtraArgs={
-                'ContentType': file.content_type,
-                'ACL': 'public-read'
-            }
-        )
-        
-        # Generar URL pública
-        url = f"https://{bucket_name}.s3.amazonaws.com/{unique_filename}"
-        
-        return {
-            'success': True,
-            's3_key': unique_filename,
-            's3_url': url,
-            's3_bucket': bucket_name
-        }
-    except Exception as e:
-        logger.error(f"Error uploading to S3: {str(e)}")
-        return {
-            'success': False,
-            'error': str(e)
-        }
+    """Subir archivo al almacenamiento configurado (en S3, multiparte en paralelo si es grande)"""
+    resultado = obtener_almacenamiento().subir(file.stream, file.filename, file.content_type, folder=folder)
+    if not resultado['success']:
+        logger.error(f"Error uploading to storage: {resultado['error']}")
+    return resultado
+
+# Extensiones y tamaño máximo por tipo de contenido
+EXTENSIONES_CONTENIDO = {
+    'video': ['.mp4', '.webm', '.ogg', '.avi', '.mov'],
+    'documento': ['.pdf', '.doc', '.docx', '.ppt', '.pptx', '.txt']
+}
+TAMANO_MAXIMO_CONTENIDO = {
+    'video': 500 * 1024 * 1024,  # 500MB
+    'documento': 50 * 1024 * 1024  # 50MB
+}
 
 @instructor_bp.route('/dashboard', methods=['GET'])
 @cross_origin()
@@ -77,7 +57,7 @@ def get_instructor_dashboard():
             }), 401
         
         # Verificar que el usuario es instructor
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'instructor':
             return jsonify({
                 'success': False,
@@ -154,7 +134,7 @@ def get_instructor_courses():
             }), 401
         
         # Verificar que el usuario es instructor
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'instructor':
             return jsonify({
                 'success': False,
@@ -163,22 +143,21 @@ def get_instructor_courses():
         
         cursos = Curso.query.filter_by(instructor_id=user.id).all()
         
+        # Módulos, lecciones e inscripciones de todos los cursos en consultas por lotes
+        curso_ids = [curso.id for curso in cursos]
+        arbol = cargar_arbol(curso_ids)
+        inscripciones_por_curso = contar_inscripciones(curso_ids)
+        
         cursos_data = []
         for curso in cursos:
             # Contar estudiantes y calcular progreso
-            inscripciones = Inscripcion.query.filter_by(curso_id=curso.id).all()
-            total_estudiantes = len(inscripciones)
+            total_estudiantes = inscripciones_por_curso.get(curso.id, 0)
             
             progreso_promedio = 0
             
             # Contar módulos y lecciones
-            modulos = Modulo.query.filter_by(curso_id=curso.id).all()
-            total_modulos = len(modulos)
-            
-            total_lecciones = 0
-            for modulo in modulos:
-                lecciones = Leccion.query.filter_by(modulo_id=modulo.id).all()
-                total_lecciones += len(lecciones)
+            total_modulos = len(arbol.modulos(curso.id))
+            total_lecciones = arbol.total_lecciones_curso(curso.id)
             
             cursos_data.append({
                 'id': curso.id,
@@ -220,7 +199,7 @@ def get_course_detail(curso_id):
             }), 401
         
         # Verificar que el usuario es instructor
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'instructor':
             return jsonify({
                 'success': False,
@@ -286,7 +265,7 @@ def create_course():
             }), 401
         
         # Verificar que el usuario es instructor
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'instructor':
             return jsonify({
                 'success': False,
@@ -325,19 +304,8 @@ def create_course():
         db.session.add(curso)
         db.session.commit()
         
-        # Registrar actividad (modelo simplificado usa 'accion' y 'detalles')
-        log_actividad = LogActividad(
-            usuario_id=user.id,
-            accion='nuevo_curso',
-            detalles=f'Creó nuevo curso: {curso.titulo}',
-            fecha=datetime.utcnow()
-        )
-        # Nota: Si LogActividad no es un modelo mapeado, omitir el add/commit
-        try:
-            db.session.add(log_actividad)
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
+        # Registrar actividad
+        registrar_actividad(user.id, 'nuevo_curso', f'Creó nuevo curso: {curso.titulo}')
         
         return jsonify({
             'success': True,
@@ -380,7 +348,7 @@ def get_course_students(curso_id):
             }), 401
         
         # Verificar que el usuario es instructor
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'instructor':
             return jsonify({
                 'success': False,
@@ -438,7 +406,7 @@ def upload_content():
             }), 401
         
         # Verificar que el usuario es instructor
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'instructor':
             return jsonify({
                 'success': False,
@@ -459,23 +427,20 @@ def upload_content():
             }), 400
         
         # Validar tipo de archivo
-        allowed_extensions = {
-            'video': ['.mp4', '.webm', '.ogg', '.avi', '.mov'],
-            'documento': ['.pdf', '.doc', '.docx', '.ppt', '.pptx', '.txt']
-        }
-        
         file_extension = os.path.splitext(file.filename)[1].lower()
         tipo_contenido = request.form.get('tipo_contenido', 'documento')
         
-        if file_extension not in allowed_extensions.get(tipo_contenido, []):
+        if file_extension not in EXTENSIONES_CONTENIDO.get(tipo_contenido, []):
             return jsonify({
                 'success': False,
                 'error': f'Tipo de archivo no permitido para {tipo_contenido}'
             }), 400
         
         # Validar tamaño
-        max_size = 500 * 1024 * 1024 if tipo_contenido == 'video' else 50 * 1024 * 1024  # 500MB o 50MB
-        if len(file.read()) > max_size:
+        max_size = TAMANO_MAXIMO_CONTENIDO[tipo_contenido]
+        file.seek(0, 2)  # Tamaño sin cargar el archivo en memoria
+        file_size = file.tell()
+        if file_size > max_size:
             return jsonify({
                 'success': False,
                 'error': f'Archivo demasiado grande. Máximo: {max_size // (1024*1024)}MB'
@@ -503,7 +468,7 @@ def upload_content():
             s3_bucket=upload_result['s3_bucket'],
             nombre_original=file.filename,
             extension=file_extension,
-            tamano_bytes=len(file.read()),
+            tamano_bytes=file_size,
             mime_type=file.content_type,
             curso_id=request.form.get('curso_id'),
             modulo_id=request.form.get('modulo_id'),
@@ -516,14 +481,7 @@ def upload_content():
         db.session.commit()
         
         # Registrar actividad
-        log_actividad = LogActividad(
-            usuario_id=user.id,
-            tipo='nuevo_recurso',
-            descripcion=f'Subió {tipo_contenido}: {recurso.titulo}',
-            fecha=datetime.utcnow()
-        )
-        db.session.add(log_actividad)
-        db.session.commit()
+        registrar_actividad(user.id, 'nuevo_recurso', f'Subió {tipo_contenido}: {recurso.titulo}')
         
         return jsonify({
             'success': True,
@@ -538,6 +496,146 @@ def upload_content():
             'error': 'Error al subir contenido'
         }), 500
 
+@instructor_bp.route('/contenido/upload/iniciar', methods=['POST'])
+@cross_origin()
+def start_content_upload():
+    """
+    Iniciar la subida directa de contenido al bucket (sin pasar por el servidor)
+
+    Body: {filename, size, content_type?, tipo_contenido}. Devuelve un POST
+    firmado o, para archivos grandes, URLs firmadas por parte y un token para
+    /contenido/upload/confirmar. Evita el límite de 10 MB de API Gateway.
+    """
+    try:
+        # Verificar sesión
+        from flask import session
+        user_id = session.get('user_id')
+        if not user_id:
+            return jsonify({
+                'success': False,
+                'error': 'No hay sesión activa'
+            }), 401
+        
+        # Verificar que el usuario es instructor
+        user = usuario_actual()
+        if not user or user.rol != 'instructor':
+            return jsonify({
+                'success': False,
+                'error': 'Acceso denegado. Se requiere rol de instructor'
+            }), 403
+        
+        data = request.json or {}
+        filename = data.get('filename') or ''
+        tipo_contenido = data.get('tipo_contenido', 'documento')
+        
+        if os.path.splitext(filename)[1].lower() not in EXTENSIONES_CONTENIDO.get(tipo_contenido, []):
+            return jsonify({
+                'success': False,
+                'error': f'Tipo de archivo no permitido para {tipo_contenido}'
+            }), 400
+        
+        carga = iniciar_carga(
+            user.id,
+            filename,
+            data.get('size'),
+            content_type=data.get('content_type'),
+            carpeta=f'content/{tipo_contenido}',
+            tamano_maximo=TAMANO_MAXIMO_CONTENIDO[tipo_contenido]
+        )
+        return jsonify({
+            'success': True,
+            'data': carga
+        }), 201
+        
+    except CargaInvalida as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        logger.error(f"Error starting content upload: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Error al iniciar la subida'
+        }), 500
+
+@instructor_bp.route('/contenido/upload/confirmar', methods=['POST'])
+@cross_origin()
+def confirm_content_upload():
+    """
+    Confirmar una subida directa: verifica el objeto en el bucket y crea el recurso
+
+    Body: {token, partes? (multiparte: [{numero, etag}]), tipo_contenido,
+    titulo, descripcion, categoria, curso_id, modulo_id, acceso_publico,
+    requiere_autenticacion}
+    """
+    try:
+        # Verificar sesión
+        from flask import session
+        user_id = session.get('user_id')
+        if not user_id:
+            return jsonify({
+                'success': False,
+                'error': 'No hay sesión activa'
+            }), 401
+        
+        # Verificar que el usuario es instructor
+        user = usuario_actual()
+        if not user or user.rol != 'instructor':
+            return jsonify({
+                'success': False,
+                'error': 'Acceso denegado. Se requiere rol de instructor'
+            }), 403
+        
+        data = request.json or {}
+        archivo = confirmar_carga(data.get('token'), user.id, data.get('partes'))
+        
+        if Recurso.query.filter_by(s3_key=archivo['s3_key']).first():
+            return jsonify({
+                'success': False,
+                'error': 'La subida ya fue confirmada'
+            }), 409
+        
+        tipo_contenido = data.get('tipo_contenido', 'documento')
+        recurso = Recurso(
+            titulo=data.get('titulo') or archivo['nombre_original'],
+            descripcion=data.get('descripcion', ''),
+            tipo=tipo_contenido,
+            categoria=data.get('categoria', ''),
+            curso_id=data.get('curso_id'),
+            modulo_id=data.get('modulo_id'),
+            subido_por=user.id,
+            acceso_publico=bool(data.get('acceso_publico', True)),
+            requiere_autenticacion=bool(data.get('requiere_autenticacion', False)),
+            **archivo
+        )
+        
+        db.session.add(recurso)
+        db.session.commit()
+        storage_inventory.registrar_subida(recurso.s3_key, recurso.tamano_bytes)
+        
+        # Registrar actividad
+        registrar_actividad(user.id, 'nuevo_recurso', f'Subió {tipo_contenido}: {recurso.titulo}')
+        
+        return jsonify({
+            'success': True,
+            'data': recurso.to_dict(),
+            'message': 'Contenido subido exitosamente'
+        }), 201
+        
+    except CargaInvalida as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error confirming content upload: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Error al confirmar la subida'
+        }), 500
+
 @instructor_bp.route('/modulos', methods=['GET'])
 @cross_origin()
 def get_instructor_modules():
@@ -553,7 +651,7 @@ def get_instructor_modules():
             }), 401
         
         # Verificar que el usuario es instructor
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'instructor':
             return jsonify({
                 'success': False,
@@ -569,15 +667,11 @@ def get_instructor_modules():
                 'data': []
             }), 200
         
-        # Obtener módulos
-        modulos = Modulo.query.filter(Modulo.curso_id.in_(curso_ids)).all()
+        # Obtener módulos con sus totales de lecciones y recursos
+        arbol = cargar_arbol(curso_ids, contar_recursos=True)
         
         modulos_data = []
-        for modulo in modulos:
-            # Contar lecciones y recursos
-            lecciones = Leccion.query.filter_by(modulo_id=modulo.id).all()
-            recursos = Recurso.query.filter_by(modulo_id=modulo.id).all()
-            
+        for modulo in arbol.todos_los_modulos():
             modulos_data.append({
                 'id': modulo.id,
                 'curso_id': modulo.curso_id,
@@ -586,8 +680,8 @@ def get_instructor_modules():
                 'orden': modulo.orden,
                 'duracion_estimada': modulo.duracion_estimada,
                 'estado': modulo.estado,
-                'totalLecciones': len(lecciones),
-                'totalRecursos': len(recursos),
+                'totalLecciones': arbol.total_lecciones(modulo.id),
+                'totalRecursos': arbol.total_recursos(modulo.id),
                 'fechaCreacion': modulo.fecha_creacion.isoformat()
             })
         
@@ -618,7 +712,7 @@ def create_module():
             }), 401
         
         # Verificar que el usuario es instructor
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'instructor':
             return jsonify({
                 'success': False,
@@ -653,17 +747,7 @@ def create_module():
         db.session.commit()
         
         # Registrar actividad
-        log_actividad = LogActividad(
-            usuario_id=user.id,
-            accion='nuevo_modulo',
-            detalles=f'Creó módulo: {modulo.titulo}',
-            fecha=datetime.utcnow()
-        )
-        try:
-            db.session.add(log_actividad)
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
+        registrar_actividad(user.id, 'nuevo_modulo', f'Creó módulo: {modulo.titulo}')
         
         return jsonify({
             'success': True,
@@ -699,7 +783,7 @@ def update_module(modulo_id):
             }), 401
         
         # Verificar que el usuario es instructor
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'instructor':
             return jsonify({
                 'success': False,
@@ -769,7 +853,7 @@ def delete_module(modulo_id):
             }), 401
         
         # Verificar que el usuario es instructor
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'instructor':
             return jsonify({
                 'success': False,
@@ -826,7 +910,7 @@ def get_instructor_resources():
             }), 401
         
         # Verificar que el usuario es instructor
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'instructor':
             return jsonify({
                 'success': False,
@@ -868,7 +952,7 @@ def delete_resource(recurso_id):
             }), 401
         
         # Verificar que el usuario es instructor
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'instructor':
             return jsonify({
                 'success': False,
@@ -886,13 +970,16 @@ def delete_resource(recurso_id):
                 'error': 'Recurso no encontrado'
             }), 404
         
-        # Eliminar de S3
+        # Eliminar del almacenamiento
         try:
-            s3_client = get_s3_client()
-            s3_client.delete_object(
-                Bucket=recurso.s3_bucket,
-                Key=recurso.s3_key
-            )
+            almacenamiento = almacenamiento_de(recurso.s3_bucket)
+            if almacenamiento is not None:
+                almacenamiento.delete(recurso.s3_key, tamano=recurso.tamano_bytes)
+            else:
+                get_s3_client().delete_object(
+                    Bucket=recurso.s3_bucket,
+                    Key=recurso.s3_key
+                )
         except Exception as e:
             logger.warning(f"Error deleting from S3: {str(e)}")
         
@@ -927,7 +1014,7 @@ def get_instructor_statistics():
             }), 401
         
         # Verificar que el usuario es instructor
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'instructor':
             return jsonify({
                 'success': False,
@@ -1005,7 +1092,7 @@ def get_course_modules(course_id):
             }), 401
         
         # Verificar que el usuario es instructor
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'instructor':
             return jsonify({
                 'success': False,
@@ -1020,12 +1107,12 @@ def get_course_modules(course_id):
                 'error': 'Curso no encontrado'
             }), 404
         
-        # Obtener módulos ordenados por orden
-        modulos = Modulo.query.filter_by(curso_id=course_id).order_by(Modulo.orden).all()
+        # Obtener módulos ordenados por orden y sus totales de lecciones
+        arbol = cargar_arbol([course_id])
         
         # Obtener información adicional para cada módulo
         module_dicts = []
-        for modulo in modulos:
+        for modulo in arbol.modulos(course_id):
             module_dict = {
                 'id': modulo.id,
                 'titulo': modulo.titulo,
@@ -1037,9 +1124,8 @@ def get_course_modules(course_id):
                 'fecha_actualizacion': modulo.fecha_actualizacion.isoformat()
             }
             
-            # Obtener total de lecciones
-            total_lecciones = Leccion.query.filter_by(modulo_id=modulo.id).count()
-            module_dict['total_lecciones'] = total_lecciones
+            # Total de lecciones
+            module_dict['total_lecciones'] = arbol.total_lecciones(modulo.id)
             
             module_dicts.append(module_dict)
         
@@ -1070,7 +1156,7 @@ def create_content_module(course_id):
             }), 401
         
         # Verificar que el usuario es instructor
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'instructor':
             return jsonify({
                 'success': False,
@@ -1147,7 +1233,7 @@ def update_content_module(module_id):
             }), 401
         
         # Verificar que el usuario es instructor
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'instructor':
             return jsonify({
                 'success': False,
@@ -1207,7 +1293,7 @@ def delete_content_module(module_id):
             }), 401
         
         # Verificar que el usuario es instructor
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'instructor':
             return jsonify({
                 'success': False,
@@ -1261,7 +1347,7 @@ def get_module_lessons(module_id):
             }), 401
         
         # Verificar que el usuario es instructor
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'instructor':
             return jsonify({
                 'success': False,
@@ -1329,7 +1415,7 @@ def create_module_lesson(module_id):
             }), 401
         
         # Verificar que el usuario es instructor
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'instructor':
             return jsonify({
                 'success': False,
@@ -1420,7 +1506,7 @@ def update_content_lesson(lesson_id):
             }), 401
         
         # Verificar que el usuario es instructor
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'instructor':
             return jsonify({
                 'success': False,
@@ -1490,7 +1576,7 @@ def delete_content_lesson(lesson_id):
             }), 401
         
         # Verificar que el usuario es instructor
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'instructor':
             return jsonify({
                 'success': False,
@@ -1541,7 +1627,7 @@ def delete_course(curso_id):
             }), 401
         
         # Verificar que el usuario es instructor
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'instructor':
             return jsonify({
                 'success': False,
@@ -1569,17 +1655,7 @@ def delete_course(curso_id):
         db.session.commit()
         
         # Registrar actividad
-        try:
-            log_actividad = LogActividad(
-                usuario_id=user.id,
-                accion='eliminar_curso',
-                detalles=f'Eliminó el curso: {curso.titulo}',
-                fecha=datetime.utcnow()
-            )
-            db.session.add(log_actividad)
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
+        registrar_actividad(user.id, 'eliminar_curso', f'Eliminó el curso: {curso.titulo}')
         
         return jsonify({
             'success': True,
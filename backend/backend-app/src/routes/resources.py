@@ -1,25 +1,18 @@
-from flask import Blueprint, jsonify, request, session
+from flask import Blueprint, jsonify, request, session, redirect
 from src.models import db, User, Recurso, Curso, Modulo, Leccion
 from src.services.s3_service import s3_service
+from src.services.direct_upload import iniciar_carga, confirmar_carga, CargaInvalida
+from src.services import storage_inventory
+from src.services.storage_backend import obtener_almacenamiento, almacenamiento_de, ClaveInvalida
+from src.services.identity_service import require_admin
 from datetime import datetime
 import os
 import mimetypes
 
 resources_bp = Blueprint('resources', __name__)
 
-def require_admin(f):
-    """Decorador para requerir rol de administrador"""
-    def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
-            return jsonify({'error': 'No autorizado'}), 401
-        
-        user = User.query.get(session['user_id'])
-        if not user or user.rol != 'admin':
-            return jsonify({'error': 'Acceso denegado. Se requiere rol de administrador'}), 403
-        
-        return f(*args, **kwargs)
-    decorated_function.__name__ = f.__name__
-    return decorated_function
+# Tamaño máximo de un recurso
+MAX_TAMANO_RECURSO = 100 * 1024 * 1024
 
 def get_file_type(filename):
     """Determinar el tipo de archivo basado en la extensión"""
@@ -188,18 +181,15 @@ def upload_resource():
         file_size = file.tell()
         file.seek(0)  # Volver al inicio
         
-        if file_size > 100 * 1024 * 1024:  # 100MB
+        if file_size > MAX_TAMANO_RECURSO:  # 100MB
             return jsonify({'error': 'El archivo es demasiado grande. Máximo 100MB'}), 400
         
         # Determinar tipo de archivo
         tipo = get_file_type(file.filename)
         
-        # Leer datos del archivo
-        file_data = file.read()
-        
-        # Subir archivo a S3
-        upload_result = s3_service.upload_file(
-            file_data=file_data,
+        # Subir archivo desde el stream (en S3, multiparte si es grande, sin leerlo entero)
+        upload_result = obtener_almacenamiento().subir(
+            file_data=file.stream,
             filename=file.filename,
             content_type=file.content_type
         )
@@ -240,6 +230,82 @@ def upload_resource():
         db.session.rollback()
         return jsonify({'error': f'Error al subir recurso: {str(e)}'}), 500
 
+@resources_bp.route('/resources/uploads', methods=['POST'])
+@require_admin
+def start_resource_upload():
+    """
+    Iniciar la subida directa de un recurso al bucket
+
+    Body: {filename, size, content_type?}. Devuelve un POST firmado (o URLs
+    por parte si el archivo es grande) y un token para
+    POST /resources/uploads/confirm. Los bytes no pasan por el servidor.
+    """
+    try:
+        data = request.json or {}
+        filename = data.get('filename')
+        if not filename:
+            return jsonify({'error': 'No se proporcionó el nombre del archivo'}), 400
+        
+        carga = iniciar_carga(
+            session['user_id'],
+            filename,
+            data.get('size'),
+            content_type=data.get('content_type'),
+            tamano_maximo=MAX_TAMANO_RECURSO
+        )
+        return jsonify(carga), 201
+        
+    except CargaInvalida as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Error al iniciar la subida: {str(e)}'}), 500
+
+@resources_bp.route('/resources/uploads/confirm', methods=['POST'])
+@require_admin
+def confirm_resource_upload():
+    """
+    Confirmar una subida directa y crear el recurso
+
+    Body: {token, partes? (multiparte: [{numero, etag}]), titulo, descripcion,
+    categoria, curso_id, modulo_id, leccion_id, acceso_publico,
+    requiere_autenticacion}
+    """
+    try:
+        data = request.json or {}
+        archivo = confirmar_carga(data.get('token'), session['user_id'], data.get('partes'))
+        
+        if Recurso.query.filter_by(s3_key=archivo['s3_key']).first():
+            return jsonify({'error': 'La subida ya fue confirmada'}), 409
+        
+        recurso = Recurso(
+            titulo=data.get('titulo') or archivo['nombre_original'],
+            descripcion=data.get('descripcion', ''),
+            tipo=get_file_type(archivo['nombre_original']),
+            categoria=data.get('categoria', 'general'),
+            curso_id=data.get('curso_id'),
+            modulo_id=data.get('modulo_id'),
+            leccion_id=data.get('leccion_id'),
+            subido_por=session['user_id'],
+            acceso_publico=bool(data.get('acceso_publico', True)),
+            requiere_autenticacion=bool(data.get('requiere_autenticacion', False)),
+            **archivo
+        )
+        
+        db.session.add(recurso)
+        db.session.commit()
+        storage_inventory.registrar_subida(recurso.s3_key, recurso.tamano_bytes)
+        
+        return jsonify({
+            'message': 'Recurso subido exitosamente',
+            'resource': recurso.to_dict()
+        }), 201
+        
+    except CargaInvalida as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Error al confirmar la subida: {str(e)}'}), 500
+
 @resources_bp.route('/resources/<int:resource_id>', methods=['GET'])
 @require_admin
 def get_resource(resource_id):
@@ -315,20 +381,66 @@ def delete_resource(resource_id):
     try:
         recurso = Recurso.query.get_or_404(resource_id)
         
-        # Eliminar archivo de S3
-        if s3_service.delete_file(recurso.s3_key):
+        # Eliminar archivo del almacenamiento
+        almacenamiento = almacenamiento_de(recurso.s3_bucket) or obtener_almacenamiento()
+        if almacenamiento.delete(recurso.s3_key, tamano=recurso.tamano_bytes):
             # Eliminar registro de la base de datos
             db.session.delete(recurso)
             db.session.commit()
             
             return jsonify({'message': 'Recurso eliminado exitosamente'}), 200
         else:
-            return jsonify({'error': 'Error al eliminar archivo de S3'}), 500
+            return jsonify({'error': 'Error al eliminar archivo del almacenamiento'}), 500
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Error al eliminar recurso: {str(e)}'}), 500
 
+@resources_bp.route('/resources/<int:resource_id>/download', methods=['GET'])
+@require_admin
+def download_resource(resource_id):
+    """
+    Descargar el archivo de un recurso
+
+    S3 redirige a una URL firmada; el almacenamiento local lo envía con
+    sendfile. Soporta Range. Query: descargar=true fuerza la descarga.
+    """
+    try:
+        recurso = Recurso.query.get_or_404(resource_id)
+        almacenamiento = almacenamiento_de(recurso.s3_bucket)
+        if almacenamiento is None:
+            return redirect(recurso.s3_url)
+        
+        return almacenamiento.responder(
+            recurso.s3_key,
+            nombre=recurso.nombre_original,
+            mime_type=recurso.mime_type,
+            as_attachment=request.args.get('descargar', 'false').lower() == 'true'
+        )
+        
+    except ClaveInvalida as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Error al descargar recurso: {str(e)}'}), 500
+
+@resources_bp.route('/storage/<path:key>', methods=['GET'])
+def serve_storage_object(key):
+    """
+    Servir un objeto del almacenamiento local (URL pública de sus recursos)
+
+    Equivale a la URL pública de un objeto en S3 (ACL public-read); con S3
+    redirige al bucket.
+    """
+    try:
+        almacenamiento = obtener_almacenamiento()
+        if almacenamiento.nombre == 's3':
+            return redirect(almacenamiento.url(key))
+        return almacenamiento.responder(key)
+    except ClaveInvalida as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Error al obtener archivo: {str(e)}'}), 500
+
 @resources_bp.route('/resources/stats', methods=['GET'])
 @require_admin
 def get_resource_stats():
@@ -336,7 +448,7 @@ def get_resource_stats():
     try:
         # Estadísticas generales
         total_resources = Recurso.query.count()
-        total_size = sum(r.tamano_bytes for r in Recurso.query.all())
+        total_size = db.session.query(db.func.coalesce(db.func.sum(Recurso.tamano_bytes), 0)).scalar()
         
         # Recursos por tipo
         tipos = db.session.query(Recurso.tipo, db.func.count(Recurso.id)).group_by(Recurso.tipo).all()
@@ -350,8 +462,9 @@ def get_resource_stats():
         estados = db.session.query(Recurso.estado, db.func.count(Recurso.id)).group_by(Recurso.estado).all()
         recursos_por_estado = {estado: count for estado, count in estados}
         
-        # Tamaño del bucket S3
-        bucket_size = s3_service.get_bucket_size()
+        # Tamaño del almacenamiento (inventario; ?exacto=true lo recorre completo)
+        almacenamiento = obtener_almacenamiento()
+        bucket_size = almacenamiento.tamano_total(exacto=request.args.get('exacto', 'false').lower() == 'true')
         
         return jsonify({
             'total_recursos': total_resources,
@@ -359,6 +472,8 @@ def get_resource_stats():
             'tamano_total_formateado': s3_service.format_file_size(total_size),
             'tamano_bucket_s3_bytes': bucket_size,
             'tamano_bucket_s3_formateado': s3_service.format_file_size(bucket_size),
+            'almacenamiento_por_prefijo': storage_inventory.resumen(),
+            'backend_almacenamiento': almacenamiento.nombre,
             'recursos_por_tipo': recursos_por_tipo,
             'recursos_por_categoria': recursos_por_categoria,
             'recursos_por_estado': recursos_por_estado
@@ -2,7 +2,10 @@ from flask import Blueprint, jsonify, request, session
 from flask_cors import cross_origin
 from datetime import datetime, timedelta
 from sqlalchemy import func, and_, select
-from src.models import db, User, Curso, Modulo, Leccion, Recurso, Inscripcion, LogActividad
+from src.models import db, User, Curso, Leccion, Recurso, Inscripcion, LogActividad
+from src.services.curso_service import cargar_arbol, contar_inscripciones, resumen_instructores
+from src.services.identity_service import usuario_actual
+from src.services.activity_log import registrar_actividad
 import logging
 
 logger = logging.getLogger(__name__)
@@ -62,7 +65,7 @@ def get_student_dashboard():
             }), 401
         
         # Verificar que el usuario es estudiante
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'estudiante':
             return jsonify({
                 'success': False,
@@ -147,7 +150,7 @@ def get_student_courses():
             }), 401
         
         # Verificar que el usuario es estudiante
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user:
             return jsonify({
                 'success': False,
@@ -166,10 +169,12 @@ def get_student_courses():
             .filter(Inscripcion.estudiante_id == user.id)\
             .all()
         
+        # Instructores de todos los cursos en una sola consulta
+        instructores = resumen_instructores(curso.instructor_id for _, curso in inscripciones)
+        
         cursos_data = []
         for inscripcion, curso in inscripciones:
-            # Obtener información del instructor
-            instructor = User.query.get(curso.instructor_id)
+            instructor = instructores.get(curso.instructor_id)
             
             cursos_data.append({
                 'id': curso.id,
@@ -183,7 +188,7 @@ def get_student_courses():
                 'ultimaActividad': None,
                 'fechaCompletado': None,
                 'calificacion': None,
-                'instructor': instructor.nombre if instructor else 'N/A'
+                'instructor': instructor['nombre'] if instructor else 'N/A'
             })
         
         return jsonify({
@@ -213,7 +218,7 @@ def get_available_courses():
             }), 401
         
         # Verificar que el usuario es estudiante
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user:
             return jsonify({
                 'success': False,
@@ -237,13 +242,14 @@ def get_available_courses():
             ))\
             .all()
         
+        # Instructores e inscritos de todo el catálogo: una consulta cada uno
+        instructores = resumen_instructores(curso.instructor_id for curso in cursos_disponibles)
+        inscritos = contar_inscripciones(curso.id for curso in cursos_disponibles)
+        
         cursos_data = []
         for curso in cursos_disponibles:
-            # Obtener información del instructor
-            instructor = User.query.get(curso.instructor_id)
-            
-            # Contar estudiantes inscritos
-            total_estudiantes = Inscripcion.query.filter_by(curso_id=curso.id).count()
+            instructor = instructores.get(curso.instructor_id)
+            total_estudiantes = inscritos.get(curso.id, 0)
             
             cursos_data.append({
                 'id': curso.id,
@@ -254,7 +260,7 @@ def get_available_courses():
                 'duracion_horas': curso.duracion_horas,
                 'max_estudiantes': curso.max_estudiantes,
                 'estado': curso.estado,
-                'instructor': instructor.nombre if instructor else 'N/A',
+                'instructor': instructor['nombre'] if instructor else 'N/A',
                 'totalEstudiantes': total_estudiantes,
                 'fechaCreacion': curso.fecha_creacion.isoformat(),
                 'convocatoria': curso.convocatoria
@@ -287,7 +293,7 @@ def enroll_course():
             }), 401
         
         # Verificar que el usuario es estudiante
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'estudiante':
             return jsonify({
                 'success': False,
@@ -334,18 +340,8 @@ def enroll_course():
         db.session.add(nueva_inscripcion)
         db.session.commit()
         
-        # Registrar actividad (no debe afectar la inscripción si falla)
-        try:
-            log_actividad = LogActividad(
-                usuario_id=user.id,
-                accion='inscripcion_curso',
-                detalles=f'Se inscribió al curso: {curso.titulo}',
-                fecha=datetime.utcnow()
-            )
-            db.session.add(log_actividad)
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
+        # Registrar actividad (no afecta la inscripción si falla)
+        registrar_actividad(user.id, 'inscripcion_curso', f'Se inscribió al curso: {curso.titulo}')
         
         return jsonify({
             'success': True,
@@ -380,7 +376,7 @@ def get_course_detail(curso_id):
             }), 401
         
         # Verificar que el usuario es estudiante
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'estudiante':
             return jsonify({
                 'success': False,
@@ -407,8 +403,8 @@ def get_course_detail(curso_id):
                 'error': 'Curso no encontrado'
             }), 404
         
-        # Obtener información del instructor
-        instructor = User.query.get(curso.instructor_id)
+        # Obtener información del instructor (sin cargar sus documentos)
+        instructor = resumen_instructores([curso.instructor_id]).get(curso.instructor_id)
         
         curso_data = {
             'id': curso.id,
@@ -419,7 +415,7 @@ def get_course_detail(curso_id):
             'duracion_horas': curso.duracion_horas,
             'max_estudiantes': curso.max_estudiantes,
             'estado': curso.estado,
-            'instructor': instructor.nombre if instructor else 'N/A',
+            'instructor': instructor['nombre'] if instructor else 'N/A',
             'fecha_creacion': curso.fecha_creacion.isoformat(),
             'inscripcion': {
                 'estado': inscripcion.estado,
@@ -458,7 +454,7 @@ def get_course_modules(curso_id):
             }), 401
         
         # Verificar que el usuario es estudiante
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'estudiante':
             return jsonify({
                 'success': False,
@@ -477,16 +473,13 @@ def get_course_modules(curso_id):
                 'error': 'No estás inscrito en este curso'
             }), 404
         
-        # Obtener módulos del curso
-        modulos = Modulo.query.filter_by(curso_id=curso_id).order_by(Modulo.orden).all()
+        # Obtener módulos y lecciones del curso (una consulta por nivel)
+        arbol = cargar_arbol([curso_id], cargar_lecciones=True)
         
         modulos_data = []
-        for modulo in modulos:
-            # Obtener lecciones del módulo
-            lecciones = Leccion.query.filter_by(modulo_id=modulo.id).order_by(Leccion.orden).all()
-            
+        for modulo in arbol.modulos(curso_id):
             lecciones_data = []
-            for leccion in lecciones:
+            for leccion in arbol.lecciones(modulo.id):
                 lecciones_data.append({
                     'id': leccion.id,
                     'titulo': leccion.titulo,
@@ -535,7 +528,7 @@ def get_course_progress(curso_id):
             }), 401
         
         # Verificar que el usuario es estudiante
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'estudiante':
             return jsonify({
                 'success': False,
@@ -592,7 +585,7 @@ def complete_lesson(leccion_id):
             }), 401
         
         # Verificar que el usuario es estudiante
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'estudiante':
             return jsonify({
                 'success': False,
@@ -621,19 +614,10 @@ def complete_lesson(leccion_id):
         
         # Actualizar progreso (simulado)
         inscripcion.ultima_actividad = datetime.utcnow()
+        db.session.commit()
         
         # Registrar actividad
-        log_actividad = LogActividad(
-            usuario_id=user.id,
-            accion='leccion_completada',
-            detalles=f'Completó la lección: {leccion.titulo}',
-            fecha=datetime.utcnow()
-        )
-        try:
-            db.session.add(log_actividad)
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
+        registrar_actividad(user.id, 'leccion_completada', f'Completó la lección: {leccion.titulo}')
         
         return jsonify({
             'success': True,
@@ -760,7 +744,7 @@ def get_student_config():
             }), 401
         
         # Verificar que el usuario es estudiante
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'estudiante':
             return jsonify({
                 'success': False,
@@ -803,7 +787,7 @@ def update_student_config():
             }), 401
         
         # Verificar que el usuario es estudiante
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'estudiante':
             return jsonify({
                 'success': False,
@@ -842,7 +826,7 @@ def get_student_certificates():
             }), 401
         
         # Verificar que el usuario es estudiante
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'estudiante':
             return jsonify({
                 'success': False,
@@ -895,7 +879,7 @@ def get_student_statistics():
             }), 401
         
         # Verificar que el usuario es estudiante
-        user = User.query.get(user_id)
+        user = usuario_actual()
         if not user or user.rol != 'estudiante':
             return jsonify({
                 'success': False,
@@ -1,7 +1,13 @@
-from flask import Blueprint, jsonify, request, session  # pyright: ignore[reportMissingImports]
+from flask import Blueprint, jsonify, request, session, after_this_request  # pyright: ignore[reportMissingImports]
 from src.models import db, User
-from src.models import CuposConfig, MunicipioCupo
-from src.models import LogActividad, Notificacion
+from src.models import CuposConfig, MunicipioCupo, CupoOcupacion
+from src.models import LogActividad
+from sqlalchemy import and_, func
+from src.services.document_store import document_store
+from src.services.activity_log import registrar_actividad
+from src.services.bulk_user_service import FASES_VALIDAS, cambiar_fase
+from src.services.upload_stream import leer_multipart, tamano_base64, ArchivoSubido, ArchivoDemasiadoGrande, FormularioInvalido
+from src.constants.documentos import DOCUMENTOS_USUARIO
 from src.constants.municipios import LISTA_MUNICIPIOS
 from werkzeug.security import generate_password_hash  # pyright: ignore[reportMissingImports]
 import re
@@ -24,10 +30,71 @@ def validate_password(password):
         return False
     return True
 
+# Tamaño máximo por documento adjunto
+MAX_DOCUMENTO_BYTES = 20 * 1024 * 1024
+
+# Campos booleanos del registro (en multipart llegan como texto)
+CAMPOS_BOOLEANOS_REGISTRO = [
+    'emprendimiento_formalizado', 'financiado_estado', 'financiado_regalias',
+    'financiado_camara_comercio', 'financiado_incubadoras', 'financiado_otro',
+    'declara_veraz', 'declara_no_beneficiario', 'acepta_terminos'
+]
+
+def leer_registro_multipart():
+    """Leer el registro enviado como multipart/form-data en streaming.
+
+    Los archivos se validan por tamaño mientras se leen y se guardan en
+    archivos temporales; el resultado tiene la misma forma que el JSON del
+    registro (los documentos se marcan como presentes por su nombre).
+    """
+    campos, archivos = leer_multipart(
+        request.stream,
+        request.mimetype_params.get('boundary'),
+        MAX_DOCUMENTO_BYTES
+    )
+
+    @after_this_request
+    def cerrar_archivos(response):
+        for archivo in archivos.values():
+            archivo.cerrar()
+        return response
+
+    data = dict(campos)
+    for campo in CAMPOS_BOOLEANOS_REGISTRO:
+        if campo in data:
+            data[campo] = data[campo].strip().lower() in ('true', '1', 'si', 'sí', 'on')
+    for campo, archivo in archivos.items():
+        if campo not in DOCUMENTOS_USUARIO or archivo.tamano == 0:
+            continue
+        data[campo] = archivo.nombre or campo
+        campo_nombre = DOCUMENTOS_USUARIO[campo]
+        if archivo.nombre and not data.get(campo_nombre):
+            data[campo_nombre] = archivo.nombre
+    return data, archivos
+
+def leer_documento_registro(data, archivos, campo):
+    """Documento del registro: parte multipart (en disco) o bytes del base64 del JSON"""
+    if campo in archivos:
+        return archivos[campo]
+    return base64.b64decode(data[campo])
+
 @user_bp.route('/register', methods=['POST'])
 def register():
     try:
-        data = request.json
+        archivos = {}
+        if request.mimetype == 'multipart/form-data':
+            try:
+                data, archivos = leer_registro_multipart()
+            except ArchivoDemasiadoGrande as e:
+                return jsonify({'error': f'El archivo {e.campo} no puede superar 20MB'}), 413
+            except FormularioInvalido as e:
+                return jsonify({'error': str(e)}), 400
+        else:
+            data = request.json
+            # Rechazar documentos demasiado grandes antes de decodificarlos
+            for campo in DOCUMENTOS_USUARIO:
+                if tamano_base64(data.get(campo)) > MAX_DOCUMENTO_BYTES:
+                    return jsonify({'error': f'El archivo {campo} no puede superar 20MB'}), 413
         
         # Validar campos obligatorios
         required_fields = ['nombre', 'apellido', 'email', 'tipo_documento', 'numero_documento', 'password', 'confirm_password', 'convocatoria', 'fecha_nacimiento', 'sexo', 'estado_civil', 'telefono', 'direccion', 'municipio', 'emprendimiento_nombre', 'emprendimiento_sector', 'tipo_persona', 'emprendimiento_formalizado', 'financiado_estado', 'declara_veraz', 'declara_no_beneficiario', 'acepta_terminos', 'doc_terminos_pdf', 'doc_uso_imagen_pdf', 'doc_plan_negocio_xls', 'doc_vecindad_pdf']
@@ -102,7 +169,7 @@ def register():
         # Validar y decodificar TDR (PDF obligatorio)
         if data.get('doc_terminos_pdf'):
             try:
-                doc_terminos_pdf = base64.b64decode(data['doc_terminos_pdf'])
+                doc_terminos_pdf = leer_documento_registro(data, archivos, 'doc_terminos_pdf')
                 doc_terminos_pdf_nombre = data.get('doc_terminos_pdf_nombre', 'terminos.pdf')
                 # Validar tamaño (20MB máximo)
                 if len(doc_terminos_pdf) > 20 * 1024 * 1024:
@@ -113,7 +180,7 @@ def register():
         # Validar y decodificar Uso de Imagen (PDF obligatorio)
         if data.get('doc_uso_imagen_pdf'):
             try:
-                doc_uso_imagen_pdf = base64.b64decode(data['doc_uso_imagen_pdf'])
+                doc_uso_imagen_pdf = leer_documento_registro(data, archivos, 'doc_uso_imagen_pdf')
                 doc_uso_imagen_pdf_nombre = data.get('doc_uso_imagen_pdf_nombre', 'uso_imagen.pdf')
                 if len(doc_uso_imagen_pdf) > 20 * 1024 * 1024:
                     return jsonify({'error': 'El archivo de autorización de uso de imagen no puede superar 20MB'}), 400
@@ -123,7 +190,7 @@ def register():
         # Validar y decodificar Plan de Negocio (Excel obligatorio)
         if data.get('doc_plan_negocio_xls'):
             try:
-                doc_plan_negocio_xls = base64.b64decode(data['doc_plan_negocio_xls'])
+                doc_plan_negocio_xls = leer_documento_registro(data, archivos, 'doc_plan_negocio_xls')
                 doc_plan_negocio_nombre = data.get('doc_plan_negocio_nombre', 'plan_negocio.xlsx')
                 if len(doc_plan_negocio_xls) > 20 * 1024 * 1024:
                     return jsonify({'error': 'El archivo del plan de negocio no puede superar 20MB'}), 400
@@ -133,7 +200,7 @@ def register():
         # Validar y decodificar Vecindad (PDF obligatorio)
         if data.get('doc_vecindad_pdf'):
             try:
-                doc_vecindad_pdf = base64.b64decode(data['doc_vecindad_pdf'])
+                doc_vecindad_pdf = leer_documento_registro(data, archivos, 'doc_vecindad_pdf')
                 doc_vecindad_pdf_nombre = data.get('doc_vecindad_pdf_nombre', 'vecindad.pdf')
                 if len(doc_vecindad_pdf) > 20 * 1024 * 1024:
                     return jsonify({'error': 'El certificado de vecindad no puede superar 20MB'}), 400
@@ -159,7 +226,7 @@ def register():
             
             # Procesar RUT
             try:
-                rut_pdf = base64.b64decode(data['rut_pdf'])
+                rut_pdf = leer_documento_registro(data, archivos, 'rut_pdf')
                 rut_pdf_nombre = data.get('rut_pdf_nombre', 'rut.pdf')
                 if len(rut_pdf) > 20 * 1024 * 1024:
                     return jsonify({'error': 'El archivo del RUT no puede superar 20MB'}), 400
@@ -168,7 +235,7 @@ def register():
             
             # Procesar Cédula
             try:
-                cedula_pdf = base64.b64decode(data['cedula_pdf'])
+                cedula_pdf = leer_documento_registro(data, archivos, 'cedula_pdf')
                 cedula_pdf_nombre = data.get('cedula_pdf_nombre', 'cedula.pdf')
                 if len(cedula_pdf) > 20 * 1024 * 1024:
                     return jsonify({'error': 'El archivo de la cédula no puede superar 20MB'}), 400
@@ -186,7 +253,7 @@ def register():
             
             # Procesar RUT
             try:
-                rut_pdf = base64.b64decode(data['rut_pdf'])
+                rut_pdf = leer_documento_registro(data, archivos, 'rut_pdf')
                 rut_pdf_nombre = data.get('rut_pdf_nombre', 'rut.pdf')
                 if len(rut_pdf) > 20 * 1024 * 1024:
                     return jsonify({'error': 'El archivo del RUT no puede superar 20MB'}), 400
@@ -195,7 +262,7 @@ def register():
             
             # Procesar Cédula representante
             try:
-                cedula_representante_pdf = base64.b64decode(data['cedula_representante_pdf'])
+                cedula_representante_pdf = leer_documento_registro(data, archivos, 'cedula_representante_pdf')
                 cedula_representante_pdf_nombre = data.get('cedula_representante_pdf_nombre', 'cedula_representante.pdf')
                 if len(cedula_representante_pdf) > 20 * 1024 * 1024:
                     return jsonify({'error': 'El archivo de la cédula del representante no puede superar 20MB'}), 400
@@ -204,7 +271,7 @@ def register():
             
             # Procesar Certificado de existencia
             try:
-                cert_existencia_pdf = base64.b64decode(data['cert_existencia_pdf'])
+                cert_existencia_pdf = leer_documento_registro(data, archivos, 'cert_existencia_pdf')
                 cert_existencia_pdf_nombre = data.get('cert_existencia_pdf_nombre', 'certificado_existencia.pdf')
                 if len(cert_existencia_pdf) > 20 * 1024 * 1024:
                     return jsonify({'error': 'El certificado de existencia no puede superar 20MB'}), 400
@@ -229,7 +296,7 @@ def register():
         # RUV (opcional)
         if data.get('ruv_pdf'):
             try:
-                ruv_pdf = base64.b64decode(data['ruv_pdf'])
+                ruv_pdf = leer_documento_registro(data, archivos, 'ruv_pdf')
                 ruv_pdf_nombre = data.get('ruv_pdf_nombre', 'ruv.pdf')
                 if len(ruv_pdf) > 20 * 1024 * 1024:
                     return jsonify({'error': 'El certificado RUV no puede superar 20MB'}), 400
@@ -242,7 +309,7 @@ def register():
         # SISBEN (opcional)
         if data.get('sisben_pdf'):
             try:
-                sisben_pdf = base64.b64decode(data['sisben_pdf'])
+                sisben_pdf = leer_documento_registro(data, archivos, 'sisben_pdf')
                 sisben_pdf_nombre = data.get('sisben_pdf_nombre', 'sisben.pdf')
                 if len(sisben_pdf) > 20 * 1024 * 1024:
                     return jsonify({'error': 'La copia del SISBEN no puede superar 20MB'}), 400
@@ -255,7 +322,7 @@ def register():
         # Grupo étnico (opcional)
         if data.get('grupo_etnico_pdf'):
             try:
-                grupo_etnico_pdf = base64.b64decode(data['grupo_etnico_pdf'])
+                grupo_etnico_pdf = leer_documento_registro(data, archivos, 'grupo_etnico_pdf')
                 grupo_etnico_pdf_nombre = data.get('grupo_etnico_pdf_nombre', 'grupo_etnico.pdf')
                 if len(grupo_etnico_pdf) > 20 * 1024 * 1024:
                     return jsonify({'error': 'El certificado de grupo étnico no puede superar 20MB'}), 400
@@ -268,7 +335,7 @@ def register():
         # ARN (opcional)
         if data.get('arn_pdf'):
             try:
-                arn_pdf = base64.b64decode(data['arn_pdf'])
+                arn_pdf = leer_documento_registro(data, archivos, 'arn_pdf')
                 arn_pdf_nombre = data.get('arn_pdf_nombre', 'arn.pdf')
                 if len(arn_pdf) > 20 * 1024 * 1024:
                     return jsonify({'error': 'El certificado ARN no puede superar 20MB'}), 400
@@ -281,7 +348,7 @@ def register():
         # Discapacidad (opcional)
         if data.get('discapacidad_pdf'):
             try:
-                discapacidad_pdf = base64.b64decode(data['discapacidad_pdf'])
+                discapacidad_pdf = leer_documento_registro(data, archivos, 'discapacidad_pdf')
                 discapacidad_pdf_nombre = data.get('discapacidad_pdf_nombre', 'discapacidad.pdf')
                 if len(discapacidad_pdf) > 20 * 1024 * 1024:
                     return jsonify({'error': 'El certificado de discapacidad no puede superar 20MB'}), 400
@@ -336,7 +403,7 @@ def register():
         
         # Procesar cada documento de control
         try:
-            antecedentes_fiscales_pdf = base64.b64decode(data['antecedentes_fiscales_pdf'])
+            antecedentes_fiscales_pdf = leer_documento_registro(data, archivos, 'antecedentes_fiscales_pdf')
             antecedentes_fiscales_pdf_nombre = data.get('antecedentes_fiscales_pdf_nombre', 'antecedentes_fiscales.pdf')
             if len(antecedentes_fiscales_pdf) > 20 * 1024 * 1024:
                 return jsonify({'error': 'Los antecedentes fiscales no pueden superar 20MB'}), 400
@@ -344,7 +411,7 @@ def register():
             return jsonify({'error': 'Error al procesar los antecedentes fiscales'}), 400
         
         try:
-            antecedentes_disciplinarios_pdf = base64.b64decode(data['antecedentes_disciplinarios_pdf'])
+            antecedentes_disciplinarios_pdf = leer_documento_registro(data, archivos, 'antecedentes_disciplinarios_pdf')
             antecedentes_disciplinarios_pdf_nombre = data.get('antecedentes_disciplinarios_pdf_nombre', 'antecedentes_disciplinarios.pdf')
             if len(antecedentes_disciplinarios_pdf) > 20 * 1024 * 1024:
                 return jsonify({'error': 'Los antecedentes disciplinarios no pueden superar 20MB'}), 400
@@ -352,7 +419,7 @@ def register():
             return jsonify({'error': 'Error al procesar los antecedentes disciplinarios'}), 400
         
         try:
-            antecedentes_judiciales_pdf = base64.b64decode(data['antecedentes_judiciales_pdf'])
+            antecedentes_judiciales_pdf = leer_documento_registro(data, archivos, 'antecedentes_judiciales_pdf')
             antecedentes_judiciales_pdf_nombre = data.get('antecedentes_judiciales_pdf_nombre', 'antecedentes_judiciales.pdf')
             if len(antecedentes_judiciales_pdf) > 20 * 1024 * 1024:
                 return jsonify({'error': 'Los antecedentes judiciales no pueden superar 20MB'}), 400
@@ -360,7 +427,7 @@ def register():
             return jsonify({'error': 'Error al procesar los antecedentes judiciales'}), 400
         
         try:
-            redam_pdf = base64.b64decode(data['redam_pdf'])
+            redam_pdf = leer_documento_registro(data, archivos, 'redam_pdf')
             redam_pdf_nombre = data.get('redam_pdf_nombre', 'redam.pdf')
             if len(redam_pdf) > 20 * 1024 * 1024:
                 return jsonify({'error': 'El certificado REDAM no puede superar 20MB'}), 400
@@ -368,7 +435,7 @@ def register():
             return jsonify({'error': 'Error al procesar el certificado REDAM'}), 400
         
         try:
-            inhabilidades_sexuales_pdf = base64.b64decode(data['inhabilidades_sexuales_pdf'])
+            inhabilidades_sexuales_pdf = leer_documento_registro(data, archivos, 'inhabilidades_sexuales_pdf')
             inhabilidades_sexuales_pdf_nombre = data.get('inhabilidades_sexuales_pdf_nombre', 'inhabilidades_sexuales.pdf')
             if len(inhabilidades_sexuales_pdf) > 20 * 1024 * 1024:
                 return jsonify({'error': 'La consulta de inhabilidades sexuales no puede superar 20MB'}), 400
@@ -376,7 +443,7 @@ def register():
             return jsonify({'error': 'Error al procesar la consulta de inhabilidades sexuales'}), 400
         
         try:
-            declaracion_capacidad_legal_pdf = base64.b64decode(data['declaracion_capacidad_legal_pdf'])
+            declaracion_capacidad_legal_pdf = leer_documento_registro(data, archivos, 'declaracion_capacidad_legal_pdf')
             declaracion_capacidad_legal_pdf_nombre = data.get('declaracion_capacidad_legal_pdf_nombre', 'declaracion_capacidad.pdf')
             if len(declaracion_capacidad_legal_pdf) > 20 * 1024 * 1024:
                 return jsonify({'error': 'La declaración de capacidad legal no puede superar 20MB'}), 400
@@ -406,7 +473,7 @@ def register():
                 return jsonify({'error': 'Para emprendimientos formalizados, las facturas de los últimos 6 meses son obligatorias'}), 400
             
             try:
-                matricula_mercantil_pdf = base64.b64decode(data['matricula_mercantil_pdf'])
+                matricula_mercantil_pdf = leer_documento_registro(data, archivos, 'matricula_mercantil_pdf')
                 matricula_mercantil_pdf_nombre = data.get('matricula_mercantil_pdf_nombre', 'matricula_mercantil.pdf')
                 if len(matricula_mercantil_pdf) > 20 * 1024 * 1024:
                     return jsonify({'error': 'La matrícula mercantil no puede superar 20MB'}), 400
@@ -414,7 +481,7 @@ def register():
                 return jsonify({'error': 'Error al procesar la matrícula mercantil'}), 400
             
             try:
-                facturas_6meses_pdf = base64.b64decode(data['facturas_6meses_pdf'])
+                facturas_6meses_pdf = leer_documento_registro(data, archivos, 'facturas_6meses_pdf')
                 facturas_6meses_pdf_nombre = data.get('facturas_6meses_pdf_nombre', 'facturas_6meses.pdf')
                 if len(facturas_6meses_pdf) > 20 * 1024 * 1024:
                     return jsonify({'error': 'Las facturas de los últimos 6 meses no pueden superar 20MB'}), 400
@@ -429,7 +496,7 @@ def register():
                 return jsonify({'error': 'Para emprendimientos informales, el registro de ventas de los últimos 6 meses es obligatorio'}), 400
             
             try:
-                publicaciones_redes_pdf = base64.b64decode(data['publicaciones_redes_pdf'])
+                publicaciones_redes_pdf = leer_documento_registro(data, archivos, 'publicaciones_redes_pdf')
                 publicaciones_redes_pdf_nombre = data.get('publicaciones_redes_pdf_nombre', 'publicaciones_redes.pdf')
                 if len(publicaciones_redes_pdf) > 20 * 1024 * 1024:
                     return jsonify({'error': 'Las publicaciones de redes sociales no pueden superar 20MB'}), 400
@@ -437,7 +504,7 @@ def register():
                 return jsonify({'error': 'Error al procesar las publicaciones de redes sociales'}), 400
             
             try:
-                registro_ventas_pdf = base64.b64decode(data['registro_ventas_pdf'])
+                registro_ventas_pdf = leer_documento_registro(data, archivos, 'registro_ventas_pdf')
                 registro_ventas_pdf_nombre = data.get('registro_ventas_pdf_nombre', 'registro_ventas.pdf')
                 if len(registro_ventas_pdf) > 20 * 1024 * 1024:
                     return jsonify({'error': 'El registro de ventas no puede superar 20MB'}), 400
@@ -504,15 +571,11 @@ def register():
                     .first()
                 )
 
-                # Conteos actuales (confirmados/pedientes activación)
-                q_base = db.session.query(User).filter(
-                    User.convocatoria == data['convocatoria']
+                # Conteos actuales (confirmados/pedientes activación) desde los
+                # contadores materializados; las filas quedan bloqueadas hasta el commit
+                muni_confirmados, total_confirmados = CupoOcupacion.confirmados(
+                    data['convocatoria'], data['municipio'], bloquear=True
                 )
-                total_confirmados = q_base.filter(User.estado_cuenta.in_(['activa', 'inactiva'])).count()
-                muni_confirmados = q_base.filter(
-                    User.municipio == data['municipio'],
-                    User.estado_cuenta.in_(['activa', 'inactiva'])
-                ).count()
 
                 municipio_lleno = bool(muni_row) and muni_confirmados >= int(muni_row.cupo_max)
                 global_lleno = cupo_global_max is not None and total_confirmados >= int(cupo_global_max)
@@ -538,56 +601,33 @@ def register():
             emprendimiento_nombre=data.get('emprendimiento_nombre'),
             emprendimiento_sector=sector_val,
             tipo_persona=tipo_persona_val,
-            doc_terminos_pdf=doc_terminos_pdf,
             doc_terminos_pdf_nombre=doc_terminos_pdf_nombre,
-            doc_uso_imagen_pdf=doc_uso_imagen_pdf,
             doc_uso_imagen_pdf_nombre=doc_uso_imagen_pdf_nombre,
-            doc_plan_negocio_xls=doc_plan_negocio_xls,
             doc_plan_negocio_nombre=doc_plan_negocio_nombre,
-            doc_vecindad_pdf=doc_vecindad_pdf,
             doc_vecindad_pdf_nombre=doc_vecindad_pdf_nombre,
             video_url=video_url,
-            rut_pdf=rut_pdf,
             rut_pdf_nombre=rut_pdf_nombre,
-            cedula_pdf=cedula_pdf,
             cedula_pdf_nombre=cedula_pdf_nombre,
-            cedula_representante_pdf=cedula_representante_pdf,
             cedula_representante_pdf_nombre=cedula_representante_pdf_nombre,
-            cert_existencia_pdf=cert_existencia_pdf,
             cert_existencia_pdf_nombre=cert_existencia_pdf_nombre,
-            ruv_pdf=ruv_pdf,
             ruv_pdf_nombre=ruv_pdf_nombre,
-            sisben_pdf=sisben_pdf,
             sisben_pdf_nombre=sisben_pdf_nombre,
-            grupo_etnico_pdf=grupo_etnico_pdf,
             grupo_etnico_pdf_nombre=grupo_etnico_pdf_nombre,
-            arn_pdf=arn_pdf,
             arn_pdf_nombre=arn_pdf_nombre,
-            discapacidad_pdf=discapacidad_pdf,
             discapacidad_pdf_nombre=discapacidad_pdf_nombre,
-            antecedentes_fiscales_pdf=antecedentes_fiscales_pdf,
             antecedentes_fiscales_pdf_nombre=antecedentes_fiscales_pdf_nombre,
-            antecedentes_disciplinarios_pdf=antecedentes_disciplinarios_pdf,
             antecedentes_disciplinarios_pdf_nombre=antecedentes_disciplinarios_pdf_nombre,
-            antecedentes_judiciales_pdf=antecedentes_judiciales_pdf,
             antecedentes_judiciales_pdf_nombre=antecedentes_judiciales_pdf_nombre,
-            redam_pdf=redam_pdf,
             redam_pdf_nombre=redam_pdf_nombre,
-            inhabilidades_sexuales_pdf=inhabilidades_sexuales_pdf,
             inhabilidades_sexuales_pdf_nombre=inhabilidades_sexuales_pdf_nombre,
-            declaracion_capacidad_legal_pdf=declaracion_capacidad_legal_pdf,
             declaracion_capacidad_legal_pdf_nombre=declaracion_capacidad_legal_pdf_nombre,
             estado_control='completo',  # Todos los documentos de control están cargados
             resultado_certificados='pendiente',  # Pendiente de revisión administrativa
             # Certificación de funcionamiento
             emprendimiento_formalizado=emprendimiento_formalizado,
-            matricula_mercantil_pdf=matricula_mercantil_pdf,
             matricula_mercantil_pdf_nombre=matricula_mercantil_pdf_nombre,
-            facturas_6meses_pdf=facturas_6meses_pdf,
             facturas_6meses_pdf_nombre=facturas_6meses_pdf_nombre,
-            publicaciones_redes_pdf=publicaciones_redes_pdf,
             publicaciones_redes_pdf_nombre=publicaciones_redes_pdf_nombre,
-            registro_ventas_pdf=registro_ventas_pdf,
             registro_ventas_pdf_nombre=registro_ventas_pdf_nombre,
             # Financiación de otras fuentes
             financiado_estado=financiado_estado,
@@ -612,62 +652,93 @@ def register():
         user.set_password(data['password'])
         
         db.session.add(user)
-        db.session.commit()
+        db.session.flush()
 
-        # Log de registro con estado de documentos diferenciales, control y funcionamiento
-        try:
-            detalles_log = f"Registro {'lista_espera' if estado_cuenta=='lista_espera' else 'confirmado'} en {user.municipio} (conv {user.convocatoria})"
-            detalles_log += f". Control: {user.estado_control} (todos los certificados de control cargados)"
-            
-            # Información de funcionamiento
-            tipo_funcionamiento = "formalizado" if emprendimiento_formalizado else "informal"
-            docs_funcionamiento = []
-            if emprendimiento_formalizado:
-                if matricula_mercantil_pdf:
-                    docs_funcionamiento.append("matrícula mercantil")
-                if facturas_6meses_pdf:
-                    docs_funcionamiento.append("facturas 6 meses")
+        # Guardar los documentos en el almacén direccionado por contenido
+        documentos = {
+            'doc_terminos_pdf': (doc_terminos_pdf, doc_terminos_pdf_nombre),
+            'doc_uso_imagen_pdf': (doc_uso_imagen_pdf, doc_uso_imagen_pdf_nombre),
+            'doc_plan_negocio_xls': (doc_plan_negocio_xls, doc_plan_negocio_nombre),
+            'doc_vecindad_pdf': (doc_vecindad_pdf, doc_vecindad_pdf_nombre),
+            'rut_pdf': (rut_pdf, rut_pdf_nombre),
+            'cedula_pdf': (cedula_pdf, cedula_pdf_nombre),
+            'cedula_representante_pdf': (cedula_representante_pdf, cedula_representante_pdf_nombre),
+            'cert_existencia_pdf': (cert_existencia_pdf, cert_existencia_pdf_nombre),
+            'ruv_pdf': (ruv_pdf, ruv_pdf_nombre),
+            'sisben_pdf': (sisben_pdf, sisben_pdf_nombre),
+            'grupo_etnico_pdf': (grupo_etnico_pdf, grupo_etnico_pdf_nombre),
+            'arn_pdf': (arn_pdf, arn_pdf_nombre),
+            'discapacidad_pdf': (discapacidad_pdf, discapacidad_pdf_nombre),
+            'antecedentes_fiscales_pdf': (antecedentes_fiscales_pdf, antecedentes_fiscales_pdf_nombre),
+            'antecedentes_disciplinarios_pdf': (antecedentes_disciplinarios_pdf, antecedentes_disciplinarios_pdf_nombre),
+            'antecedentes_judiciales_pdf': (antecedentes_judiciales_pdf, antecedentes_judiciales_pdf_nombre),
+            'redam_pdf': (redam_pdf, redam_pdf_nombre),
+            'inhabilidades_sexuales_pdf': (inhabilidades_sexuales_pdf, inhabilidades_sexuales_pdf_nombre),
+            'declaracion_capacidad_legal_pdf': (declaracion_capacidad_legal_pdf, declaracion_capacidad_legal_pdf_nombre),
+            'matricula_mercantil_pdf': (matricula_mercantil_pdf, matricula_mercantil_pdf_nombre),
+            'facturas_6meses_pdf': (facturas_6meses_pdf, facturas_6meses_pdf_nombre),
+            'publicaciones_redes_pdf': (publicaciones_redes_pdf, publicaciones_redes_pdf_nombre),
+            'registro_ventas_pdf': (registro_ventas_pdf, registro_ventas_pdf_nombre),
+        }
+        for doc_type, (contenido, nombre) in documentos.items():
+            if not contenido:
+                continue
+            if isinstance(contenido, ArchivoSubido):
+                # Solo un archivo multipart a la vez pasa por memoria
+                document_store.guardar(user.id, doc_type, contenido.leer(), nombre, contenido.content_type)
             else:
-                if publicaciones_redes_pdf:
-                    docs_funcionamiento.append("publicaciones redes")
-                if registro_ventas_pdf:
-                    docs_funcionamiento.append("registro ventas")
-            
-            detalles_log += f". Funcionamiento: {tipo_funcionamiento} ({', '.join(docs_funcionamiento)})"
-            
-            # Información de financiación
-            financiacion_info = "No financiado"
-            if financiado_estado:
-                fuentes_financiacion = []
-                if financiado_regalias:
-                    fuentes_financiacion.append("Regalías")
-                if financiado_camara_comercio:
-                    fuentes_financiacion.append("Cámara de Comercio")
-                if financiado_incubadoras:
-                    fuentes_financiacion.append("Incubadoras")
-                if financiado_otro:
-                    fuentes_financiacion.append(f"Otro ({financiado_otro_texto})")
-                financiacion_info = f"Financiado por: {', '.join(fuentes_financiacion)}"
-            
-            detalles_log += f". Financiación: {financiacion_info}"
-            
-            # Información de declaraciones (para trazabilidad legal)
-            declaraciones_info = f"Declaraciones aceptadas: Veraz={declara_veraz}, No beneficiario={declara_no_beneficiario}, Términos={acepta_terminos} el {fecha_aceptacion_terminos.strftime('%Y-%m-%d %H:%M:%S')}"
-            detalles_log += f". {declaraciones_info}"
-            
-            if docs_diferenciales_cargados:
-                detalles_log += f". Docs diferenciales cargados: {', '.join(docs_diferenciales_cargados)}"
-            if docs_diferenciales_pendientes:
-                detalles_log += f". Docs diferenciales pendientes/subsanables: {', '.join(docs_diferenciales_pendientes)}"
-            
-            db.session.add(LogActividad(
-                usuario_id=user.id,
-                accion='register',
-                detalles=detalles_log
-            ))
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
+                document_store.guardar(user.id, doc_type, contenido, nombre)
+
+        # Log de registro con estado de documentos diferenciales, control y funcionamiento
+        detalles_log = f"Registro {'lista_espera' if estado_cuenta=='lista_espera' else 'confirmado'} en {user.municipio} (conv {user.convocatoria})"
+        detalles_log += f". Control: {user.estado_control} (todos los certificados de control cargados)"
+        
+        # Información de funcionamiento
+        tipo_funcionamiento = "formalizado" if emprendimiento_formalizado else "informal"
+        docs_funcionamiento = []
+        if emprendimiento_formalizado:
+            if matricula_mercantil_pdf:
+                docs_funcionamiento.append("matrícula mercantil")
+            if facturas_6meses_pdf:
+                docs_funcionamiento.append("facturas 6 meses")
+        else:
+            if publicaciones_redes_pdf:
+                docs_funcionamiento.append("publicaciones redes")
+            if registro_ventas_pdf:
+                docs_funcionamiento.append("registro ventas")
+        
+        detalles_log += f". Funcionamiento: {tipo_funcionamiento} ({', '.join(docs_funcionamiento)})"
+        
+        # Información de financiación
+        financiacion_info = "No financiado"
+        if financiado_estado:
+            fuentes_financiacion = []
+            if financiado_regalias:
+                fuentes_financiacion.append("Regalías")
+            if financiado_camara_comercio:
+                fuentes_financiacion.append("Cámara de Comercio")
+            if financiado_incubadoras:
+                fuentes_financiacion.append("Incubadoras")
+            if financiado_otro:
+                fuentes_financiacion.append(f"Otro ({financiado_otro_texto})")
+            financiacion_info = f"Financiado por: {', '.join(fuentes_financiacion)}"
+        
+        detalles_log += f". Financiación: {financiacion_info}"
+        
+        # Información de declaraciones (para trazabilidad legal)
+        declaraciones_info = f"Declaraciones aceptadas: Veraz={declara_veraz}, No beneficiario={declara_no_beneficiario}, Términos={acepta_terminos} el {fecha_aceptacion_terminos.strftime('%Y-%m-%d %H:%M:%S')}"
+        detalles_log += f". {declaraciones_info}"
+        
+        if docs_diferenciales_cargados:
+            detalles_log += f". Docs diferenciales cargados: {', '.join(docs_diferenciales_cargados)}"
+        if docs_diferenciales_pendientes:
+            detalles_log += f". Docs diferenciales pendientes/subsanables: {', '.join(docs_diferenciales_pendientes)}"
+        
+        # Síncrono: la aceptación de términos (trazabilidad legal) se confirma
+        # en la misma transacción que el usuario y sus documentos
+        registrar_actividad(user.id, 'register', detalles_log, sincrono=True)
+
+        db.session.commit()
         
         return jsonify({
             'message': 'Usuario registrado exitosamente. Tu cuenta está pendiente de activación por el administrador.',
@@ -748,12 +819,7 @@ def save_partial():
         db.session.commit()
         
         # Log de guardado parcial
-        db.session.add(LogActividad(
-            usuario_id=user.id,
-            accion='guardado_parcial',
-            detalles=f"Guardado parcial paso {paso}. Estado: {user.estado_inscripcion}"
-        ))
-        db.session.commit()
+        registrar_actividad(user.id, 'guardado_parcial', f"Guardado parcial paso {paso}. Estado: {user.estado_inscripcion}")
         
         return jsonify({
             'message': 'Progreso guardado exitosamente',
@@ -902,7 +968,7 @@ def get_profile():
 
 @user_bp.route('/users', methods=['GET'])
 def get_users():
-    users = User.query.all()
+    users = User.query_light().all()
     return jsonify([user.to_dict() for user in users])
 
 @user_bp.route('/users/<int:user_id>', methods=['GET'])
@@ -1013,12 +1079,7 @@ def register_initial():
         db.session.commit()
         
         # Log de actividad
-        db.session.add(LogActividad(
-            usuario_id=user.id,
-            accion='registro_inicial',
-            detalles=f"Usuario creado con datos básicos. Estado: en_progreso, Paso: 1"
-        ))
-        db.session.commit()
+        registrar_actividad(user.id, 'registro_inicial', f"Usuario creado con datos básicos. Estado: en_progreso, Paso: 1")
         
         return jsonify({
             'message': 'Usuario creado exitosamente. Puede continuar completando el formulario.',
@@ -1064,20 +1125,19 @@ def advance_phase():
         if not user_id:
             return jsonify({'error': 'No autorizado'}), 401
         
-        user = User.query.get(user_id)
+        user = db.session.query(User.fase_actual).filter(User.id == user_id).first()
         if not user:
             return jsonify({'error': 'Usuario no encontrado'}), 404
         
-        data = request.json
+        data = request.json or {}
         nueva_fase = data.get('nueva_fase')
         
         # Validar fase válida
-        fases_validas = ['inscripcion', 'formacion', 'entrega_activos']
-        if nueva_fase not in fases_validas:
+        if nueva_fase not in FASES_VALIDAS:
             return jsonify({'error': 'Fase no válida'}), 400
         
         # Verificar que el usuario puede avanzar
-        fase_actual = getattr(user, 'fase_actual', 'inscripcion')
+        fase_actual = user.fase_actual or 'inscripcion'
         
         # Solo permitir avanzar si está en la fase anterior
         if fase_actual == 'inscripcion' and nueva_fase != 'formacion':
@@ -1087,41 +1147,23 @@ def advance_phase():
         elif fase_actual == 'entrega_activos':
             return jsonify({'error': 'Ya está en la fase final'}), 400
         
-        # Actualizar fase
-        user.fase_actual = nueva_fase
-        user.fecha_entrada_fase = datetime.utcnow()
-        user.fase_completada = False
-        
-        db.session.commit()
-        
-        # Crear notificación de cambio de fase
-        mensajes = {
-            'inscripcion': 'Tu emprendimiento ha pasado a la fase de Inscripción y Selección',
-            'formacion': 'Tu emprendimiento ha pasado a la fase de Formación',
-            'entrega_activos': 'Tu emprendimiento ha pasado a la fase de Entrega de Activos Productivos'
-        }
-        
-        mensaje = mensajes.get(nueva_fase, f'Tu emprendimiento ha pasado a la fase: {nueva_fase}')
-        
-        notificacion = Notificacion(
-            user_id=user.id,
-            mensaje=mensaje,
-            fase_nueva=nueva_fase
-        )
-        db.session.add(notificacion)
-        
-        # Log de actividad
-        db.session.add(LogActividad(
-            usuario_id=user.id,
+        # Fase, notificación y log en una sola transacción; la condición sobre
+        # la fase evita avanzar dos veces con peticiones simultáneas
+        condicion = and_(User.id == user_id, func.coalesce(User.fase_actual, 'inscripcion') == fase_actual)
+        actualizados, fecha = cambiar_fase(
+            condicion, nueva_fase,
             accion='cambio_fase',
-            detalles=f"Usuario avanzó de {fase_actual} a {nueva_fase}"
-        ))
+            detalle='Usuario avanzó de {anterior} a {nueva}'
+        )
+        if not actualizados:
+            db.session.rollback()
+            return jsonify({'error': 'La fase cambió mientras se procesaba la solicitud'}), 409
         db.session.commit()
         
         return jsonify({
             'message': f'Fase actualizada a {nueva_fase}',
             'fase_actual': nueva_fase,
-            'fecha_entrada_fase': user.fecha_entrada_fase.isoformat()
+            'fecha_entrada_fase': fecha.isoformat()
         }), 200
         
     except Exception as e:
@@ -1147,12 +1189,7 @@ def complete_phase():
         
         # Log de actividad
         fase_actual = getattr(user, 'fase_actual', 'inscripcion')
-        db.session.add(LogActividad(
-            usuario_id=user.id,
-            accion='fase_completada',
-            detalles=f"Usuario completó la fase {fase_actual}"
-        ))
-        db.session.commit()
+        registrar_actividad(user.id, 'fase_completada', f"Usuario completó la fase {fase_actual}")
         
         return jsonify({
             'message': f'Fase {fase_actual} completada exitosamente',
@@ -0,0 +1,157 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from flask import current_app, has_app_context
+from sqlalchemy import insert
+from src.models import db, LogActividad
+
+logger = logging.getLogger(__name__)
+
+# Filas por INSERT como máximo
+TAMANO_LOTE = 200
+# Segundos que una fila puede esperar en la cola antes de escribirse
+INTERVALO = 1.0
+# Filas en cola como máximo; si se llena, quien registra escribe directamente
+MAX_COLA = 10000
+# Segundos que se espera al hilo al cerrar el proceso
+ESPERA_CIERRE = 5.0
+
+_FIN = object()
+
+
+class RegistroActividad:
+    """Escritura de log_actividad en lotes desde un hilo de fondo.
+
+    Las rutas encolan la fila y responden sin un segundo commit; el hilo junta
+    hasta `tamano_lote` filas o espera `intervalo` segundos y las inserta con
+    un único INSERT de varias filas. Los eventos con valor legal (aceptación
+    de términos, rechazos) se registran con `sincrono=True` en la transacción
+    de quien llama.
+
+    En AWS Lambda el proceso se congela entre invocaciones, así que por
+    defecto se escribe directamente (config LOG_ACTIVIDAD_ASINCRONO).
+    """
+
+    def __init__(self, tamano_lote=TAMANO_LOTE, intervalo=INTERVALO, maximo=MAX_COLA):
+        self.tamano_lote = tamano_lote
+        self.intervalo = intervalo
+        self.asincrono = True
+        self._cola = queue.Queue(maxsize=maximo)
+        self._app = None
+        self._hilo = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault('LOG_ACTIVIDAD_ASINCRONO', not os.getenv('AWS_LAMBDA_FUNCTION_NAME'))
+        self.asincrono = app.config['LOG_ACTIVIDAD_ASINCRONO']
+        self._app = app
+        atexit.register(self.detener)
+
+    def registrar(self, usuario_id, accion, detalles=None, sincrono=False):
+        """
+        Registrar una actividad
+
+        Args:
+            usuario_id: Usuario al que se atribuye (puede ser None)
+            accion: Código de la acción
+            detalles: Texto libre
+            sincrono: Agregar la fila a db.session; se guarda con el próximo
+                commit de quien llama (o se descarta con su rollback)
+        """
+        fila = {'usuario_id': usuario_id, 'accion': accion, 'detalles': detalles, 'fecha': datetime.utcnow()}
+        if sincrono:
+            db.session.add(LogActividad(**fila))
+            return
+
+        if not self.asincrono or self._app is None:
+            self._escribir([fila])
+            return
+
+        self._arrancar()
+        try:
+            self._cola.put_nowait(fila)
+        except queue.Full:
+            logger.warning("Cola de log_actividad llena; escribiendo directamente")
+            self._escribir([fila])
+
+    def vaciar(self):
+        """Escribir lo pendiente y detener el hilo (se vuelve a arrancar al registrar)"""
+        with self._lock:
+            hilo, self._hilo = self._hilo, None
+        if hilo is not None and hilo.is_alive():
+            self._cola.put(_FIN)
+            hilo.join(ESPERA_CIERRE)
+
+        pendientes = []
+        while True:
+            try:
+                fila = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            if fila is not _FIN:
+                pendientes.append(fila)
+        for inicio in range(0, len(pendientes), self.tamano_lote):
+            self._escribir(pendientes[inicio:inicio + self.tamano_lote])
+
+    detener = vaciar
+
+    def _arrancar(self):
+        # Tras un fork (gunicorn) el hilo del padre no existe en el hijo
+        if self._hilo is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._hilo is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._hilo = threading.Thread(target=self._trabajar, name='log-actividad', daemon=True)
+            self._hilo.start()
+
+    def _trabajar(self):
+        fin = False
+        while not fin:
+            fila = self._cola.get()
+            if fila is _FIN:
+                return
+            lote = [fila]
+            limite = time.monotonic() + self.intervalo
+            while len(lote) < self.tamano_lote:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    fila = self._cola.get(timeout=restante)
+                except queue.Empty:
+                    break
+                if fila is _FIN:
+                    fin = True
+                    break
+                lote.append(fila)
+            self._escribir(lote)
+
+    def _escribir(self, filas):
+        """INSERT de varias filas en una transacción propia; los errores solo se registran"""
+        app = self._app
+        if app is None and has_app_context():
+            app = current_app._get_current_object()
+        if app is None:
+            logger.error(f"Sin aplicación para escribir {len(filas)} filas de log_actividad")
+            return
+        try:
+            with app.app_context():
+                with db.engine.begin() as conexion:
+                    conexion.execute(insert(LogActividad.__table__), filas)
+        except Exception as e:
+            logger.error(f"Error escribiendo {len(filas)} filas de log_actividad: {str(e)}")
+
+
+registro_actividad = RegistroActividad()
+
+
+def registrar_actividad(usuario_id, accion, detalles=None, sincrono=False):
+    """Atajo a `registro_actividad.registrar`"""
+    registro_actividad.registrar(usuario_id, accion, detalles, sincrono)
@@ -1,14 +1,93 @@
 from functools import wraps
+from collections import namedtuple
 from flask import request, jsonify, current_app
 import jwt
+import threading
+import time
 from datetime import datetime, timedelta
-from ..models import User, db
+from ..models import User, VersionToken, db
+from .permission_service import puede
+from .activity_log import registrar_actividad
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Vida de los tokens. Es corta porque el rol y el estado de la cuenta viajan en el token
+TOKEN_TTL = 15 * 60
+# Cada cuántos segundos se consultan las versiones de token que cambiaron
+REFRESCO_REVOCACIONES = 5
+# Solape al pedir cambios recientes (transacciones que tardaron en confirmarse)
+MARGEN_REVOCACIONES = timedelta(seconds=60)
+
+# Usuario reconstruido desde los claims del token, sin consultar la base de datos
+UsuarioToken = namedtuple('UsuarioToken', ['id', 'rol', 'estado_cuenta'])
+
+
+class CacheRevocaciones:
+    """Versión de token vigente por usuario, en memoria del proceso.
+
+    Se refresca como mucho cada `refresco` segundos leyendo solo las filas de
+    version_token que cambiaron desde la última lectura; entre refrescos
+    validar un token no consulta la base de datos. Una suspensión o cambio de
+    rol invalida los tokens emitidos en, como mucho, `refresco` segundos.
+    """
+
+    def __init__(self, refresco=REFRESCO_REVOCACIONES):
+        self.refresco = refresco
+        self._versiones = {}
+        self._desde = None
+        self._proximo = 0.0
+        self._lock = threading.Lock()
+
+    def version(self, usuario_id):
+        self._refrescar()
+        return self._versiones.get(usuario_id, 0)
+
+    def revocado(self, usuario_id, version):
+        return version < self.version(usuario_id)
+
+    def invalidar(self):
+        """Forzar la lectura en la próxima consulta"""
+        self._proximo = 0.0
+
+    def _refrescar(self):
+        if time.monotonic() < self._proximo:
+            return
+        with self._lock:
+            if time.monotonic() < self._proximo:
+                return
+            query = db.session.query(VersionToken.usuario_id, VersionToken.version, VersionToken.fecha_actualizacion)
+            if self._desde is not None:
+                query = query.filter(VersionToken.fecha_actualizacion >= self._desde - MARGEN_REVOCACIONES)
+            for usuario_id, version, fecha in query:
+                self._versiones[usuario_id] = max(version, self._versiones.get(usuario_id, 0))
+                if self._desde is None or fecha > self._desde:
+                    self._desde = fecha
+            self._proximo = time.monotonic() + self.refresco
+
+
+revocaciones = CacheRevocaciones()
+
+
+def _usuario_desde_token(data):
+    """
+    Usuario autenticado por un token ya decodificado
+
+    Los tokens con versión ('ver') se resuelven desde sus claims; los emitidos
+    antes de incluir rol y estado se resuelven con la base de datos.
+
+    Returns:
+        UsuarioToken o User; None si el token fue revocado o el usuario no existe
+    """
+    if 'ver' not in data:
+        return User.query.get(data['user_id'])
+    if revocaciones.revocado(data['user_id'], data['ver']):
+        return None
+    return UsuarioToken(data['user_id'], data.get('rol'), data.get('estado_cuenta'))
+
+
 def token_required(f):
-    """Decorador para verificar token JWT"""
+    """Decorador para verificar token JWT (sin consultar la base de datos en el caso normal)"""
     @wraps(f)
     def decorated(*args, **kwargs):
         token = None
@@ -37,12 +116,12 @@ def token_required(f):
                 raise ValueError("SECRET_KEY no configurada")
             
             data = jwt.decode(token, secret_key, algorithms=["HS256"])
-            current_user = User.query.get(data['user_id'])
+            current_user = _usuario_desde_token(data)
             
             if not current_user:
                 return jsonify({
                     'success': False,
-                    'error': 'Usuario no encontrado'
+                    'error': 'Token revocado' if 'ver' in data else 'Usuario no encontrado'
                 }), 401
             
             if current_user.estado_cuenta != 'activa':
@@ -114,15 +193,32 @@ def student_required(f):
     
     return decorated
 
-def generate_token(user_id, expires_in=24*60*60):  # 24 horas por defecto
-    """Generar token JWT"""
+def generate_token(user_id, expires_in=TOKEN_TTL):
+    """Generar token JWT con el rol, el estado de la cuenta y la versión de token vigentes"""
     try:
         secret_key = current_app.config.get('SECRET_KEY')
         if not secret_key:
             raise ValueError("SECRET_KEY no configurada")
         
+        user = (
+            db.session.query(User.id, User.rol, User.estado_cuenta)
+            .filter(User.id == user_id)
+            .first()
+        )
+        if not user:
+            raise ValueError("Usuario no encontrado")
+        # Se lee de la base (no de la caché) para no emitir un token ya revocado
+        version = (
+            db.session.query(VersionToken.version)
+            .filter(VersionToken.usuario_id == user_id)
+            .scalar()
+        ) or 0
+        
         payload = {
-            'user_id': user_id,
+            'user_id': user.id,
+            'rol': user.rol,
+            'estado_cuenta': user.estado_cuenta,
+            'ver': version,
             'exp': datetime.utcnow() + timedelta(seconds=expires_in),
             'iat': datetime.utcnow()
         }
@@ -134,14 +230,14 @@ def generate_token(user_id, expires_in=24*60*60):  # 24 horas por defecto
         return None
 
 def verify_token(token):
-    """Verificar token JWT y retornar datos del usuario"""
+    """Verificar token JWT y retornar el usuario (UsuarioToken, o User para tokens antiguos)"""
     try:
         secret_key = current_app.config.get('SECRET_KEY')
         if not secret_key:
             raise ValueError("SECRET_KEY no configurada")
         
         data = jwt.decode(token, secret_key, algorithms=["HS256"])
-        user = User.query.get(data['user_id'])
+        user = _usuario_desde_token(data)
         
         if not user or user.estado_cuenta != 'activa':
             return None
@@ -181,7 +277,7 @@ def refresh_token(current_user):
             return {
                 'success': True,
                 'token': new_token,
-                'expires_in': 24*60*60  # 24 horas
+                'expires_in': TOKEN_TTL
             }
         else:
             return {
@@ -195,20 +291,12 @@ def refresh_token(current_user):
             'error': 'Error al renovar token'
         }
 
-def log_user_activity(user_id, activity_type, description, ip_address=None):
-    """Registrar actividad del usuario"""
+def log_user_activity(user_id, activity_type, description, ip_address=None, sincrono=False):
+    """Registrar actividad del usuario (en lote, salvo sincrono=True; ver activity_log)"""
     try:
-        from ..models import LogActividad
-        
-        log_entry = LogActividad(
-            usuario_id=user_id,
-            accion=activity_type,
-            detalles=description,
-            fecha=datetime.utcnow()
-        )
-        
-        db.session.add(log_entry)
-        db.session.commit()
+        registrar_actividad(user_id, activity_type, description, sincrono=sincrono)
+        if sincrono:
+            db.session.commit()
         
         return True
     except Exception as e:
@@ -216,72 +304,13 @@ def log_user_activity(user_id, activity_type, description, ip_address=None):
         return False
 
 def check_permission(user, resource_type, resource_id=None, action='read'):
-    """Verificar permisos del usuario sobre un recurso"""
+    """Verificar permisos del usuario sobre un recurso
+
+    La propiedad se resuelve con una consulta con JOIN y se guarda en caché
+    (ver permission_service.permitidos para las reglas y la invalidación).
+    """
     try:
-        # Administradores tienen todos los permisos
-        if user.rol == 'admin':
-            return True
-        
-        # Instructores pueden gestionar sus propios recursos
-        if user.rol == 'instructor':
-            if resource_type == 'curso':
-                from ..models import Curso
-                curso = Curso.query.get(resource_id)
-                return curso and curso.instructor_id == user.id
-            
-            elif resource_type == 'modulo':
-                from ..models import Modulo, Curso
-                modulo = Modulo.query.get(resource_id)
-                if modulo:
-                    curso = Curso.query.get(modulo.curso_id)
-                    return curso and curso.instructor_id == user.id
-                return False
-            
-            elif resource_type == 'recurso':
-                from ..models import Recurso
-                recurso = Recurso.query.get(resource_id)
-                return recurso and recurso.subido_por == user.id
-            
-            elif resource_type == 'leccion':
-                from ..models import Leccion, Modulo, Curso
-                leccion = Leccion.query.get(resource_id)
-                if leccion:
-                    modulo = Modulo.query.get(leccion.modulo_id)
-                    if modulo:
-                        curso = Curso.query.get(modulo.curso_id)
-                        return curso and curso.instructor_id == user.id
-                return False
-        
-        # Estudiantes tienen permisos limitados
-        elif user.rol == 'estudiante':
-            if action == 'read':
-                # Pueden leer contenido público o contenido de cursos en los que estén inscritos
-                if resource_type == 'curso':
-                    from ..models import Inscripcion
-                    inscripcion = Inscripcion.query.filter_by(
-                        curso_id=resource_id,
-                        estudiante_id=user.id
-                    ).first()
-                    return inscripcion is not None
-                
-                elif resource_type == 'recurso':
-                    from ..models import Recurso
-                    recurso = Recurso.query.get(resource_id)
-                    if recurso and recurso.acceso_publico:
-                        return True
-                    
-                    # Verificar si el recurso pertenece a un curso en el que esté inscrito
-                    if recurso and recurso.curso_id:
-                        from ..models import Inscripcion
-                        inscripcion = Inscripcion.query.filter_by(
-                            curso_id=recurso.curso_id,
-                            estudiante_id=user.id
-                        ).first()
-                        return inscripcion is not None
-                    
-                    return False
-        
-        return False
+        return puede(user, resource_type, resource_id, action)
         
     except Exception as e:
         logger.error(f"Error checking permission: {str(e)}")
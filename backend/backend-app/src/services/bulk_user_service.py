@@ -0,0 +1,154 @@
+from datetime import datetime
+from sqlalchemy import Integer, and_, any_, bindparam, insert, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from src.models import db, User, Notificacion, LogActividad, CupoOcupacion, VersionToken
+
+FASES_VALIDAS = ['inscripcion', 'formacion', 'entrega_activos']
+
+MENSAJES_FASE = {
+    'inscripcion': 'Tu emprendimiento ha pasado a la fase de Inscripción y Selección',
+    'formacion': 'Tu emprendimiento ha pasado a la fase de Formación',
+    'entrega_activos': 'Tu emprendimiento ha pasado a la fase de Entrega de Activos Productivos'
+}
+
+# Filtros aceptados para seleccionar usuarios sin enumerar sus IDs
+FILTROS_SELECCION = ('estado_cuenta', 'rol', 'fase_actual', 'convocatoria', 'municipio', 'estado_control')
+
+
+class SeleccionInvalida(ValueError):
+    """La selección de usuarios está vacía o usa filtros desconocidos"""
+
+
+def condicion_seleccion(user_ids=None, filtros=None):
+    """
+    WHERE para una selección de usuarios: lista de IDs o filtros por columna
+
+    Con filtros nunca se incluyen administradores.
+
+    Raises:
+        SeleccionInvalida: sin IDs ni filtros, o con un filtro no permitido
+    """
+    if user_ids:
+        return _id_en(int(user_id) for user_id in user_ids)
+    if filtros:
+        desconocidos = set(filtros) - set(FILTROS_SELECCION)
+        if desconocidos:
+            raise SeleccionInvalida(f"Filtros no válidos: {', '.join(sorted(desconocidos))}")
+        condiciones = [getattr(User, campo) == valor for campo, valor in filtros.items()]
+        return and_(User.rol != 'admin', *condiciones)
+    raise SeleccionInvalida('No se proporcionaron IDs de usuarios ni filtros')
+
+
+def _id_en(ids):
+    """User.id = ANY(:ids) con un solo parámetro array en PostgreSQL"""
+    columna = User.__table__.c.id
+    if db.engine.dialect.name == 'postgresql':
+        return columna == any_(bindparam('ids', list(ids), type_=ARRAY(Integer)))
+    return columna.in_(list(ids))
+
+
+def _bloquear(condicion, *columnas):
+    """Bloquear las filas seleccionadas (en orden de id) y devolver sus valores actuales"""
+    return db.session.execute(
+        select(User.id, *columnas).where(condicion).order_by(User.id).with_for_update()
+    ).all()
+
+
+def actualizar_cuentas(condicion, estado_cuenta=None, rol=None, admin_id=None):
+    """
+    Cambiar estado_cuenta y/o rol de una selección con un único UPDATE
+
+    Mantiene en la misma transacción lo que el ORM haría fila por fila:
+    contadores de cupo_ocupacion, versión de tokens y una fila de log por
+    usuario (INSERT de varias filas). No hace commit.
+
+    Returns:
+        int: Usuarios actualizados
+    """
+    filas = _bloquear(condicion, User.convocatoria, User.municipio, User.estado_cuenta, User.rol)
+    if not filas:
+        return 0
+    ids = [fila.id for fila in filas]
+
+    valores = {'fecha_actualizacion': datetime.utcnow()}
+    if estado_cuenta is not None:
+        valores['estado_cuenta'] = estado_cuenta
+    if rol is not None:
+        valores['rol'] = rol
+    db.session.execute(update(User.__table__).where(_id_en(ids)).values(**valores))
+
+    conexion = db.session.connection()
+    if estado_cuenta is not None:
+        CupoOcupacion.aplicar_cambios(conexion, [
+            ((fila.convocatoria, fila.municipio, fila.estado_cuenta),
+             (fila.convocatoria, fila.municipio, estado_cuenta))
+            for fila in filas
+        ])
+    cambiados = [
+        fila.id for fila in filas
+        if (estado_cuenta is not None and fila.estado_cuenta != estado_cuenta)
+        or (rol is not None and fila.rol != rol)
+    ]
+    VersionToken.incrementar(conexion, cambiados)
+
+    cambios = ', '.join(f'{campo}={valor}' for campo, valor in (('estado_cuenta', estado_cuenta), ('rol', rol)) if valor is not None)
+    fecha = datetime.utcnow()
+    db.session.execute(insert(LogActividad.__table__), [
+        {
+            'usuario_id': fila.id,
+            'accion': 'actualizacion_masiva_usuarios',
+            'detalles': f'Administrador {admin_id} aplicó {cambios}',
+            'fecha': fecha
+        }
+        for fila in filas
+    ])
+    return len(ids)
+
+
+def cambiar_fase(condicion, nueva_fase, accion='cambio_fase_admin',
+                 detalle='Administrador cambió fase de {anterior} a {nueva}'):
+    """
+    Mover una selección de usuarios a `nueva_fase` con un único UPDATE
+
+    Las notificaciones y los logs de todos los usuarios se insertan con un
+    INSERT de varias filas cada uno. No hace commit.
+
+    Args:
+        condicion: WHERE de la selección (ver `condicion_seleccion`)
+        nueva_fase: Una de FASES_VALIDAS
+        accion: Acción que se registra en log_actividad
+        detalle: Plantilla del detalle con {anterior} y {nueva}
+
+    Returns:
+        tuple: (usuarios actualizados, fecha_entrada_fase)
+    """
+    if nueva_fase not in FASES_VALIDAS:
+        raise ValueError('Fase no válida')
+
+    filas = _bloquear(condicion, User.fase_actual)
+    fecha = datetime.utcnow()
+    if not filas:
+        return 0, fecha
+    ids = [fila.id for fila in filas]
+
+    db.session.execute(
+        update(User.__table__)
+        .where(_id_en(ids))
+        .values(fase_actual=nueva_fase, fecha_entrada_fase=fecha, fase_completada=False, fecha_actualizacion=fecha)
+    )
+
+    mensaje = MENSAJES_FASE.get(nueva_fase, f'Tu emprendimiento ha pasado a la fase: {nueva_fase}')
+    db.session.execute(insert(Notificacion.__table__), [
+        {'user_id': user_id, 'mensaje': mensaje, 'fase_nueva': nueva_fase, 'fecha': fecha, 'leida': False}
+        for user_id in ids
+    ])
+    db.session.execute(insert(LogActividad.__table__), [
+        {
+            'usuario_id': fila.id,
+            'accion': accion,
+            'detalles': detalle.format(anterior=fila.fase_actual or 'inscripcion', nueva=nueva_fase),
+            'fecha': fecha
+        }
+        for fila in filas
+    ])
+    return len(ids), fecha
@@ -0,0 +1,136 @@
+from sqlalchemy import func
+from src.models import db, User, Modulo, Leccion, Recurso, Inscripcion
+
+
+class ArbolCursos:
+    """Módulos, lecciones y recursos de un conjunto de cursos, cargados por lotes.
+
+    Los modelos no declaran relaciones entre sí, así que en lugar de
+    `selectinload` se usa una consulta `IN` por nivel: el costo no depende
+    del número de cursos ni de módulos.
+    """
+
+    def __init__(self, modulos, lecciones=None, conteo_lecciones=None, conteo_recursos=None):
+        self._modulos = modulos
+        self._lecciones = lecciones
+        self._conteo_lecciones = conteo_lecciones or {}
+        self._conteo_recursos = conteo_recursos or {}
+
+    def modulos(self, curso_id):
+        """Módulos de un curso ordenados por `orden`"""
+        return self._modulos.get(curso_id, [])
+
+    def todos_los_modulos(self):
+        """Todos los módulos cargados, agrupados por curso"""
+        return [modulo for lista in self._modulos.values() for modulo in lista]
+
+    def lecciones(self, modulo_id):
+        """Lecciones de un módulo ordenadas por `orden` (requiere cargar_lecciones=True)"""
+        if self._lecciones is None:
+            raise ValueError('El árbol se cargó sin lecciones')
+        return self._lecciones.get(modulo_id, [])
+
+    def total_lecciones(self, modulo_id):
+        if self._lecciones is not None:
+            return len(self._lecciones.get(modulo_id, []))
+        return self._conteo_lecciones.get(modulo_id, 0)
+
+    def total_recursos(self, modulo_id):
+        return self._conteo_recursos.get(modulo_id, 0)
+
+    def total_lecciones_curso(self, curso_id):
+        return sum(self.total_lecciones(modulo.id) for modulo in self.modulos(curso_id))
+
+
+def cargar_arbol(curso_ids, cargar_lecciones=False, contar_recursos=False):
+    """
+    Cargar el árbol curso → módulos → lecciones (→ recursos) en 2 o 3 consultas
+
+    Args:
+        curso_ids: IDs de los cursos
+        cargar_lecciones: True para traer las lecciones completas; si no, solo se cuentan
+        contar_recursos: True para contar también los recursos de cada módulo
+
+    Returns:
+        ArbolCursos: Árbol indexado por curso y módulo
+    """
+    curso_ids = list(set(curso_ids))
+    if not curso_ids:
+        return ArbolCursos({})
+
+    modulos = {}
+    for modulo in (
+        Modulo.query
+        .filter(Modulo.curso_id.in_(curso_ids))
+        .order_by(Modulo.curso_id, Modulo.orden, Modulo.id)
+    ):
+        modulos.setdefault(modulo.curso_id, []).append(modulo)
+
+    modulo_ids = [modulo.id for lista in modulos.values() for modulo in lista]
+    if not modulo_ids:
+        return ArbolCursos(modulos, {} if cargar_lecciones else None)
+
+    lecciones = None
+    conteo_lecciones = None
+    if cargar_lecciones:
+        lecciones = {}
+        for leccion in (
+            Leccion.query
+            .filter(Leccion.modulo_id.in_(modulo_ids))
+            .order_by(Leccion.modulo_id, Leccion.orden, Leccion.id)
+        ):
+            lecciones.setdefault(leccion.modulo_id, []).append(leccion)
+    else:
+        conteo_lecciones = contar_por(Leccion.modulo_id, modulo_ids)
+
+    conteo_recursos = contar_por(Recurso.modulo_id, modulo_ids) if contar_recursos else None
+
+    return ArbolCursos(modulos, lecciones, conteo_lecciones, conteo_recursos)
+
+
+def contar_por(columna, ids):
+    """
+    Contar filas agrupadas por una columna de clave foránea, en una sola consulta
+
+    Args:
+        columna: Columna por la que se agrupa (ej: Leccion.modulo_id)
+        ids: Valores a contar
+
+    Returns:
+        dict: {id: total} (los ids sin filas no aparecen)
+    """
+    ids = list(set(ids))
+    if not ids:
+        return {}
+    return dict(
+        db.session.query(columna, func.count())
+        .filter(columna.in_(ids))
+        .group_by(columna)
+        .all()
+    )
+
+
+def contar_inscripciones(curso_ids):
+    """Número de inscripciones por curso: {curso_id: total}"""
+    return contar_por(Inscripcion.curso_id, curso_ids)
+
+
+def resumen_instructores(instructor_ids):
+    """
+    Nombre y apellido de varios instructores en una sola consulta `IN`
+
+    Solo se leen columnas ligeras; nunca se cargan los documentos del usuario.
+
+    Args:
+        instructor_ids: IDs de usuario (se ignoran los None)
+
+    Returns:
+        dict: {id: {'id', 'nombre', 'apellido', 'email'}}
+    """
+    ids = list({instructor_id for instructor_id in instructor_ids if instructor_id is not None})
+    if not ids:
+        return {}
+    return {
+        fila.id: {'id': fila.id, 'nombre': fila.nombre, 'apellido': fila.apellido, 'email': fila.email}
+        for fila in db.session.query(User.id, User.nombre, User.apellido, User.email).filter(User.id.in_(ids))
+    }
@@ -0,0 +1,177 @@
+import math
+import mimetypes
+import os
+from datetime import datetime, timedelta
+import jwt
+from flask import current_app
+from botocore.exceptions import ClientError
+from src.services.s3_service import s3_service
+from src.services.storage_backend import obtener_almacenamiento
+
+# Vigencia de las credenciales de subida (y del token para confirmarla)
+VIGENCIA_CARGA = 3600
+# A partir de este tamaño se usa subida multiparte en lugar de un POST
+UMBRAL_MULTIPARTE = 100 * 1024 * 1024
+# Tamaño de cada parte (S3 exige al menos 5 MB salvo en la última)
+TAMANO_PARTE = 16 * 1024 * 1024
+# S3 admite como máximo 10.000 partes por objeto
+MAX_PARTES = 10000
+
+
+class CargaInvalida(ValueError):
+    """La solicitud o la confirmación de una subida directa no es válida"""
+
+
+def iniciar_carga(user_id, nombre_archivo, tamano, content_type=None, carpeta='uploads', tamano_maximo=None):
+    """
+    Credenciales para que el cliente suba el archivo directamente al bucket
+
+    El servidor no recibe los bytes: devuelve un POST firmado (o, para
+    archivos grandes, URLs firmadas por parte de una subida multiparte) y un
+    token que el cliente envía al confirmar con `confirmar_carga`.
+
+    Args:
+        user_id: Usuario que sube el archivo
+        nombre_archivo: Nombre original (define la extensión de la clave)
+        tamano: Tamaño declarado en bytes
+        content_type: Tipo de contenido (se deduce del nombre si falta)
+        carpeta: Prefijo de la clave en el bucket
+        tamano_maximo: Límite en bytes (se verifica otra vez al confirmar)
+
+    Returns:
+        dict: token, s3_key, metodo ('post' o 'multiparte') y sus datos
+
+    Raises:
+        CargaInvalida: tamaño no válido o por encima del límite
+    """
+    _exigir_subida_directa()
+    if not isinstance(tamano, int) or tamano <= 0:
+        raise CargaInvalida('Tamaño de archivo no válido')
+    if tamano_maximo is not None and tamano > tamano_maximo:
+        raise CargaInvalida(f'Archivo demasiado grande. Máximo: {tamano_maximo // (1024 * 1024)}MB')
+
+    content_type = content_type or mimetypes.guess_type(nombre_archivo)[0] or 'application/octet-stream'
+    s3_key = s3_service.generate_s3_key(nombre_archivo, folder=carpeta)
+    limite = tamano_maximo or tamano
+    claims = {
+        'typ': 'carga',
+        'key': s3_key,
+        'user_id': user_id,
+        'nombre': nombre_archivo,
+        'ct': content_type,
+        'max': limite
+    }
+
+    if tamano <= UMBRAL_MULTIPARTE:
+        respuesta = {
+            'metodo': 'post',
+            'post': s3_service.presigned_post(s3_key, content_type, limite, expires_in=VIGENCIA_CARGA)
+        }
+    else:
+        tamano_parte = max(TAMANO_PARTE, math.ceil(tamano / MAX_PARTES))
+        partes = math.ceil(tamano / tamano_parte)
+        upload_id = s3_service.create_multipart_upload(s3_key, content_type)
+        claims['upload_id'] = upload_id
+        try:
+            respuesta = {
+                'metodo': 'multiparte',
+                'tamano_parte': tamano_parte,
+                'partes': s3_service.presigned_part_urls(s3_key, upload_id, partes, expires_in=VIGENCIA_CARGA)
+            }
+        except Exception:
+            s3_service.abort_multipart_upload(s3_key, upload_id)
+            raise
+
+    respuesta.update({
+        'token': _firmar(claims),
+        's3_key': s3_key,
+        'content_type': content_type,
+        'expira_en': VIGENCIA_CARGA
+    })
+    return respuesta
+
+
+def confirmar_carga(token, user_id, partes=None):
+    """
+    Verificar en el bucket una subida directa terminada
+
+    Para subidas multiparte primero se completa el objeto con las partes
+    (número y ETag) que reporta el cliente; si S3 lo rechaza, la subida se
+    cancela para liberar las partes y el cliente debe iniciarla de nuevo.
+    Las subidas que nunca se confirman las elimina la regla de ciclo de vida
+    AbortIncompleteMultipartUpload del bucket (ver RESOURCES_README.md).
+    Después `head_object` confirma que
+    existe y que no supera el límite; si lo supera se elimina. Quien crea el
+    Recurso registra el objeto en el inventario (storage_inventory).
+
+    Returns:
+        dict: s3_key, s3_url, s3_bucket, nombre_original, extension,
+        tamano_bytes y mime_type, listos para crear el Recurso
+
+    Raises:
+        CargaInvalida: token no válido, de otro usuario, o archivo ausente
+    """
+    _exigir_subida_directa()
+    claims = _verificar(token)
+    if claims['user_id'] != user_id:
+        raise CargaInvalida('La subida pertenece a otro usuario')
+    s3_key = claims['key']
+
+    if 'upload_id' in claims:
+        try:
+            pares = [(int(parte['numero']), str(parte['etag'])) for parte in partes or []]
+        except (KeyError, TypeError, ValueError):
+            raise CargaInvalida('Partes no válidas: se espera [{numero, etag}]')
+        if not pares:
+            raise CargaInvalida('Faltan las partes de la subida multiparte')
+        try:
+            s3_service.complete_multipart_upload(s3_key, claims['upload_id'], pares)
+        except ClientError as e:
+            codigo = e.response['Error']['Code']
+            if codigo != 'NoSuchUpload':
+                # Partes rechazadas: liberarlas en lugar de dejarlas facturándose
+                s3_service.abort_multipart_upload(s3_key, claims['upload_id'])
+                raise CargaInvalida(f'No se pudo completar la subida: {codigo}')
+            # La subida ya pudo completarse en un intento anterior
+            if not s3_service.file_exists(s3_key):
+                raise CargaInvalida(f'No se pudo completar la subida: {codigo}')
+
+    info = s3_service.get_file_info(s3_key)
+    if info is None:
+        raise CargaInvalida('El archivo no se ha subido al almacenamiento')
+    if info['size'] > claims['max']:
+        # Directo al cliente: el objeto nunca entró al inventario
+        s3_service.s3_client.delete_object(Bucket=s3_service.bucket_name, Key=s3_key)
+        raise CargaInvalida('El archivo subido supera el tamaño permitido')
+
+    return {
+        's3_key': s3_key,
+        's3_url': s3_service.get_public_url(s3_key),
+        's3_bucket': s3_service.bucket_name,
+        'nombre_original': claims['nombre'],
+        'extension': os.path.splitext(claims['nombre'])[1],
+        'tamano_bytes': info['size'],
+        'mime_type': info['content_type'] or claims['ct']
+    }
+
+
+def _exigir_subida_directa():
+    if not obtener_almacenamiento().subida_directa:
+        raise CargaInvalida('La subida directa no está disponible con este almacenamiento; suba el archivo al servidor')
+
+
+def _firmar(claims):
+    datos = dict(claims, exp=datetime.utcnow() + timedelta(seconds=VIGENCIA_CARGA))
+    return jwt.encode(datos, current_app.config['SECRET_KEY'], algorithm='HS256')
+
+
+def _verificar(token):
+    try:
+        claims = jwt.decode(token or '', current_app.config['SECRET_KEY'], algorithms=['HS256'])
+    except jwt.ExpiredSignatureError:
+        raise CargaInvalida('La subida expiró; solicítela de nuevo')
+    except jwt.InvalidTokenError:
+        raise CargaInvalida('Token de subida no válido')
+    if claims.get('typ') != 'carga':
+        raise CargaInvalida('Token de subida no válido')
+    return claims
@@ -0,0 +1,138 @@
+import mimetypes
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from src.models import db, User, DocumentoContenido, DocumentoUsuario
+from src.constants.documentos import DOCUMENTOS_USUARIO
+
+class DocumentStore:
+    """Almacén de documentos de usuario direccionado por contenido (SHA-256).
+
+    Los bytes viven en `documento_contenido` (una fila por hash distinto) y
+    `documento_usuario` enlaza cada (user_id, doc_type) con su contenido.
+    Ningún método hace commit: la transacción pertenece a quien llama.
+    """
+
+    def guardar(self, user_id, doc_type, contenido, nombre=None, mime_type=None):
+        """
+        Guardar (o reemplazar) un documento de usuario
+
+        Args:
+            user_id: ID del usuario propietario
+            doc_type: Tipo de documento (clave de DOCUMENTOS_USUARIO)
+            contenido: Bytes del archivo
+            nombre: Nombre original del archivo (opcional)
+            mime_type: Tipo MIME (opcional, se deduce del nombre)
+
+        Returns:
+            DocumentoUsuario: Registro creado o actualizado
+        """
+        if doc_type not in DOCUMENTOS_USUARIO:
+            raise ValueError(f'Tipo de documento no válido: {doc_type}')
+
+        sha256 = DocumentoContenido.calcular_hash(contenido)
+        tamano = len(contenido)
+
+        # Deduplicación: si el hash ya existe no se vuelve a escribir
+        db.session.execute(
+            pg_insert(DocumentoContenido.__table__)
+            .values(sha256=sha256, contenido=contenido, tamano_bytes=tamano)
+            .on_conflict_do_nothing(index_elements=['sha256'])
+        )
+
+        if not mime_type and nombre:
+            mime_type, _ = mimetypes.guess_type(nombre)
+
+        documento = DocumentoUsuario.query.filter_by(user_id=user_id, doc_type=doc_type).first()
+        if documento:
+            documento.sha256 = sha256
+            documento.tamano_bytes = tamano
+            documento.nombre = nombre
+            documento.mime_type = mime_type
+        else:
+            documento = DocumentoUsuario(
+                user_id=user_id,
+                doc_type=doc_type,
+                nombre=nombre,
+                sha256=sha256,
+                tamano_bytes=tamano,
+                mime_type=mime_type
+            )
+            db.session.add(documento)
+
+        return documento
+
+    def obtener(self, user_id, doc_type):
+        """Obtener los metadatos de un documento (sin cargar los bytes)"""
+        return DocumentoUsuario.query.filter_by(user_id=user_id, doc_type=doc_type).first()
+
+    def obtener_contenido(self, user_id, doc_type):
+        """
+        Obtener los bytes y el nombre de un documento
+
+        Si el documento aún no fue migrado al almacén se lee la columna
+        histórica de la tabla "user".
+
+        Returns:
+            tuple: (contenido, nombre) o (None, None) si no existe
+        """
+        if doc_type not in DOCUMENTOS_USUARIO:
+            return None, None
+
+        row = (
+            db.session.query(DocumentoContenido.contenido, DocumentoUsuario.nombre)
+            .join(DocumentoUsuario, DocumentoUsuario.sha256 == DocumentoContenido.sha256)
+            .filter(DocumentoUsuario.user_id == user_id, DocumentoUsuario.doc_type == doc_type)
+            .first()
+        )
+        if row:
+            return row[0], row[1]
+
+        legacy = (
+            db.session.query(getattr(User, doc_type), getattr(User, DOCUMENTOS_USUARIO[doc_type]))
+            .filter(User.id == user_id)
+            .first()
+        )
+        if legacy and legacy[0] is not None:
+            return legacy[0], legacy[1]
+        return None, None
+
+    def listar(self, user_id):
+        """Listar los documentos de un usuario (solo metadatos)"""
+        return DocumentoUsuario.query.filter_by(user_id=user_id).order_by(DocumentoUsuario.doc_type).all()
+
+    def tipos_cargados(self, user_ids=None):
+        """
+        Tipos de documento presentes en el almacén por usuario, en una sola consulta
+
+        Args:
+            user_ids: Lista de IDs a consultar (None = todos)
+
+        Returns:
+            dict: {user_id: set(doc_type)}
+        """
+        query = db.session.query(DocumentoUsuario.user_id, DocumentoUsuario.doc_type)
+        if user_ids is not None:
+            query = query.filter(DocumentoUsuario.user_id.in_(list(user_ids)))
+        resultado = {}
+        for user_id, doc_type in query:
+            resultado.setdefault(user_id, set()).add(doc_type)
+        return resultado
+
+    def eliminar(self, user_id, doc_type):
+        """Eliminar el enlace de un documento (el contenido huérfano se purga aparte)"""
+        documento = self.obtener(user_id, doc_type)
+        if documento:
+            db.session.delete(documento)
+            return True
+        return False
+
+    def purgar_huerfanos(self):
+        """Eliminar contenidos que ya no referencia ningún documento"""
+        referenciados = db.session.query(DocumentoUsuario.sha256).distinct()
+        return (
+            DocumentoContenido.query
+            .filter(~DocumentoContenido.sha256.in_(referenciados))
+            .delete(synchronize_session=False)
+        )
+
+# Instancia global del almacén de documentos
+document_store = DocumentStore()
@@ -0,0 +1,200 @@
+import mimetypes
+import unicodedata
+from urllib.parse import quote
+from flask import Response, jsonify, request, stream_with_context  # pyright: ignore[reportMissingImports]
+from sqlalchemy import func
+from werkzeug.http import dump_options_header
+from src.models import db, User, DocumentoUsuario, DocumentoContenido, EvidenciaFuncionamiento
+from src.constants.documentos import DOCUMENTOS_USUARIO
+
+# Tamaño de cada lectura con substring() sobre la columna BYTEA
+CHUNK_SIZE = 256 * 1024
+
+
+def _leer_trozos(columna, condicion, inicio, fin, chunk_size=CHUNK_SIZE):
+    """Leer [inicio, fin) de una columna BYTEA por trozos, una consulta por trozo"""
+    posicion = inicio
+    while posicion < fin:
+        cantidad = min(chunk_size, fin - posicion)
+        # substring() en PostgreSQL usa posiciones desde 1
+        trozo = db.session.query(func.substring(columna, posicion + 1, cantidad)).filter(condicion).scalar()
+        if not trozo:
+            break
+        yield bytes(trozo)
+        posicion += len(trozo)
+
+
+def responder_blob(columna, condicion, tamano, nombre, mime_type, etag, as_attachment=False):
+    """
+    Construir una respuesta en streaming para un BLOB almacenado en la base de datos
+
+    Nunca carga el archivo completo en memoria ni escribe archivos temporales.
+
+    Args:
+        columna: Columna BYTEA a leer
+        condicion: Expresión WHERE que identifica la fila
+        tamano: Tamaño total en bytes
+        nombre: Nombre del archivo para Content-Disposition
+        mime_type: Tipo MIME (se deduce del nombre si es None)
+        etag: ETag fuerte del contenido (sin comillas)
+        as_attachment: True para forzar la descarga
+
+    Returns:
+        Response: Respuesta 200, 206, 304 o 416
+    """
+    return responder_flujo(
+        lambda inicio, fin: _leer_trozos(columna, condicion, inicio, fin),
+        tamano, nombre, mime_type, etag, as_attachment
+    )
+
+
+def responder_flujo(leer, tamano, nombre, mime_type, etag, as_attachment=False, cache_control='private, no-cache'):
+    """
+    Respuesta en streaming para contenido que se lee por intervalos
+
+    Soporta If-None-Match (304), Range de un solo intervalo (206/416) e If-Range.
+
+    Args:
+        leer: Función (inicio, fin) que devuelve un iterable de bytes de [inicio, fin)
+        tamano: Tamaño total en bytes
+        nombre, mime_type, etag, as_attachment: Igual que en responder_blob
+        cache_control: Valor de Cache-Control (por defecto el navegador
+            puede guardar el archivo pero debe revalidarlo con el ETag)
+
+    Returns:
+        Response: Respuesta 200, 206, 304 o 416
+    """
+    if not mime_type:
+        mime_type = mimetypes.guess_type(nombre or '')[0] or 'application/octet-stream'
+
+    if request.if_none_match.contains(etag):
+        respuesta = Response(status=304)
+        respuesta.set_etag(etag)
+        return respuesta
+
+    inicio, fin, status = 0, tamano, 200
+    rango = request.range
+    # Con If-Range solo se respeta el Range si el ETag coincide; varios intervalos se ignoran
+    if rango and len(rango.ranges) == 1 and (request.if_range.etag is None or request.if_range.etag == etag):
+        intervalo = rango.range_for_length(tamano)
+        if intervalo is None:
+            return Response(status=416, headers={'Content-Range': f'bytes */{tamano}'})
+        inicio, fin = intervalo
+        status = 206
+
+    respuesta = Response(
+        stream_with_context(leer(inicio, fin)),
+        status=status,
+        mimetype=mime_type,
+        direct_passthrough=True
+    )
+    respuesta.headers['Content-Length'] = str(fin - inicio)
+    respuesta.headers['Accept-Ranges'] = 'bytes'
+    if status == 206:
+        respuesta.headers['Content-Range'] = f'bytes {inicio}-{fin - 1}/{tamano}'
+    respuesta.set_etag(etag)
+    respuesta.headers['Cache-Control'] = cache_control
+    respuesta.headers['Content-Disposition'] = content_disposition(nombre, as_attachment)
+    return respuesta
+
+
+def content_disposition(nombre, as_attachment=False):
+    """Valor de Content-Disposition con filename/filename* (igual que send_file)"""
+    return dump_options_header(
+        'attachment' if as_attachment else 'inline',
+        _parametros_nombre(nombre or 'documento')
+    )
+
+
+def _parametros_nombre(nombre):
+    """Parámetros filename/filename* para Content-Disposition (igual que send_file)"""
+    try:
+        nombre.encode('ascii')
+        return {'filename': nombre}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', nombre).encode('ascii', 'ignore').decode('ascii')
+        return {'filename': simple, 'filename*': f"UTF-8''{quote(nombre, safe='!#$&+^`|')}"}
+
+
+def responder_documento_usuario(user_id, doc_type, as_attachment=False):
+    """Servir un documento de usuario desde el almacén (o la columna histórica)"""
+    if doc_type not in DOCUMENTOS_USUARIO:
+        return jsonify({'error': 'Tipo de documento no válido'}), 400
+
+    documento = (
+        db.session.query(
+            DocumentoUsuario.sha256,
+            DocumentoUsuario.tamano_bytes,
+            DocumentoUsuario.nombre,
+            DocumentoUsuario.mime_type
+        )
+        .filter(DocumentoUsuario.user_id == user_id, DocumentoUsuario.doc_type == doc_type)
+        .first()
+    )
+    if documento:
+        # El contenido es inmutable: su hash es el ETag
+        return responder_blob(
+            DocumentoContenido.contenido,
+            DocumentoContenido.sha256 == documento.sha256,
+            documento.tamano_bytes,
+            documento.nombre,
+            documento.mime_type,
+            documento.sha256,
+            as_attachment
+        )
+
+    # Documento aún no migrado: leer la columna de "user"
+    columna = getattr(User, doc_type)
+    legacy = (
+        db.session.query(
+            func.length(columna),
+            getattr(User, DOCUMENTOS_USUARIO[doc_type]),
+            User.fecha_actualizacion
+        )
+        .filter(User.id == user_id)
+        .first()
+    )
+    if not legacy or legacy[0] is None:
+        return jsonify({'error': 'Documento no encontrado'}), 404
+
+    tamano, nombre, fecha_actualizacion = legacy
+    marca = int(fecha_actualizacion.timestamp()) if fecha_actualizacion else 0
+    return responder_blob(
+        columna,
+        User.id == user_id,
+        tamano,
+        nombre,
+        None,
+        f'u{user_id}-{doc_type}-{tamano}-{marca}',
+        as_attachment
+    )
+
+
+def responder_archivo_evidencia(evidencia_id, numero, as_attachment=True):
+    """Servir el archivo 1 o 2 de una evidencia de funcionamiento"""
+    if numero not in (1, 2):
+        return jsonify({'error': 'Archivo no encontrado'}), 404
+
+    columna = EvidenciaFuncionamiento.archivo1 if numero == 1 else EvidenciaFuncionamiento.archivo2
+    columna_nombre = EvidenciaFuncionamiento.archivo1_nombre if numero == 1 else EvidenciaFuncionamiento.archivo2_nombre
+    fila = (
+        db.session.query(func.length(columna), columna_nombre, EvidenciaFuncionamiento.fecha_subida)
+        .filter(EvidenciaFuncionamiento.id == evidencia_id)
+        .first()
+    )
+    if not fila:
+        return jsonify({'error': 'Evidencia no encontrada'}), 404
+    if fila[0] is None:
+        return jsonify({'error': 'Archivo no encontrado'}), 404
+
+    tamano, nombre, fecha_subida = fila
+    marca = int(fecha_subida.timestamp()) if fecha_subida else 0
+    return responder_blob(
+        columna,
+        EvidenciaFuncionamiento.id == evidencia_id,
+        tamano,
+        nombre,
+        'application/pdf',
+        f'e{evidencia_id}-{numero}-{tamano}-{marca}',
+        as_attachment
+    )
@@ -0,0 +1,343 @@
+import hashlib
+import json
+import logging
+import tempfile
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam, func, update
+from src.models import (
+    db, User, UsuarioCurso, EvidenciaFuncionamiento, DocumentoUsuario, CuposConfig, MunicipioCupo,
+    CupoOcupacion, Evaluacion, CriterioEvaluacion, PuntajeUsuario, TrabajoExportacion
+)
+from src.services.export_service import (
+    escribir_excel_usuarios, escribir_excel_cupos, escribir_excel_fases, XLSX_MIMETYPE, SPOOL_MAX_MEMORIA
+)
+from src.services.ranking_service import escribir_excel_rankings
+
+logger = logging.getLogger(__name__)
+
+# Un trabajo en_proceso sin terminar tras este tiempo se considera abandonado
+MINUTOS_ABANDONO = 30
+# Reintentos antes de marcar el trabajo como error
+MAX_INTENTOS = 3
+# Días que se conservan los trabajos terminados
+DIAS_RETENCION = 7
+# Tamaño de cada trozo al copiar el archivo generado a la columna BYTEA
+CHUNK_GUARDADO = 8 * 1024 * 1024
+
+TipoExportacion = namedtuple('TipoExportacion', ['generar', 'nombre_archivo', 'huella'])
+
+
+def _resumen(*columnas):
+    """Una fila de agregados (count, max...) como lista serializable"""
+    return list(db.session.query(*columnas).one())
+
+
+def _huella(*partes):
+    return hashlib.sha256(json.dumps(partes, default=str).encode('utf-8')).hexdigest()
+
+
+def huella_usuarios():
+    """Cambia con cualquier alta, baja o edición de usuarios, cursos asignados, evidencias o documentos"""
+    return _huella(
+        _resumen(func.count(User.id), func.max(User.id), func.max(User.fecha_actualizacion)),
+        _resumen(
+            func.count(UsuarioCurso.id), func.max(UsuarioCurso.id),
+            func.count(UsuarioCurso.id).filter(UsuarioCurso.estado == 'completado'),
+            func.max(UsuarioCurso.fecha_ultima_actividad)
+        ),
+        _resumen(
+            func.count(EvidenciaFuncionamiento.id), func.max(EvidenciaFuncionamiento.id),
+            func.max(EvidenciaFuncionamiento.fecha_revision)
+        ),
+        _resumen(func.count(DocumentoUsuario.id), func.max(DocumentoUsuario.fecha_subida))
+    )
+
+
+def huella_fases():
+    return _huella(_resumen(func.count(User.id), func.max(User.id), func.max(User.fecha_actualizacion)))
+
+
+def huella_cupos():
+    # Tablas pequeñas: se toman completas
+    return _huella(
+        db.session.query(CuposConfig.id, CuposConfig.convocatoria, CuposConfig.cupo_global_max)
+        .order_by(CuposConfig.id.desc()).first(),
+        db.session.query(MunicipioCupo.municipio_slug, MunicipioCupo.subregion, MunicipioCupo.cupo_max)
+        .order_by(MunicipioCupo.municipio_slug).all(),
+        db.session.query(CupoOcupacion.convocatoria, CupoOcupacion.municipio_slug,
+                         CupoOcupacion.estado_cuenta, CupoOcupacion.total)
+        .order_by(CupoOcupacion.convocatoria, CupoOcupacion.municipio_slug, CupoOcupacion.estado_cuenta).all()
+    )
+
+
+def huella_rankings():
+    return _huella(
+        _resumen(func.count(PuntajeUsuario.usuario_id), func.max(PuntajeUsuario.fecha_actualizacion)),
+        _resumen(func.count(Evaluacion.id), func.max(Evaluacion.id), func.max(Evaluacion.fecha_evaluacion)),
+        _resumen(func.count(CriterioEvaluacion.id), func.max(CriterioEvaluacion.updated_at)),
+        _resumen(func.count(User.id), func.max(User.fecha_actualizacion))
+    )
+
+
+def _fecha_hoy():
+    return datetime.now().strftime("%Y%m%d")
+
+
+# Reportes que se pueden generar en segundo plano
+TIPOS_EXPORTACION = {
+    'usuarios': TipoExportacion(
+        lambda destino, progreso: escribir_excel_usuarios(destino, progreso=progreso),
+        lambda: 'usuarios_registrados.xlsx',
+        huella_usuarios
+    ),
+    'cupos': TipoExportacion(
+        lambda destino, progreso: escribir_excel_cupos(destino),
+        lambda: 'estado_cupos.xlsx',
+        huella_cupos
+    ),
+    'fases': TipoExportacion(
+        lambda destino, progreso: escribir_excel_fases(destino, progreso=progreso),
+        lambda: f'reporte_fases_{_fecha_hoy()}.xlsx',
+        huella_fases
+    ),
+    'rankings': TipoExportacion(
+        lambda destino, progreso: escribir_excel_rankings(destino),
+        lambda: f'rankings_evaluaciones_{_fecha_hoy()}.xlsx',
+        huella_rankings
+    ),
+}
+
+
+def encolar(tipo, usuario_id=None):
+    """
+    Encolar una exportación, reutilizando un resultado vigente si existe
+
+    Si ya hay un trabajo del mismo tipo sobre los mismos datos (misma huella)
+    pendiente, en proceso o completado, se devuelve ese trabajo.
+
+    Args:
+        tipo: Clave de TIPOS_EXPORTACION
+        usuario_id: Administrador que la solicita
+
+    Returns:
+        tuple: (TrabajoExportacion, reutilizado)
+
+    Raises:
+        ValueError: si el tipo no existe
+    """
+    if tipo not in TIPOS_EXPORTACION:
+        raise ValueError(f'Tipo de exportación no válido: {tipo}')
+
+    huella = TIPOS_EXPORTACION[tipo].huella()
+    existente = (
+        TrabajoExportacion.query
+        .filter(
+            TrabajoExportacion.tipo == tipo,
+            TrabajoExportacion.huella == huella,
+            TrabajoExportacion.estado.in_(('pendiente', 'en_proceso', 'completado'))
+        )
+        .order_by(TrabajoExportacion.id.desc())
+        .first()
+    )
+    if existente:
+        return existente, True
+
+    trabajo = TrabajoExportacion(tipo=tipo, huella=huella, solicitado_por=usuario_id)
+    db.session.add(trabajo)
+    db.session.commit()
+    return trabajo, False
+
+
+def solicitar(tipo, usuario_id=None):
+    """
+    Encolar una exportación y armar la respuesta de los endpoints
+
+    Returns:
+        tuple: (dict con 'trabajo' y 'cache', código HTTP) - 200 si el archivo
+            ya está disponible, 202 si hay que esperar al worker
+    """
+    trabajo, reutilizado = encolar(tipo, usuario_id)
+    respuesta = {
+        'trabajo': trabajo.to_dict(),
+        'cache': reutilizado and trabajo.estado == 'completado'
+    }
+    return respuesta, 200 if trabajo.estado == 'completado' else 202
+
+
+def reclamar_siguiente(worker):
+    """
+    Tomar el trabajo pendiente más antiguo (SELECT ... FOR UPDATE SKIP LOCKED)
+
+    Varios procesos pueden llamar a esta función a la vez sin tomar el mismo trabajo.
+
+    Returns:
+        TrabajoExportacion o None si no hay pendientes
+    """
+    trabajo = (
+        TrabajoExportacion.query
+        .filter_by(estado='pendiente')
+        .order_by(TrabajoExportacion.id)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if not trabajo:
+        db.session.rollback()
+        return None
+
+    trabajo.estado = 'en_proceso'
+    trabajo.worker = worker
+    trabajo.intentos += 1
+    trabajo.progreso = 0
+    trabajo.mensaje = None
+    trabajo.fecha_inicio = datetime.utcnow()
+    # El archivo reflejará los datos al momento de empezar
+    trabajo.huella = TIPOS_EXPORTACION[trabajo.tipo].huella()
+    db.session.commit()
+    return trabajo
+
+
+def _reportar_progreso(trabajo_id):
+    """Función progreso(porcentaje) que escribe en una conexión aparte (sin tocar la sesión)"""
+    ultimo = [-1]
+
+    def progreso(porcentaje):
+        porcentaje = max(0, min(100, int(porcentaje)))
+        if porcentaje == ultimo[0]:
+            return
+        ultimo[0] = porcentaje
+        with db.engine.begin() as conexion:
+            conexion.execute(
+                update(TrabajoExportacion.__table__)
+                .where(TrabajoExportacion.__table__.c.id == trabajo_id)
+                .values(progreso=porcentaje)
+            )
+
+    return progreso
+
+
+def _guardar_archivo(trabajo_id, archivo):
+    """
+    Copiar el archivo generado a trabajo_exportacion.archivo por trozos
+
+    Cada trozo se concatena (archivo || trozo) dentro de la transacción del
+    trabajo, así que en memoria solo hay un trozo a la vez. PostgreSQL
+    reescribe el valor en cada concatenación; con trozos de CHUNK_GUARDADO
+    son pocas escrituras para exportaciones de decenas de MB.
+
+    Returns:
+        int: Tamaño guardado en bytes
+    """
+    tabla = TrabajoExportacion.__table__
+    fila = tabla.c.id == trabajo_id
+    conexion = db.session.connection()
+    conexion.execute(update(tabla).where(fila).values(archivo=b''))
+    # Una sola sentencia; cada trozo viaja como parámetro y se libera al
+    # terminar su UPDATE (no queda referenciado por sentencias compiladas)
+    anexar = update(tabla).where(fila).values(
+        archivo=tabla.c.archivo.concat(bindparam('trozo', type_=db.LargeBinary))
+    )
+    tamano = 0
+    for trozo in iter(lambda: archivo.read(CHUNK_GUARDADO), b''):
+        conexion.execute(anexar, {'trozo': trozo})
+        tamano += len(trozo)
+    return tamano
+
+
+def ejecutar(trabajo):
+    """
+    Generar el archivo de un trabajo ya reclamado y guardarlo
+
+    Ante un error el trabajo vuelve a quedar pendiente hasta MAX_INTENTOS.
+
+    Returns:
+        bool: True si el trabajo terminó correctamente
+    """
+    trabajo_id = trabajo.id
+    tipo = TIPOS_EXPORTACION[trabajo.tipo]
+    archivo = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORIA)
+    try:
+        tipo.generar(archivo, _reportar_progreso(trabajo_id))
+        archivo.seek(0)
+
+        trabajo.tamano_bytes = _guardar_archivo(trabajo_id, archivo)
+        trabajo.nombre_archivo = tipo.nombre_archivo()
+        trabajo.mime_type = XLSX_MIMETYPE
+        trabajo.estado = 'completado'
+        trabajo.progreso = 100
+        trabajo.fecha_fin = datetime.utcnow()
+
+        # Los resultados anteriores del mismo tipo quedan obsoletos
+        TrabajoExportacion.query.filter(
+            TrabajoExportacion.tipo == trabajo.tipo,
+            TrabajoExportacion.estado == 'completado',
+            TrabajoExportacion.id < trabajo_id
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        return True
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error en exportación {trabajo_id}: {str(e)}")
+        trabajo = TrabajoExportacion.query.get(trabajo_id)
+        if trabajo:
+            trabajo.estado = 'pendiente' if trabajo.intentos < MAX_INTENTOS else 'error'
+            trabajo.mensaje = str(e)
+            trabajo.fecha_fin = datetime.utcnow()
+            db.session.commit()
+        return False
+    finally:
+        archivo.close()
+
+
+def procesar_siguiente(worker):
+    """Reclamar y ejecutar un trabajo. Devuelve False si la cola estaba vacía"""
+    trabajo = reclamar_siguiente(worker)
+    if not trabajo:
+        return False
+    ejecutar(trabajo)
+    return True
+
+
+def recuperar_abandonados(minutos=MINUTOS_ABANDONO):
+    """
+    Recuperar los trabajos en_proceso de workers que murieron
+
+    Los que ya agotaron MAX_INTENTOS pasan a error (un reporte que tumba al
+    worker no se reintenta para siempre); el resto vuelve a la cola.
+
+    Returns:
+        int: Trabajos recuperados (reencolados + marcados como error)
+    """
+    limite = datetime.utcnow() - timedelta(minutes=minutos)
+    abandonados = TrabajoExportacion.query.filter(
+        TrabajoExportacion.estado == 'en_proceso',
+        TrabajoExportacion.fecha_inicio < limite
+    )
+    fallidos = (
+        abandonados
+        .filter(TrabajoExportacion.intentos >= MAX_INTENTOS)
+        .update({
+            'estado': 'error',
+            'mensaje': f'Trabajo abandonado tras {MAX_INTENTOS} intentos',
+            'fecha_fin': datetime.utcnow()
+        }, synchronize_session=False)
+    )
+    reencolados = (
+        abandonados
+        .filter(TrabajoExportacion.intentos < MAX_INTENTOS)
+        .update({'estado': 'pendiente', 'mensaje': 'Trabajo abandonado; reencolado'}, synchronize_session=False)
+    )
+    db.session.commit()
+    return fallidos + reencolados
+
+
+def purgar(dias=DIAS_RETENCION):
+    """Eliminar trabajos terminados (completados o con error) más antiguos que `dias`"""
+    limite = datetime.utcnow() - timedelta(days=dias)
+    filas = (
+        TrabajoExportacion.query
+        .filter(TrabajoExportacion.estado.in_(('completado', 'error')), TrabajoExportacion.fecha_creacion < limite)
+        .delete(synchronize_session=False)
+    )
+    db.session.commit()
+    return filas
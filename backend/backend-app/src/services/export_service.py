@@ -0,0 +1,451 @@
+from itertools import islice
+from sqlalchemy import func
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from openpyxl.utils import get_column_letter
+from src.models import db, User, Curso, UsuarioCurso, EvidenciaFuncionamiento, CuposConfig, MunicipioCupo, CupoOcupacion
+
+# Usuarios por lote: memoria acotada sin importar el tamaño de la convocatoria
+TAMANO_LOTE = 500
+# Por encima de este tamaño el archivo generado se vuelca a disco
+SPOOL_MAX_MEMORIA = 8 * 1024 * 1024
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Estilos para el encabezado
+HEADER_FONT = Font(bold=True, color="FFFFFF")
+HEADER_FILL = PatternFill(start_color="2E75B6", end_color="2E75B6", fill_type="solid")
+HEADER_ALIGNMENT = Alignment(horizontal="center", vertical="center", wrap_text=True)
+THIN_BORDER = Border(
+    left=Side(style='thin'), right=Side(style='thin'),
+    top=Side(style='thin'), bottom=Side(style='thin')
+)
+
+# Estilos para datos
+DATA_ALIGNMENT = Alignment(horizontal="center", vertical="center")
+GREEN_FILL = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")  # Verde claro para ✔️
+RED_FILL = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")    # Rojo claro para ❌
+YELLOW_FILL = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid") # Amarillo para pendiente
+
+RELLENO_POR_VALOR = {"✔️": GREEN_FILL, "❌": RED_FILL, "⚠️": YELLOW_FILL}
+RELLENO_POR_ESTADO_CURSO = {'completado': GREEN_FILL, 'en_progreso': YELLOW_FILL, 'pendiente': RED_FILL}
+
+# Encabezados organizados según el formulario multistep + datos de cursos
+HEADERS_USUARIOS = [
+    # PASO 1: Información básica
+    'ID', 'Nombre', 'Apellido', 'Email', 'Municipio', 'Tipo Documento', 'Número Documento',
+    'Tipo Persona', 'Emprendimiento', 'Sector', 'Estado Cuenta', 'Fecha Creación',
+
+    # PASO 2: Documentación obligatoria
+    'TDR', 'Uso Imagen', 'Plan Negocio', 'Vecindad', 'Video',
+
+    # PASO 3: Documentación según tipo de persona
+    'RUT', 'Cédula', 'Cédula Representante', 'Cert. Existencia',
+
+    # PASO 4: Documentación diferencial (subsanable)
+    'RUV', 'SISBEN', 'Grupo Étnico', 'ARN', 'Discapacidad',
+
+    # PASO 5: Documentación de control (obligatoria)
+    'Fiscales', 'Disciplinarios', 'Judiciales', 'REDAM', 'Inhab. Sexuales', 'Capacidad Legal',
+    'Estado Control', 'Resultado Certificados',
+
+    # PASO 6: Certificación de funcionamiento
+    'Formalizado', 'Matrícula Mercantil', 'Facturas 6M', 'Publicaciones Redes', 'Registro Ventas',
+
+    # PASO 7: Financiación de otras fuentes
+    'Financiado Estado', 'Regalías', 'Cámara Comercio', 'Incubadoras', 'Otro Financ.',
+
+    # PASO 8: Declaraciones y aceptaciones
+    'Declara Veraz', 'Declara No Beneficiario', 'Acepta Términos',
+
+    # Estado del proceso
+    'Paso Actual', 'Formulario Enviado', 'Estado Inscripción',
+
+    # Datos de cursos
+    'Cursos Asignados', 'Cursos Completados', 'Avance Cursos (%)', 'Fase Actual',
+
+    # Datos de evidencias
+    'Evidencias Estado', 'Tipo Emprendimiento'
+]
+
+# Encabezados para la hoja de cursos
+HEADERS_CURSOS = [
+    'Usuario ID', 'Nombre Usuario', 'Email Usuario', 'Curso ID', 'Título Curso',
+    'Tipo Curso', 'Estado Curso', 'Progreso (%)', 'Fecha Asignación', 'Fecha Inicio',
+    'Fecha Completado', 'Fecha Última Actividad'
+]
+
+
+def _por_lotes(iterable, tamano):
+    iterador = iter(iterable)
+    while True:
+        lote = list(islice(iterador, tamano))
+        if not lote:
+            return
+        yield lote
+
+
+def _fecha(valor):
+    return valor.strftime('%Y-%m-%d %H:%M') if valor else ''
+
+
+def _doc_status(presente, is_optional=False):
+    if presente:
+        return "✔️"
+    elif is_optional:
+        return "⚠️"  # Pendiente/subsanable
+    else:
+        return "❌"
+
+
+def _escribir_encabezados(ws, headers, ancho):
+    # En modo write_only los anchos deben fijarse antes de escribir filas
+    for col in range(1, len(headers) + 1):
+        ws.column_dimensions[get_column_letter(col)].width = ancho
+
+    fila = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = HEADER_FONT
+        cell.fill = HEADER_FILL
+        cell.alignment = HEADER_ALIGNMENT
+        cell.border = THIN_BORDER
+        fila.append(cell)
+    ws.append(fila)
+
+
+def _escribir_fila(ws, valores, relleno_fila=None):
+    fila = []
+    for value in valores:
+        cell = WriteOnlyCell(ws, value=value)
+        cell.alignment = DATA_ALIGNMENT
+        cell.border = THIN_BORDER
+        # Color de toda la fila (estado del curso) o según el valor de la celda
+        relleno = relleno_fila
+        if relleno is None and isinstance(value, str):
+            relleno = RELLENO_POR_VALOR.get(value)
+        if relleno is not None:
+            cell.fill = relleno
+        fila.append(cell)
+    ws.append(fila)
+
+
+def resumen_cursos(user_ids):
+    """Cursos asignados y completados por usuario, en una consulta agrupada"""
+    filas = (
+        db.session.query(
+            UsuarioCurso.user_id,
+            func.count(),
+            func.count().filter(UsuarioCurso.estado == 'completado')
+        )
+        .filter(UsuarioCurso.user_id.in_(user_ids))
+        .group_by(UsuarioCurso.user_id)
+    )
+    return {user_id: (asignados, completados) for user_id, asignados, completados in filas}
+
+
+def resumen_evidencias(user_ids):
+    """Estado y tipo de la primera evidencia de cada usuario (sin leer los archivos)"""
+    primera = (
+        db.session.query(func.min(EvidenciaFuncionamiento.id))
+        .filter(EvidenciaFuncionamiento.user_id.in_(user_ids))
+        .group_by(EvidenciaFuncionamiento.user_id)
+    )
+    filas = (
+        db.session.query(
+            EvidenciaFuncionamiento.user_id,
+            EvidenciaFuncionamiento.estado_revision,
+            EvidenciaFuncionamiento.tipo
+        )
+        .filter(EvidenciaFuncionamiento.id.in_(primera))
+    )
+    return {user_id: (estado, tipo) for user_id, estado, tipo in filas}
+
+
+def _fila_usuario(user, cursos, evidencia):
+    cursos_asignados, cursos_completados = cursos
+    avance_cursos = round((cursos_completados / cursos_asignados * 100) if cursos_asignados > 0 else 0, 2)
+    evidencias_estado, tipo_emprendimiento = evidencia
+
+    def doc(doc_type, is_optional=False):
+        return _doc_status(getattr(user, f'tiene_{doc_type}'), is_optional)
+
+    return [
+        user.id,
+        user.nombre or '',
+        user.apellido or '',
+        user.email or '',
+        user.municipio or '',
+        user.tipo_documento or '',
+        user.numero_documento or '',
+        user.tipo_persona or '',
+        user.emprendimiento_nombre or '',
+        user.emprendimiento_sector or '',
+        user.estado_cuenta or '',
+        _fecha(user.fecha_creacion),
+
+        # Documentación obligatoria
+        doc('doc_terminos_pdf'),
+        doc('doc_uso_imagen_pdf'),
+        doc('doc_plan_negocio_xls'),
+        doc('doc_vecindad_pdf'),
+        _doc_status(user.video_url),
+
+        # Documentación según tipo de persona
+        doc('rut_pdf'),
+        doc('cedula_pdf'),
+        doc('cedula_representante_pdf'),
+        doc('cert_existencia_pdf'),
+
+        # Documentación diferencial (subsanable)
+        doc('ruv_pdf', is_optional=True),
+        doc('sisben_pdf', is_optional=True),
+        doc('grupo_etnico_pdf', is_optional=True),
+        doc('arn_pdf', is_optional=True),
+        doc('discapacidad_pdf', is_optional=True),
+
+        # Documentación de control
+        doc('antecedentes_fiscales_pdf'),
+        doc('antecedentes_disciplinarios_pdf'),
+        doc('antecedentes_judiciales_pdf'),
+        doc('redam_pdf'),
+        doc('inhabilidades_sexuales_pdf'),
+        doc('declaracion_capacidad_legal_pdf'),
+        user.estado_control or 'pendiente',
+        'RECHAZADO AUTOMÁTICO' if user.resultado_certificados == 'inhabilidad_detectada' and user.estado_cuenta == 'rechazada' else (user.resultado_certificados or 'pendiente'),
+
+        # Certificación de funcionamiento
+        'Sí' if user.emprendimiento_formalizado else 'No' if user.emprendimiento_formalizado is not None else 'N/A',
+        doc('matricula_mercantil_pdf'),
+        doc('facturas_6meses_pdf'),
+        doc('publicaciones_redes_pdf'),
+        doc('registro_ventas_pdf'),
+
+        # Financiación
+        'Sí' if user.financiado_estado else 'No' if user.financiado_estado is not None else 'N/A',
+        '✔️' if user.financiado_regalias else '❌',
+        '✔️' if user.financiado_camara_comercio else '❌',
+        '✔️' if user.financiado_incubadoras else '❌',
+        '✔️' if user.financiado_otro else '❌',
+
+        # Declaraciones
+        '✔️' if user.declara_veraz else '❌',
+        '✔️' if user.declara_no_beneficiario else '❌',
+        '✔️' if user.acepta_terminos else '❌',
+
+        # Estado del proceso
+        user.paso_actual or 1,
+        'Sí' if user.formulario_enviado else 'No',
+        user.estado_inscripcion or 'borrador',
+
+        # Datos de cursos
+        cursos_asignados,
+        cursos_completados,
+        f"{avance_cursos}%",
+        getattr(user, 'fase_actual', 'N/A') or 'N/A',
+
+        # Datos de evidencias
+        evidencias_estado,
+        tipo_emprendimiento
+    ]
+
+
+def escribir_excel_usuarios(destino, tamano_lote=TAMANO_LOTE, progreso=None):
+    """
+    Escribir el Excel de usuarios registrados en un archivo, por lotes
+
+    Los usuarios se leen con `yield_per` (sin columnas binarias); por cada
+    lote se agregan cursos y evidencias con una consulta agrupada, y el
+    libro se escribe en modo `write_only`, así que la memoria no depende
+    del número de usuarios.
+
+    Args:
+        destino: Ruta o archivo binario donde guardar el .xlsx
+        tamano_lote: Usuarios por lote
+        progreso: Función opcional progreso(porcentaje) llamada tras cada lote
+
+    Returns:
+        int: Número de usuarios exportados
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Usuarios Registrados")
+    _escribir_encabezados(ws, HEADERS_USUARIOS, 15)
+
+    total_esperado = db.session.query(func.count(User.id)).scalar() if progreso else 0
+    total = 0
+    usuarios = User.query_light().order_by(User.id).yield_per(tamano_lote)
+    for lote in _por_lotes(usuarios, tamano_lote):
+        user_ids = [user.id for user in lote]
+        cursos = resumen_cursos(user_ids)
+        evidencias = resumen_evidencias(user_ids)
+        for user in lote:
+            _escribir_fila(ws, _fila_usuario(
+                user,
+                cursos.get(user.id, (0, 0)),
+                evidencias.get(user.id, ('Sin evidencias', 'N/A'))
+            ))
+        total += len(lote)
+        if progreso and total_esperado:
+            # La hoja de cursos y el guardado se reservan el último 10%
+            progreso(min(90, total * 90 // total_esperado))
+
+    # === SEGUNDA HOJA: Detalle de Cursos por Usuario ===
+    ws_cursos = wb.create_sheet("Detalle Cursos por Usuario")
+    _escribir_encabezados(ws_cursos, HEADERS_CURSOS, 18)
+
+    asignaciones = (
+        db.session.query(
+            UsuarioCurso.user_id, User.nombre, User.apellido, User.email,
+            UsuarioCurso.curso_id, Curso.titulo, Curso.tipo, UsuarioCurso.estado,
+            UsuarioCurso.progreso, UsuarioCurso.fecha_asignacion, UsuarioCurso.fecha_inicio,
+            UsuarioCurso.fecha_completado, UsuarioCurso.fecha_ultima_actividad
+        )
+        .join(User, User.id == UsuarioCurso.user_id)
+        .join(Curso, Curso.id == UsuarioCurso.curso_id)
+        .order_by(UsuarioCurso.user_id, UsuarioCurso.id)
+        .yield_per(tamano_lote)
+    )
+    for asignacion in asignaciones:
+        _escribir_fila(ws_cursos, [
+            asignacion.user_id,
+            f"{asignacion.nombre or ''} {asignacion.apellido or ''}".strip(),
+            asignacion.email or '',
+            asignacion.curso_id,
+            asignacion.titulo or '',
+            asignacion.tipo or '',
+            asignacion.estado or '',
+            f"{asignacion.progreso}%",
+            _fecha(asignacion.fecha_asignacion),
+            _fecha(asignacion.fecha_inicio),
+            _fecha(asignacion.fecha_completado),
+            _fecha(asignacion.fecha_ultima_actividad)
+        ], RELLENO_POR_ESTADO_CURSO.get(asignacion.estado))
+
+    wb.save(destino)
+    return total
+
+
+def escribir_excel_cupos(destino):
+    """
+    Escribir el Excel de estado de cupos por municipio
+
+    Args:
+        destino: Ruta o archivo binario donde guardar el .xlsx
+    """
+    cfg = CuposConfig.query.order_by(CuposConfig.id.desc()).first()
+    convocatoria = cfg.convocatoria if cfg else '2025'
+    municipios = MunicipioCupo.query.all()
+    muni_info = {m.municipio_slug: {'subregion': m.subregion, 'cupo_max': int(m.cupo_max)} for m in municipios}
+    confirmados_map, espera_map = {}, {}
+    for muni, estado, cnt in CupoOcupacion.conteos_por_municipio(convocatoria):
+        if muni is None:
+            continue
+        if estado in ('activa', 'inactiva'):
+            confirmados_map[muni] = confirmados_map.get(muni, 0) + int(cnt)
+        elif estado == 'lista_espera':
+            espera_map[muni] = espera_map.get(muni, 0) + int(cnt)
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Estado de Cupos")
+    _escribir_encabezados(
+        ws,
+        ['Subregión', 'Municipio', 'Cupo Máximo', 'Confirmados', 'Lista Espera', 'Disponibles', '% Ocupación'],
+        15
+    )
+
+    for muni, info in sorted(muni_info.items(), key=lambda x: (x[1]['subregion'], x[0])):
+        cupo_max = info['cupo_max']
+        conf = confirmados_map.get(muni, 0)
+        esp = espera_map.get(muni, 0)
+        disp = max(0, cupo_max - conf)
+        pct = round((conf / cupo_max * 100.0), 2) if cupo_max > 0 else 0.0
+
+        fila = []
+        for col, value in enumerate([info['subregion'], muni, cupo_max, conf, esp, disp, f"{pct}%"], 1):
+            cell = WriteOnlyCell(ws, value=value)
+            cell.alignment = DATA_ALIGNMENT
+            cell.border = THIN_BORDER
+            # Colores según ocupación (columna % Ocupación)
+            if col == 7:
+                if pct >= 100:
+                    cell.fill = RED_FILL  # Rojo si está al 100% o más
+                elif pct >= 80:
+                    cell.fill = YELLOW_FILL  # Amarillo si está entre 80-99%
+                else:
+                    cell.fill = GREEN_FILL  # Verde si está por debajo del 80%
+            fila.append(cell)
+        ws.append(fila)
+
+    wb.save(destino)
+
+
+def escribir_excel_fases(destino, tamano_lote=TAMANO_LOTE, progreso=None):
+    """
+    Escribir el reporte de fases de todos los usuarios, por lotes
+
+    Args:
+        destino: Ruta o archivo binario donde guardar el .xlsx
+        tamano_lote: Usuarios por lote
+        progreso: Función opcional progreso(porcentaje)
+
+    Returns:
+        int: Número de usuarios exportados
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Reporte de Fases")
+
+    headers = [
+        'ID', 'Nombre', 'Apellido', 'Email', 'Teléfono', 'Municipio',
+        'Emprendimiento', 'Sector', 'Tipo Persona', 'Fase Actual',
+        'Fecha Entrada Fase', 'Fase Completada', 'Estado Inscripción',
+        'Formulario Enviado', 'Fecha Creación', 'Estado Cuenta'
+    ]
+    for col in range(1, len(headers) + 1):
+        ws.column_dimensions[get_column_letter(col)].width = 15
+    fila = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = Font(bold=True, color="FFFFFF")
+        cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+        cell.alignment = Alignment(horizontal="center", vertical="center")
+        fila.append(cell)
+    ws.append(fila)
+
+    total_esperado = db.session.query(func.count(User.id)).scalar() if progreso else 0
+    total = 0
+    usuarios = (
+        db.session.query(
+            User.id, User.nombre, User.apellido, User.email, User.telefono, User.municipio,
+            User.emprendimiento_nombre, User.emprendimiento_sector, User.tipo_persona,
+            User.fase_actual, User.fecha_entrada_fase, User.fase_completada,
+            User.estado_inscripcion, User.formulario_enviado, User.fecha_creacion, User.estado_cuenta
+        )
+        .order_by(User.id)
+        .yield_per(tamano_lote)
+    )
+    for user in usuarios:
+        ws.append([
+            user.id,
+            user.nombre,
+            user.apellido,
+            user.email,
+            user.telefono,
+            user.municipio,
+            user.emprendimiento_nombre,
+            user.emprendimiento_sector,
+            user.tipo_persona,
+            user.fase_actual,
+            user.fecha_entrada_fase.strftime('%Y-%m-%d %H:%M:%S') if user.fecha_entrada_fase else 'N/A',
+            'Sí' if user.fase_completada else 'No',
+            user.estado_inscripcion,
+            'Sí' if user.formulario_enviado else 'No',
+            user.fecha_creacion.strftime('%Y-%m-%d %H:%M:%S') if user.fecha_creacion else 'N/A',
+            user.estado_cuenta
+        ])
+        total += 1
+        if progreso and total_esperado and total % tamano_lote == 0:
+            progreso(min(90, total * 90 // total_esperado))
+
+    wb.save(destino)
+    return total
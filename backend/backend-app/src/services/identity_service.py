@@ -0,0 +1,59 @@
+from collections import namedtuple
+from functools import wraps
+from flask import g, jsonify, session
+from src.models import db, User
+
+# Datos del usuario de la sesión que necesitan los controles de acceso.
+# convocatoria se incluye porque filtra los cursos disponibles del estudiante.
+Identidad = namedtuple('Identidad', ['id', 'rol', 'estado_cuenta', 'fase_actual', 'convocatoria'])
+
+
+def usuario_actual():
+    """
+    Identidad del usuario de la sesión, resuelta una sola vez por request
+
+    Se lee una proyección ligera de "user" (sin documentos ni el resto de la
+    fila) y se guarda en flask.g; los decoradores y los handlers del mismo
+    request la reutilizan. Es una foto del inicio del request: si el handler
+    cambia el rol o la fase del propio usuario, debe usar la fila completa.
+
+    Returns:
+        Identidad o None si no hay sesión o el usuario no existe
+    """
+    user_id = session.get('user_id')
+    # Se vuelve a cargar si la sesión cambió dentro del request (login/logout)
+    if 'identidad' not in g or g.identidad_user_id != user_id:
+        g.identidad = _cargar_identidad(user_id)
+        g.identidad_user_id = user_id
+    return g.identidad
+
+
+def _cargar_identidad(user_id):
+    if user_id is None:
+        return None
+    fila = (
+        db.session.query(User.id, User.rol, User.estado_cuenta, User.fase_actual, User.convocatoria)
+        .filter(User.id == user_id)
+        .first()
+    )
+    return Identidad(*fila) if fila else None
+
+
+def es_admin():
+    """True si el usuario de la sesión es administrador"""
+    user = usuario_actual()
+    return user is not None and user.rol == 'admin'
+
+
+def require_admin(f):
+    """Decorador para requerir rol de administrador"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            return jsonify({'error': 'No autorizado'}), 401
+
+        if not es_admin():
+            return jsonify({'error': 'Acceso denegado. Se requiere rol de administrador'}), 403
+
+        return f(*args, **kwargs)
+    return decorated_function
@@ -0,0 +1,168 @@
+import csv
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+from sqlalchemy import insert, or_
+from werkzeug.security import generate_password_hash  # pyright: ignore[reportMissingImports]
+from src.models import db, User, PuntajeUsuario
+
+CAMPOS_REQUERIDOS = ['nombre', 'apellido', 'email', 'password', 'tipo_documento', 'numero_documento']
+# Campos de texto que se copian del CSV a la tabla "user"
+CAMPOS_TEXTO = ['nombre', 'apellido', 'email', 'tipo_documento', 'numero_documento', 'rol', 'estado_cuenta']
+# Filas por lote: una consulta de duplicados, un reparto de hashes y un INSERT por lote
+TAMANO_LOTE = 1000
+# Con menos filas válidas no compensa arrancar procesos para los hashes
+MIN_FILAS_POOL = 50
+
+
+def _lotes(iterable, tamano):
+    iterador = iter(iterable)
+    while True:
+        lote = list(islice(iterador, tamano))
+        if not lote:
+            return
+        yield lote
+
+
+def _longitudes_maximas():
+    return {
+        campo: User.__table__.c[campo].type.length
+        for campo in CAMPOS_TEXTO
+        if getattr(User.__table__.c[campo].type, 'length', None)
+    }
+
+
+def _existentes(emails, documentos):
+    """Emails y números de documento que ya están registrados, en una sola consulta"""
+    filas = (
+        db.session.query(User.email, User.numero_documento)
+        .filter(or_(User.email.in_(emails), User.numero_documento.in_(documentos)))
+        .all()
+    )
+    return {fila.email for fila in filas}, {fila.numero_documento for fila in filas}
+
+
+class _Hasher:
+    """Calcula hashes de contraseñas en un pool de procesos (o en serie si no hay pool)
+
+    El pool se crea solo cuando hace falta. En entornos sin multiprocessing
+    (por ejemplo AWS Lambda, sin /dev/shm) se usa el cálculo en serie.
+    """
+
+    def __init__(self, procesos=None):
+        self.procesos = procesos or os.cpu_count() or 1
+        self._pool = None
+        self._disponible = True
+
+    def hashear(self, passwords):
+        if len(passwords) >= MIN_FILAS_POOL and self._disponible and self._pool is None:
+            try:
+                self._pool = ProcessPoolExecutor(max_workers=self.procesos)
+            except (OSError, NotImplementedError, ImportError):
+                self._disponible = False
+
+        if self._pool is not None:
+            try:
+                trozo = max(1, len(passwords) // (4 * self.procesos))
+                return list(self._pool.map(generate_password_hash, passwords, chunksize=trozo))
+            except (OSError, BrokenProcessPool):
+                self.cerrar()
+                self._disponible = False
+        return [generate_password_hash(password) for password in passwords]
+
+    def cerrar(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+
+def importar_usuarios_csv(archivo, tamano_lote=TAMANO_LOTE, procesos=None):
+    """
+    Importar usuarios desde un CSV en streaming
+
+    Por cada lote de filas: una consulta para detectar emails y documentos ya
+    registrados, hashes de contraseñas en paralelo y un único INSERT de varias
+    filas. Las filas con errores se omiten y se reportan; no hace commit.
+
+    Args:
+        archivo: Archivo binario con el CSV (encabezados en la primera fila)
+        tamano_lote: Filas por lote
+        procesos: Procesos para los hashes (None = núcleos disponibles)
+
+    Returns:
+        dict: {'importados': int, 'errores': [{'fila', 'campo', 'error'}]}
+    """
+    lector = csv.DictReader(io.TextIOWrapper(archivo, encoding='utf-8-sig', newline=''))
+    longitudes = _longitudes_maximas()
+    emails_vistos, documentos_vistos = set(), set()
+    importados = 0
+    errores = []
+    hasher = _Hasher(procesos)
+
+    def error(fila_num, campo, mensaje):
+        errores.append({'fila': fila_num, 'campo': campo, 'error': mensaje})
+
+    try:
+        # Empezar en 2 porque la fila 1 es el encabezado
+        for lote in _lotes(enumerate(lector, 2), tamano_lote):
+            candidatos = []
+            for fila_num, row in lote:
+                faltantes = [campo for campo in CAMPOS_REQUERIDOS if not row.get(campo)]
+                for campo in faltantes:
+                    error(fila_num, campo, f"Campo '{campo}' es requerido")
+                if faltantes:
+                    continue
+
+                valores = {campo: row.get(campo) for campo in CAMPOS_TEXTO}
+                valores['rol'] = valores['rol'] or 'estudiante'
+                valores['estado_cuenta'] = valores['estado_cuenta'] or 'inactiva'
+                largos = [campo for campo, maximo in longitudes.items() if len(valores[campo]) > maximo]
+                for campo in largos:
+                    error(fila_num, campo, f"Campo '{campo}' supera {longitudes[campo]} caracteres")
+                if largos:
+                    continue
+
+                candidatos.append((fila_num, valores, row['password']))
+
+            if not candidatos:
+                continue
+
+            emails_existentes, documentos_existentes = _existentes(
+                {valores['email'] for _, valores, _ in candidatos},
+                {valores['numero_documento'] for _, valores, _ in candidatos}
+            )
+
+            validos = []
+            for fila_num, valores, password in candidatos:
+                email, documento = valores['email'], valores['numero_documento']
+                if email in emails_existentes:
+                    error(fila_num, 'email', f"Email '{email}' ya existe")
+                elif email in emails_vistos:
+                    error(fila_num, 'email', f"Email '{email}' está repetido en el archivo")
+                elif documento in documentos_existentes:
+                    error(fila_num, 'numero_documento', f"Documento '{documento}' ya existe")
+                elif documento in documentos_vistos:
+                    error(fila_num, 'numero_documento', f"Documento '{documento}' está repetido en el archivo")
+                else:
+                    emails_vistos.add(email)
+                    documentos_vistos.add(documento)
+                    validos.append((valores, password))
+
+            if not validos:
+                continue
+
+            hashes = hasher.hashear([password for _, password in validos])
+            filas = [{**valores, 'password_hash': password_hash} for (valores, _), password_hash in zip(validos, hashes)]
+
+            # INSERT de varias filas; no pasa por el flush del ORM, así que el
+            # puntaje de los nuevos usuarios se crea aquí explícitamente
+            ids = db.session.execute(insert(User.__table__).returning(User.__table__.c.id), filas).scalars().all()
+            PuntajeUsuario.recalcular(db.session.connection(), ids)
+            importados += len(ids)
+    finally:
+        hasher.cerrar()
+
+    errores.sort(key=lambda e: e['fila'])
+    return {'importados': importados, 'errores': errores}
@@ -0,0 +1,89 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_
+from src.models import db, User, LogActividad
+
+# Límite de registros por página
+MAX_POR_PAGINA = 200
+
+# Orden del listado; coincide con el índice ix_log_actividad_fecha_id
+ORDEN_LOGS = (LogActividad.fecha.desc(), LogActividad.id.desc())
+
+
+def consulta_logs(usuario_id=None, accion=None, desde=None, hasta=None):
+    """
+    Logs con los datos del usuario en una sola consulta (LEFT JOIN a "user")
+
+    `desde`/`hasta` acotan `fecha`, así que PostgreSQL solo lee las
+    particiones mensuales de ese rango.
+    """
+    query = (
+        db.session.query(LogActividad, User.id.label('usuario_encontrado'), User.nombre, User.apellido, User.email)
+        .outerjoin(User, User.id == LogActividad.usuario_id)
+    )
+    if usuario_id is not None:
+        query = query.filter(LogActividad.usuario_id == usuario_id)
+    if accion:
+        query = query.filter(LogActividad.accion == accion)
+    if desde is not None:
+        query = query.filter(LogActividad.fecha >= desde)
+    if hasta is not None:
+        query = query.filter(LogActividad.fecha < hasta)
+    return query
+
+
+def codificar_cursor(log):
+    """Cursor opaco con la posición (fecha, id) del último registro de la página"""
+    datos = json.dumps([log.fecha.isoformat(), log.id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(datos).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """
+    Leer un cursor de `codificar_cursor`
+
+    Raises:
+        ValueError: si el cursor no es válido
+    """
+    try:
+        datos = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        fecha, log_id = json.loads(datos)
+        return datetime.fromisoformat(fecha), int(log_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Cursor no válido') from e
+
+
+def pagina_logs(query, cursor=None, por_pagina=50):
+    """
+    Una página de logs por keyset sobre (fecha, id), sin OFFSET ni COUNT
+
+    Args:
+        query: Consulta de `consulta_logs`
+        cursor: Cursor devuelto en la página anterior (None o '' para la primera)
+        por_pagina: Tamaño de página (máximo MAX_POR_PAGINA)
+
+    Returns:
+        tuple: (lista de dicts, siguiente_cursor o None)
+
+    Raises:
+        ValueError: si el cursor no es válido
+    """
+    por_pagina = max(1, min(por_pagina, MAX_POR_PAGINA))
+    if cursor:
+        fecha, log_id = decodificar_cursor(cursor)
+        query = query.filter(or_(
+            LogActividad.fecha < fecha,
+            and_(LogActividad.fecha == fecha, LogActividad.id < log_id)
+        ))
+    filas = query.order_by(*ORDEN_LOGS).limit(por_pagina + 1).all()
+
+    siguiente = None
+    if len(filas) > por_pagina:
+        filas = filas[:por_pagina]
+        siguiente = codificar_cursor(filas[-1][0])
+    logs = [
+        fila[0].to_dict(usuario=fila if fila.usuario_encontrado is not None else None)
+        for fila in filas
+    ]
+    return logs, siguiente
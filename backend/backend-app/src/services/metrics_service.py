@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from src.models import db, User, Curso, EvidenciaFuncionamiento
+
+
+def contar_en_una_consulta(modelo, **conteos):
+    """
+    Calcular varios conteos sobre una tabla en un solo recorrido
+
+    Cada conteo se traduce a ``count(*) FILTER (WHERE ...)``; un valor None
+    cuenta todas las filas.
+
+    Args:
+        modelo: Modelo (tabla) a contar
+        **conteos: nombre=condición SQLAlchemy (o None)
+
+    Returns:
+        dict: {nombre: entero}
+    """
+    columnas = [
+        (func.count().filter(condicion) if condicion is not None else func.count()).label(nombre)
+        for nombre, condicion in conteos.items()
+    ]
+    fila = db.session.query(*columnas).select_from(modelo).one()
+    return {nombre: int(valor or 0) for nombre, valor in fila._mapping.items()}
+
+
+def metricas_dashboard():
+    """Conteos del dashboard de administración: una consulta por tabla"""
+    fecha_limite = datetime.utcnow() - timedelta(days=30)
+    usuarios = contar_en_una_consulta(
+        User,
+        total=None,
+        activos=User.estado_cuenta == 'activa',
+        inactivos=User.estado_cuenta == 'inactiva',
+        suspendidos=User.estado_cuenta == 'suspendida',
+        estudiantes=User.rol == 'estudiante',
+        instructores=User.rol == 'instructor',
+        admins=User.rol == 'admin',
+        nuevos_30_dias=User.fecha_creacion >= fecha_limite
+    )
+    cursos = contar_en_una_consulta(
+        Curso,
+        total=None,
+        activos=Curso.activo.is_(True)
+    )
+    return usuarios, cursos
+
+
+def metricas_fases():
+    """Conteos de usuarios por fase y fases completadas"""
+    return contar_en_una_consulta(
+        User,
+        total=None,
+        inscripcion=User.fase_actual == 'inscripcion',
+        formacion=User.fase_actual == 'formacion',
+        entrega_activos=User.fase_actual == 'entrega_activos',
+        fases_completadas=User.fase_completada.is_(True),
+        inscripcion_completada=(User.fase_actual == 'inscripcion') & User.fase_completada.is_(True),
+        formacion_completada=(User.fase_actual == 'formacion') & User.fase_completada.is_(True),
+        entrega_completada=(User.fase_actual == 'entrega_activos') & User.fase_completada.is_(True)
+    )
+
+
+def metricas_certificados():
+    """Conteos de certificados de control y rechazos automáticos"""
+    return contar_en_una_consulta(
+        User,
+        total=None,
+        control_completo=User.estado_control == 'completo',
+        control_pendiente=User.estado_control == 'pendiente',
+        resultado_pendiente=User.resultado_certificados == 'pendiente',
+        resultado_limpio=User.resultado_certificados == 'limpio',
+        resultado_inhabilidad=User.resultado_certificados == 'inhabilidad_detectada',
+        rechazados_automaticamente=(User.estado_cuenta == 'rechazada') & (User.resultado_certificados == 'inhabilidad_detectada')
+    )
+
+
+def metricas_evidencias():
+    """Conteos de evidencias de funcionamiento por estado y tipo"""
+    return contar_en_una_consulta(
+        EvidenciaFuncionamiento,
+        total=None,
+        pendientes=EvidenciaFuncionamiento.estado_revision == 'pendiente',
+        aprobadas=EvidenciaFuncionamiento.estado_revision == 'aprobado',
+        rechazadas=EvidenciaFuncionamiento.estado_revision == 'rechazado',
+        formales=EvidenciaFuncionamiento.tipo == 'formal',
+        informales=EvidenciaFuncionamiento.tipo == 'informal'
+    )
@@ -0,0 +1,211 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import g, has_app_context
+from sqlalchemy import and_, event, exists, or_
+from sqlalchemy.orm import Session
+from src.models import db, Curso, Modulo, Leccion, Recurso, Inscripcion
+
+# Segundos que se recuerda una decisión; acota el tiempo que otro proceso
+# puede seguir usando un permiso revocado (en este proceso se invalida al confirmar)
+CACHE_TTL = 30
+# Decisiones que se guardan como máximo (se descartan las menos usadas)
+CACHE_MAX = 4096
+# Cambios en estos modelos pueden alterar la propiedad o el acceso a un recurso
+MODELOS_PERMISOS = (Curso, Modulo, Leccion, Recurso, Inscripcion)
+
+
+class CachePermisos:
+    """LRU con caducidad para decisiones (usuario, rol, tipo, id, acción) -> bool"""
+
+    def __init__(self, ttl=CACHE_TTL, maximo=CACHE_MAX):
+        self.ttl = ttl
+        self.maximo = maximo
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave):
+        """Devuelve la decisión guardada o None si no hay una vigente"""
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            valor, vence = entrada
+            if vence < time.monotonic():
+                del self._datos[clave]
+                return None
+            self._datos.move_to_end(clave)
+            return valor
+
+    def guardar(self, clave, valor):
+        with self._lock:
+            self._datos[clave] = (valor, time.monotonic() + self.ttl)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+
+cache_permisos = CachePermisos()
+
+
+def _consulta_instructor(user_id, resource_type, ids):
+    """IDs (de entre `ids`) de recursos que pertenecen al instructor, en una consulta"""
+    if resource_type == 'curso':
+        return db.session.query(Curso.id).filter(Curso.id.in_(ids), Curso.instructor_id == user_id)
+    if resource_type == 'modulo':
+        return (
+            db.session.query(Modulo.id)
+            .join(Curso, Curso.id == Modulo.curso_id)
+            .filter(Modulo.id.in_(ids), Curso.instructor_id == user_id)
+        )
+    if resource_type == 'leccion':
+        return (
+            db.session.query(Leccion.id)
+            .join(Modulo, Modulo.id == Leccion.modulo_id)
+            .join(Curso, Curso.id == Modulo.curso_id)
+            .filter(Leccion.id.in_(ids), Curso.instructor_id == user_id)
+        )
+    if resource_type == 'recurso':
+        return db.session.query(Recurso.id).filter(Recurso.id.in_(ids), Recurso.subido_por == user_id)
+    return None
+
+
+def _consulta_estudiante(user_id, resource_type, ids, action):
+    """IDs (de entre `ids`) que el estudiante puede leer, en una consulta"""
+    if action != 'read':
+        return None
+    if resource_type == 'curso':
+        # Cursos en los que está inscrito
+        return (
+            db.session.query(Inscripcion.curso_id)
+            .filter(Inscripcion.curso_id.in_(ids), Inscripcion.estudiante_id == user_id)
+            .distinct()
+        )
+    if resource_type == 'recurso':
+        # Recursos públicos o de un curso en el que está inscrito
+        inscrito = exists().where(
+            Inscripcion.curso_id == Recurso.curso_id,
+            Inscripcion.estudiante_id == user_id
+        )
+        return db.session.query(Recurso.id).filter(
+            Recurso.id.in_(ids),
+            or_(Recurso.acceso_publico.is_(True), and_(Recurso.curso_id.isnot(None), inscrito))
+        )
+    return None
+
+
+def _cache_request():
+    if not has_app_context():
+        return {}
+    if 'permisos' not in g:
+        g.permisos = {}
+    return g.permisos
+
+
+def permitidos(user, resource_type, resource_ids, action='read'):
+    """
+    IDs de recursos de un mismo tipo sobre los que el usuario puede actuar
+
+    Las decisiones que no están en caché (del request o del proceso) se
+    resuelven juntas con una sola consulta, así que una página que revisa
+    decenas de recursos hace como mucho una consulta por tipo.
+
+    Reglas:
+        - admin: todo
+        - instructor: cursos propios y sus módulos/lecciones, recursos que subió
+        - estudiante (solo lectura): cursos en los que está inscrito,
+          recursos públicos o de esos cursos
+
+    Args:
+        user: Objeto con id y rol (User, Identidad o UsuarioToken)
+        resource_type: curso, modulo, leccion o recurso
+        resource_ids: IDs a verificar (se ignoran los None)
+        action: read, write, ...
+
+    Returns:
+        set: IDs permitidos
+    """
+    ids = {resource_id for resource_id in resource_ids if resource_id is not None}
+    if user.rol == 'admin':
+        return ids
+    if user.rol not in ('instructor', 'estudiante') or not ids:
+        return set()
+
+    # Para el instructor la acción no cambia el resultado
+    accion = None if user.rol == 'instructor' else action
+    por_request = _cache_request()
+    resultado = set()
+    faltantes = []
+    for resource_id in ids:
+        clave = (user.id, user.rol, resource_type, resource_id, accion)
+        valor = por_request.get(clave)
+        if valor is None:
+            valor = cache_permisos.obtener(clave)
+            if valor is not None:
+                por_request[clave] = valor
+        if valor is None:
+            faltantes.append(resource_id)
+        elif valor:
+            resultado.add(resource_id)
+
+    if faltantes:
+        if user.rol == 'instructor':
+            consulta = _consulta_instructor(user.id, resource_type, faltantes)
+        else:
+            consulta = _consulta_estudiante(user.id, resource_type, faltantes, action)
+        encontrados = {fila[0] for fila in consulta} if consulta is not None else set()
+
+        for resource_id in faltantes:
+            valor = resource_id in encontrados
+            clave = (user.id, user.rol, resource_type, resource_id, accion)
+            por_request[clave] = valor
+            cache_permisos.guardar(clave, valor)
+        resultado |= encontrados
+
+    return resultado
+
+
+def puede(user, resource_type, resource_id, action='read'):
+    """True si el usuario puede realizar `action` sobre el recurso"""
+    # Administradores tienen todos los permisos (incluso sin resource_id)
+    if user.rol == 'admin':
+        return True
+    return resource_id in permitidos(user, resource_type, [resource_id], action)
+
+
+@event.listens_for(Session, 'after_flush')
+def _marcar_cambios_permisos(session, flush_context):
+    """Recordar si la transacción tocó cursos, módulos, lecciones, recursos o inscripciones"""
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, MODELOS_PERMISOS):
+            session.info['invalidar_permisos'] = True
+            if has_app_context():
+                g.pop('permisos', None)
+            return
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _marcar_cambios_masivos(orm_execute_state):
+    """Lo mismo para query.update() / query.delete(), que no pasan por el flush"""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and issubclass(mapper.class_, MODELOS_PERMISOS):
+        orm_execute_state.session.info['invalidar_permisos'] = True
+        if has_app_context():
+            g.pop('permisos', None)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_permisos(session):
+    if session.info.pop('invalidar_permisos', False):
+        cache_permisos.limpiar()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_marca_permisos(session):
+    session.info.pop('invalidar_permisos', None)
@@ -0,0 +1,238 @@
+import pandas as pd
+from sqlalchemy import func
+from src.models import db, User, Evaluacion, CriterioEvaluacion, PuntajeUsuario
+
+# Columnas del usuario que se muestran en los rankings
+COLUMNAS_USUARIO = ['id', 'nombre', 'apellido', 'email', 'municipio', 'emprendimiento_nombre', 'fecha_creacion']
+
+
+def cargar_evaluaciones(incluir_detalle=False):
+    """
+    Cargar usuarios (no admin) y sus evaluaciones en una sola consulta
+
+    Cada fila es una evaluación; los usuarios sin evaluaciones aparecen una
+    vez con las columnas de evaluación vacías (LEFT OUTER JOIN).
+
+    Args:
+        incluir_detalle: True para traer también código del criterio y observaciones
+
+    Returns:
+        DataFrame: Una fila por (usuario, evaluación)
+    """
+    columnas = [
+        User.id, User.nombre, User.apellido, User.email, User.municipio,
+        User.emprendimiento_nombre, User.fecha_creacion,
+        Evaluacion.criterio_id, Evaluacion.puntaje,
+        CriterioEvaluacion.max_puntaje, CriterioEvaluacion.peso
+    ]
+    nombres = COLUMNAS_USUARIO + ['criterio_id', 'puntaje', 'max_puntaje', 'peso']
+    if incluir_detalle:
+        columnas += [CriterioEvaluacion.codigo, Evaluacion.observaciones]
+        nombres += ['codigo', 'observaciones']
+
+    filas = (
+        db.session.query(*columnas)
+        .select_from(User)
+        .outerjoin(Evaluacion, Evaluacion.usuario_id == User.id)
+        .outerjoin(CriterioEvaluacion, CriterioEvaluacion.id == Evaluacion.criterio_id)
+        .filter(User.rol != 'admin')
+        .all()
+    )
+    return pd.DataFrame.from_records(filas, columns=nombres)
+
+
+def calcular_ranking(evaluaciones):
+    """
+    Calcular puntaje ponderado, completitud y posición de cada usuario
+
+    Puntaje = suma de (puntaje / max_puntaje) * peso, redondeado a 2 decimales.
+    Orden: puntaje descendente y, en empate, fecha de inscripción ascendente.
+
+    Args:
+        evaluaciones: DataFrame devuelto por `cargar_evaluaciones`
+
+    Returns:
+        DataFrame: Una fila por usuario con puntaje_total, evaluaciones_registradas,
+        evaluacion_completa y posicion
+    """
+    criterios_activos = (
+        db.session.query(db.func.count(CriterioEvaluacion.id))
+        .filter(CriterioEvaluacion.activo.is_(True))
+        .scalar()
+    )
+
+    ponderado = (
+        pd.to_numeric(evaluaciones['puntaje'], errors='coerce')
+        / pd.to_numeric(evaluaciones['max_puntaje'], errors='coerce')
+        * pd.to_numeric(evaluaciones['peso'], errors='coerce')
+    )
+    totales = (
+        evaluaciones.assign(ponderado=ponderado)
+        .groupby('id', sort=False)
+        .agg(puntaje_total=('ponderado', 'sum'), evaluaciones_registradas=('criterio_id', 'count'))
+    )
+
+    ranking = (
+        evaluaciones.drop_duplicates('id')[COLUMNAS_USUARIO]
+        .set_index('id')
+        .join(totales)
+    )
+    ranking['puntaje_total'] = ranking['puntaje_total'].fillna(0.0).round(2)
+    ranking['evaluacion_completa'] = ranking['evaluaciones_registradas'] == criterios_activos
+    # Los usuarios sin fecha de inscripción van primero dentro de su empate
+    ranking = ranking.sort_values(
+        ['puntaje_total', 'fecha_creacion'],
+        ascending=[False, True],
+        na_position='first',
+        kind='mergesort'
+    ).reset_index()
+    ranking['posicion'] = range(1, len(ranking) + 1)
+    return ranking
+
+
+def obtener_ranking(incluir_detalle=False):
+    """
+    Ranking completo de usuarios
+
+    Returns:
+        tuple: (ranking, evaluaciones) ambos DataFrame
+    """
+    evaluaciones = cargar_evaluaciones(incluir_detalle)
+    return calcular_ranking(evaluaciones), evaluaciones
+
+
+def detalle_por_criterio(evaluaciones):
+    """
+    Columnas {codigo}_puntaje, _max, _peso y _observaciones por usuario
+
+    Args:
+        evaluaciones: DataFrame de `cargar_evaluaciones(incluir_detalle=True)`
+
+    Returns:
+        DataFrame: Indexado por id de usuario, una columna por criterio y dato
+    """
+    evaluadas = evaluaciones.dropna(subset=['codigo']).drop_duplicates(['id', 'codigo'], keep='last')
+    if evaluadas.empty:
+        return pd.DataFrame(index=pd.Index([], name='id'))
+
+    evaluadas = evaluadas.assign(
+        max=evaluadas['max_puntaje'],
+        peso=pd.to_numeric(evaluadas['peso']),
+        observaciones=evaluadas['observaciones'].fillna('')
+    )
+    detalle = evaluadas.pivot(index='id', columns='codigo', values=['puntaje', 'max', 'peso', 'observaciones'])
+    detalle.columns = [f'{codigo}_{dato}' for dato, codigo in detalle.columns]
+    return detalle
+
+
+def escribir_excel_rankings(destino):
+    """
+    Escribir el Excel de rankings con la hoja de detalle por criterio
+
+    Args:
+        destino: Ruta o archivo binario donde guardar el .xlsx
+    """
+    ranking, evaluaciones = obtener_ranking(incluir_detalle=True)
+
+    df = pd.DataFrame({
+        'id': ranking['id'],
+        'posicion': ranking['posicion'],
+        'nombre_completo': ranking['nombre'].fillna('') + ' ' + ranking['apellido'].fillna(''),
+        'email': ranking['email'],
+        'municipio': ranking['municipio'],
+        'emprendimiento_nombre': ranking['emprendimiento_nombre'].fillna('Sin nombre').replace('', 'Sin nombre'),
+        'puntaje_total': ranking['puntaje_total'],
+        'evaluacion_completa': ranking['evaluacion_completa'].map({True: 'Completa', False: 'Pendiente'}),
+        'fecha_inscripcion': ranking['fecha_creacion'].map(lambda f: f.strftime('%Y-%m-%d') if pd.notna(f) else '')
+    })
+    df = df.join(detalle_por_criterio(evaluaciones), on='id')
+
+    with pd.ExcelWriter(destino, engine='openpyxl') as writer:
+        # Hoja principal con rankings
+        df_main = df[['posicion', 'nombre_completo', 'email', 'municipio', 'emprendimiento_nombre',
+                      'puntaje_total', 'evaluacion_completa', 'fecha_inscripcion']].copy()
+        df_main.to_excel(writer, sheet_name='Rankings', index=False)
+
+        # Hoja detallada con evaluaciones por criterio, en el orden de los criterios activos
+        criterios = CriterioEvaluacion.query.filter_by(activo=True).order_by(CriterioEvaluacion.orden).all()
+        criterios_columns = ['posicion', 'nombre_completo', 'email', 'municipio']
+        for criterio in criterios:
+            if f'{criterio.codigo}_puntaje' in df.columns:
+                criterios_columns.extend([
+                    f'{criterio.codigo}_puntaje',
+                    f'{criterio.codigo}_max',
+                    f'{criterio.codigo}_peso',
+                    f'{criterio.codigo}_observaciones'
+                ])
+        criterios_columns = [col for col in criterios_columns if col in df.columns]
+
+        if criterios_columns:
+            df[criterios_columns].to_excel(writer, sheet_name='Evaluaciones Detalladas', index=False)
+
+
+def consulta_ranking():
+    """
+    Ranking leído de la tabla materializada puntaje_usuario
+
+    El ORDER BY coincide con el índice idx_puntaje_usuario_ranking, así que
+    una página se resuelve sin ordenar toda la tabla.
+    """
+    return (
+        db.session.query(
+            User.id, User.nombre, User.apellido, User.email, User.municipio,
+            User.emprendimiento_nombre, PuntajeUsuario.puntaje_total,
+            PuntajeUsuario.evaluacion_completa, PuntajeUsuario.fecha_inscripcion
+        )
+        .select_from(PuntajeUsuario)
+        .join(User, User.id == PuntajeUsuario.usuario_id)
+        .filter(User.rol != 'admin')
+        .order_by(*PuntajeUsuario.ORDEN_RANKING)
+    )
+
+
+def fila_a_registro(fila):
+    """Convertir una fila de `consulta_ranking` al formato de la API"""
+    return {
+        'id': fila.id,
+        'nombre': fila.nombre,
+        'apellido': fila.apellido,
+        'email': fila.email,
+        'municipio': fila.municipio,
+        'emprendimiento_nombre': fila.emprendimiento_nombre,
+        'puntaje_total': float(fila.puntaje_total or 0),
+        'evaluacion_completa': bool(fila.evaluacion_completa),
+        'fecha_inscripcion': fila.fecha_inscripcion.isoformat() if fila.fecha_inscripcion else None
+    }
+
+
+def empates_materializados():
+    """
+    Grupos de usuarios empatados (puntaje mayor que cero) desde puntaje_usuario
+
+    Returns:
+        dict: {puntaje_total: [usuario con posicion, ...]} solo para grupos de 2 o más
+    """
+    posiciones = (
+        consulta_ranking()
+        .order_by(None)
+        .add_columns(func.row_number().over(order_by=PuntajeUsuario.ORDEN_RANKING).label('posicion'))
+        .subquery()
+    )
+    repetidos = (
+        db.session.query(posiciones.c.puntaje_total)
+        .filter(posiciones.c.puntaje_total > 0)
+        .group_by(posiciones.c.puntaje_total)
+        .having(func.count() > 1)
+    )
+    filas = (
+        db.session.query(posiciones)
+        .filter(posiciones.c.puntaje_total.in_(repetidos))
+        .order_by(posiciones.c.posicion)
+        .all()
+    )
+
+    empates = {}
+    for fila in filas:
+        registro = fila_a_registro(fila)
+        empates.setdefault(registro['puntaje_total'], []).append({**registro, 'posicion': fila.posicion})
+    return empates
@@ -1,21 +1,78 @@
-import boto3
+import io
 import os
+import threading
 import uuid
 from datetime import datetime, timedelta
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError, NoCredentialsError
 import mimetypes
+from src.services.storage_client import obtener_cliente_s3
+from src.services import storage_inventory
+
+MB = 1024 * 1024
+
+
+def transfer_config_desde_entorno():
+    """
+    Configuración de transferencias: por encima del umbral se usan subidas y
+    copias multiparte en paralelo; cada parte se reintenta por separado
+    """
+    return TransferConfig(
+        multipart_threshold=int(os.getenv('S3_MULTIPART_THRESHOLD_MB', '16')) * MB,
+        multipart_chunksize=int(os.getenv('S3_MULTIPART_CHUNKSIZE_MB', '16')) * MB,
+        max_concurrency=int(os.getenv('S3_MAX_CONCURRENCY', '8')),
+        use_threads=True
+    )
+
+
+class ProgresoTransferencia:
+    """Callback de progreso para transferencias multiparte.
+
+    s3transfer lo invoca desde varios hilos con los bytes de cada fragmento;
+    aquí se acumulan y se llama a `al_avanzar(transferidos, total)`.
+    """
+
+    def __init__(self, total, al_avanzar):
+        self.total = total
+        self.transferidos = 0
+        self.al_avanzar = al_avanzar
+        self._lock = threading.Lock()
+
+    def __call__(self, bytes_fragmento):
+        with self._lock:
+            self.transferidos += bytes_fragmento
+            transferidos = self.transferidos
+        self.al_avanzar(transferidos, self.total)
+
+
+def _tamano_restante(file_data):
+    """Bytes desde la posición actual de un file-like con seek, o None"""
+    try:
+        posicion = file_data.tell()
+        file_data.seek(0, os.SEEK_END)
+        tamano = file_data.tell() - posicion
+        file_data.seek(posicion)
+        return tamano
+    except (AttributeError, OSError, ValueError):
+        return None
+
 
 class S3Service:
     def __init__(self):
         """Inicializar el servicio S3"""
-        self.s3_client = boto3.client(
-            's3',
-            aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-            aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-            region_name=os.getenv('AWS_REGION', 'us-east-1')
-        )
+        # S3_ENDPOINT_URL permite usar un S3 local (MinIO, moto) en desarrollo y pruebas
+        endpoint_url = os.getenv('S3_ENDPOINT_URL') or None
+        self.transfer_config = transfer_config_desde_entorno()
         self.bucket_name = os.getenv('S3_BUCKET_NAME', 'elearning-narino-resources')
-        self.base_url = f"https://{self.bucket_name}.s3.amazonaws.com"
+        if endpoint_url:
+            self.base_url = f"{endpoint_url.rstrip('/')}/{self.bucket_name}"
+        else:
+            self.base_url = f"https://{self.bucket_name}.s3.amazonaws.com"
+    
+    @property
+    def s3_client(self):
+        """Cliente compartido del proceso (ver storage_client.obtener_cliente_s3)"""
+        return obtener_cliente_s3()
     
     def generate_s3_key(self, filename, folder="uploads"):
         """Generar una clave única para S3"""
@@ -24,21 +81,28 @@ class S3Service:
         extension = os.path.splitext(filename)[1]
         return f"{folder}/{timestamp}/{unique_id}{extension}"
     
-    def upload_file(self, file_data, filename, content_type=None):
+    def upload_file(self, file_data, filename, content_type=None, folder="uploads", callback=None):
         """
         Subir archivo a S3
         
+        Los archivos por encima de S3_MULTIPART_THRESHOLD_MB se suben en partes
+        en paralelo; los file-like se leen por fragmentos, sin cargarlos
+        completos en memoria.
+        
         Args:
             file_data: Datos del archivo (bytes o file-like object)
             filename: Nombre original del archivo
             content_type: Tipo de contenido (opcional)
+            folder: Prefijo de la clave en el bucket
+            callback: Llamado con los bytes de cada fragmento transferido
+                (ver ProgresoTransferencia)
         
         Returns:
             dict: Información del archivo subido
         """
         try:
             # Generar clave única para S3
-            s3_key = self.generate_s3_key(filename)
+            s3_key = self.generate_s3_key(filename, folder=folder)
             
             # Determinar tipo de contenido si no se proporciona
             if not content_type:
@@ -46,23 +110,18 @@ class S3Service:
                 if not content_type:
                     content_type = 'application/octet-stream'
             
-            # Subir archivo a S3
-            self.s3_client.put_object(
-                Bucket=self.bucket_name,
-                Key=s3_key,
-                Body=file_data,
-                ContentType=content_type,
-                ACL='public-read'  # Hacer el archivo público
-            )
+            tamano = self.put_object(s3_key, file_data, content_type, callback=callback)
+            storage_inventory.registrar_subida(s3_key, tamano)
             
             # Generar URL pública
-            s3_url = f"{self.base_url}/{s3_key}"
+            s3_url = self.get_public_url(s3_key)
             
             return {
                 's3_key': s3_key,
                 's3_url': s3_url,
                 's3_bucket': self.bucket_name,
                 'content_type': content_type,
+                'size': tamano,
                 'success': True
             }
             
@@ -82,21 +141,169 @@ class S3Service:
                 'success': False
             }
     
-    def delete_file(self, s3_key):
+    def put_object(self, s3_key, file_data, content_type, callback=None):
+        """
+        Subir datos a una clave dada (una petición o multiparte según el tamaño)
+        
+        No actualiza el inventario; ver upload_file.
+        
+        Returns:
+            int: Tamaño subido en bytes
+        """
+        if isinstance(file_data, (bytes, bytearray)):
+            file_data = io.BytesIO(file_data)
+        tamano = _tamano_restante(file_data)
+        
+        self.s3_client.upload_fileobj(
+            file_data,
+            self.bucket_name,
+            s3_key,
+            ExtraArgs={
+                'ContentType': content_type,
+                'ACL': 'public-read'  # Hacer el archivo público
+            },
+            Callback=callback,
+            Config=self.transfer_config
+        )
+        
+        # Streams sin seek: el tamaño se consulta al bucket
+        if tamano is None:
+            tamano = (self.get_file_info(s3_key) or {}).get('size', 0)
+        return tamano
+    
+    def get_public_url(self, s3_key):
+        """URL pública de un objeto (los objetos se suben con ACL public-read)"""
+        return f"{self.base_url}/{s3_key}"
+    
+    def presigned_post(self, s3_key, content_type, max_size, expires_in=3600):
+        """
+        Formulario firmado para que el cliente suba un archivo directamente a S3
+        
+        La política fija la clave, el Content-Type y el tamaño máximo, así que
+        S3 rechaza cualquier otra subida con esas credenciales.
+        
+        Args:
+            s3_key: Clave del objeto
+            content_type: Tipo de contenido que debe enviar el cliente
+            max_size: Tamaño máximo en bytes
+            expires_in: Vigencia en segundos
+        
+        Returns:
+            dict: {'url': ..., 'fields': {...}} para un POST multipart/form-data
+        """
+        return self.s3_client.generate_presigned_post(
+            Bucket=self.bucket_name,
+            Key=s3_key,
+            Fields={'Content-Type': content_type, 'acl': 'public-read'},
+            Conditions=[
+                {'Content-Type': content_type},
+                {'acl': 'public-read'},
+                ['content-length-range', 1, max_size]
+            ],
+            ExpiresIn=expires_in
+        )
+    
+    def create_multipart_upload(self, s3_key, content_type):
+        """Iniciar una subida multiparte; devuelve el UploadId"""
+        response = self.s3_client.create_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=s3_key,
+            ContentType=content_type,
+            ACL='public-read'
+        )
+        return response['UploadId']
+    
+    def presigned_part_urls(self, s3_key, upload_id, part_count, expires_in=3600):
+        """URLs firmadas (PUT) para cada parte de una subida multiparte, numeradas desde 1"""
+        return [
+            {
+                'numero': numero,
+                'url': self.s3_client.generate_presigned_url(
+                    'upload_part',
+                    Params={
+                        'Bucket': self.bucket_name,
+                        'Key': s3_key,
+                        'UploadId': upload_id,
+                        'PartNumber': numero
+                    },
+                    ExpiresIn=expires_in
+                )
+            }
+            for numero in range(1, part_count + 1)
+        ]
+    
+    def complete_multipart_upload(self, s3_key, upload_id, parts):
+        """
+        Completar una subida multiparte
+        
+        Args:
+            parts: Lista de (numero_parte, etag) en cualquier orden
+        """
+        self.s3_client.complete_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=s3_key,
+            UploadId=upload_id,
+            MultipartUpload={
+                'Parts': [{'PartNumber': numero, 'ETag': etag} for numero, etag in sorted(parts)]
+            }
+        )
+    
+    def abort_multipart_upload(self, s3_key, upload_id):
+        """Cancelar una subida multiparte y liberar sus partes"""
+        try:
+            self.s3_client.abort_multipart_upload(Bucket=self.bucket_name, Key=s3_key, UploadId=upload_id)
+            return True
+        except Exception as e:
+            print(f"Error cancelando subida multiparte: {e}")
+            return False
+    
+    def download_file(self, s3_key, destino, callback=None):
+        """
+        Descargar un objeto a un file-like (archivo, SpooledTemporaryFile...)
+        
+        Los objetos grandes se descargan por rangos en paralelo, sin pasar
+        por memoria completos.
+        
+        Returns:
+            bool: True si se descargó correctamente
+        """
+        try:
+            self.s3_client.download_fileobj(
+                self.bucket_name,
+                s3_key,
+                destino,
+                Callback=callback,
+                Config=self.transfer_config
+            )
+            return True
+        except Exception as e:
+            print(f"Error descargando archivo de S3: {e}")
+            return False
+    
+    def delete_file(self, s3_key, size=None):
         """
         Eliminar archivo de S3
         
         Args:
             s3_key: Clave del archivo en S3
+            size: Tamaño en bytes, si ya se conoce (evita un head_object
+                para actualizar el inventario)
         
         Returns:
             bool: True si se eliminó correctamente
         """
         try:
+            if size is None:
+                info = self.get_file_info(s3_key)
+                if info is None:
+                    # No existe: nada que eliminar ni que descontar
+                    return True
+                size = info['size']
             self.s3_client.delete_object(
                 Bucket=self.bucket_name,
                 Key=s3_key
             )
+            storage_inventory.registrar_eliminacion(s3_key, size)
             return True
         except Exception as e:
             print(f"Error eliminando archivo de S3: {e}")
@@ -173,74 +380,81 @@ class S3Service:
         """
         Listar archivos en S3
         
+        Recorre las páginas de list_objects_v2 (máximo 1000 objetos cada una)
+        hasta reunir `max_keys` archivos.
+        
         Args:
             prefix: Prefijo para filtrar archivos
-            max_keys: Número máximo de archivos a listar
+            max_keys: Número máximo de archivos a listar (None = todos)
         
         Returns:
             list: Lista de archivos
         """
         try:
-            response = self.s3_client.list_objects_v2(
-                Bucket=self.bucket_name,
-                Prefix=prefix,
-                MaxKeys=max_keys
-            )
-            
             files = []
-            if 'Contents' in response:
-                for obj in response['Contents']:
-                    files.append({
-                        'key': obj['Key'],
-                        'size': obj['Size'],
-                        'last_modified': obj['LastModified'],
-                        'url': f"{self.base_url}/{obj['Key']}"
-                    })
+            for key, size, last_modified in storage_inventory.recorrer_bucket(
+                self.s3_client, self.bucket_name, prefix
+            ):
+                if max_keys is not None and len(files) >= max_keys:
+                    break
+                files.append({
+                    'key': key,
+                    'size': size,
+                    'last_modified': last_modified,
+                    'url': self.get_public_url(key)
+                })
             
             return files
         except Exception as e:
             print(f"Error listando archivos: {e}")
             return []
     
-    def copy_file(self, source_key, destination_key):
+    def copy_file(self, source_key, destination_key, callback=None):
         """
         Copiar archivo dentro del mismo bucket
         
+        Por encima del umbral multiparte se copia por partes en paralelo
+        (UploadPartCopy), lo que además permite objetos de más de 5 GB.
+        
         Args:
             source_key: Clave del archivo origen
             destination_key: Clave del archivo destino
+            callback: Llamado con los bytes de cada parte copiada
         
         Returns:
             bool: True si se copió correctamente
         """
         try:
             copy_source = {'Bucket': self.bucket_name, 'Key': source_key}
-            self.s3_client.copy_object(
-                CopySource=copy_source,
-                Bucket=self.bucket_name,
-                Key=destination_key
+            self.s3_client.copy(
+                copy_source,
+                self.bucket_name,
+                destination_key,
+                Callback=callback,
+                Config=self.transfer_config
             )
+            info = self.get_file_info(destination_key)
+            storage_inventory.registrar_subida(destination_key, info['size'] if info else 0)
             return True
         except Exception as e:
             print(f"Error copiando archivo: {e}")
             return False
     
-    def get_bucket_size(self):
+    def get_bucket_size(self, prefix="", exacto=False):
         """
-        Obtener el tamaño total del bucket
+        Obtener el tamaño total del bucket (o de un prefijo)
+        
+        Se lee del inventario de almacenamiento, sin listar el bucket. Si el
+        inventario está vacío o se pide `exacto`, se recorren todas las
+        páginas del bucket y se reconstruye el inventario.
         
         Returns:
             int: Tamaño total en bytes
         """
         try:
-            response = self.s3_client.list_objects_v2(Bucket=self.bucket_name)
-            total_size = 0
-            
-            if 'Contents' in response:
-                for obj in response['Contents']:
-                    total_size += obj['Size']
-            
-            return total_size
+            if exacto or not storage_inventory.inventariado():
+                storage_inventory.reconstruir(storage_inventory.recorrer_bucket(self.s3_client, self.bucket_name))
+            return storage_inventory.totales(prefix)[1]
         except Exception as e:
             print(f"Error obteniendo tamaño del bucket: {e}")
             return 0
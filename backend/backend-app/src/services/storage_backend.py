@@ -0,0 +1,509 @@
+import hashlib
+import mimetypes
+import mmap
+import os
+import tempfile
+import threading
+import uuid
+from datetime import datetime
+from botocore.exceptions import ClientError
+from flask import jsonify, redirect, send_file
+from src.services import storage_inventory
+from src.services.document_streaming import content_disposition, responder_flujo
+from src.services.s3_service import s3_service
+
+# Tamaño de cada bloque al copiar o transmitir un objeto
+TAMANO_BLOQUE = 1024 * 1024
+# Directorio por defecto del almacenamiento local (backend-app/storage)
+RUTA_LOCAL_POR_DEFECTO = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'storage'
+)
+# Ruta que sirve los objetos locales (ver resources.serve_storage_object)
+URL_LOCAL_POR_DEFECTO = '/api/resources/storage'
+
+
+class ObjetoNoEncontrado(LookupError):
+    """El objeto no existe en el almacenamiento"""
+
+
+class ClaveInvalida(ValueError):
+    """La clave no es una ruta relativa válida dentro del almacenamiento"""
+
+
+def generar_clave(filename, folder='uploads'):
+    """Clave única para un archivo: '{folder}/AAAA/MM/DD/{uuid}{extension}'"""
+    timestamp = datetime.now().strftime('%Y/%m/%d')
+    return f"{folder}/{timestamp}/{uuid.uuid4()}{os.path.splitext(filename)[1]}"
+
+
+def _tipo_contenido(filename, content_type=None):
+    return content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+def _leer_bloques(file_data, callback=None):
+    """Bloques de un bytes o file-like, avisando a `callback` con los bytes de cada uno"""
+    if isinstance(file_data, (bytes, bytearray, memoryview)):
+        bloques = [bytes(file_data)] if len(file_data) else []
+    else:
+        bloques = iter(lambda: file_data.read(TAMANO_BLOQUE), b'')
+    for bloque in bloques:
+        if callback:
+            callback(len(bloque))
+        yield bloque
+
+
+class BackendAlmacenamiento:
+    """Almacenamiento de objetos (archivos de recursos y contenido).
+
+    Las claves son rutas relativas con '/' ('content/video/2025/03/14/x.mp4').
+    Las rutas de subida y descarga usan esta interfaz; `obtener_almacenamiento`
+    devuelve el backend configurado con STORAGE_BACKEND.
+    """
+    nombre = None
+    # Subida directa del cliente al almacenamiento (POST firmado / multiparte)
+    subida_directa = False
+    # Registrar subidas y eliminaciones en inventario_almacenamiento
+    inventariar = True
+
+    @property
+    def ubicacion(self):
+        """Identificador del almacenamiento (se guarda en Recurso.s3_bucket)"""
+        raise NotImplementedError
+
+    def put(self, key, file_data, content_type=None, callback=None):
+        """
+        Guardar un objeto (bytes o file-like, leído por bloques)
+
+        Returns:
+            int: Tamaño guardado en bytes
+        """
+        tamano = self._put(key, file_data, _tipo_contenido(key, content_type), callback)
+        if self.inventariar:
+            storage_inventory.registrar_subida(key, tamano)
+        return tamano
+
+    def get_range(self, key, inicio=0, fin=None):
+        """Bytes [inicio, fin) del objeto (fin=None: hasta el final)"""
+        raise NotImplementedError
+
+    def stream(self, key, inicio=0, fin=None, tamano_bloque=TAMANO_BLOQUE):
+        """Iterador de bloques de [inicio, fin) sin cargar el objeto completo"""
+        raise NotImplementedError
+
+    def delete(self, key, tamano=None):
+        """
+        Eliminar un objeto
+
+        Args:
+            tamano: Tamaño en bytes si ya se conoce (para el inventario)
+
+        Returns:
+            bool: True si se eliminó (o no existía)
+        """
+        try:
+            if tamano is None:
+                info = self.stat(key)
+                if info is None:
+                    return True
+                tamano = info['size']
+            self._delete(key)
+            if self.inventariar:
+                storage_inventory.registrar_eliminacion(key, tamano)
+            return True
+        except Exception as e:
+            print(f"Error eliminando archivo del almacenamiento: {e}")
+            return False
+
+    def stat(self, key):
+        """dict con size, content_type, last_modified y etag, o None si no existe"""
+        raise NotImplementedError
+
+    def listar(self, prefijo=''):
+        """Iterador de (clave, tamaño, fecha) de todos los objetos bajo el prefijo"""
+        raise NotImplementedError
+
+    def url(self, key):
+        """URL pública del objeto"""
+        raise NotImplementedError
+
+    def subir(self, file_data, filename, content_type=None, folder='uploads', callback=None):
+        """
+        Subir un archivo con una clave nueva
+
+        Returns:
+            dict: s3_key, s3_url, s3_bucket, content_type, size y success
+            (o success=False y error), igual que S3Service.upload_file
+        """
+        try:
+            key = generar_clave(filename, folder=folder)
+            content_type = _tipo_contenido(filename, content_type)
+            tamano = self.put(key, file_data, content_type, callback=callback)
+            return {
+                's3_key': key,
+                's3_url': self.url(key),
+                's3_bucket': self.ubicacion,
+                'content_type': content_type,
+                'size': tamano,
+                'success': True
+            }
+        except Exception as e:
+            return {
+                'error': f'Error de almacenamiento: {str(e)}',
+                'success': False
+            }
+
+    def tamano_total(self, exacto=False):
+        """Bytes almacenados según el inventario (se reconstruye si está vacío o `exacto`)"""
+        if exacto or not storage_inventory.inventariado():
+            storage_inventory.reconstruir(self.listar())
+        return storage_inventory.totales()[1]
+
+    def responder(self, key, nombre=None, mime_type=None, as_attachment=False):
+        """
+        Respuesta HTTP con el objeto (200/206/304/416, o 404 si no existe)
+
+        Por defecto se transmite con `stream`, respetando Range.
+        """
+        info = self.stat(key)
+        if info is None:
+            return jsonify({'error': 'Archivo no encontrado'}), 404
+        return responder_flujo(
+            lambda inicio, fin: self.stream(key, inicio, fin),
+            info['size'],
+            nombre or os.path.basename(key),
+            mime_type or info['content_type'],
+            info['etag'],
+            as_attachment,
+            cache_control='public, max-age=86400'
+        )
+
+    def _put(self, key, file_data, content_type, callback):
+        raise NotImplementedError
+
+    def _delete(self, key):
+        raise NotImplementedError
+
+
+class BackendS3(BackendAlmacenamiento):
+    """Bucket de S3 a través de S3Service (cliente compartido, transferencias multiparte)"""
+    nombre = 's3'
+    subida_directa = True
+
+    def __init__(self, servicio=s3_service):
+        self.servicio = servicio
+
+    @property
+    def ubicacion(self):
+        return self.servicio.bucket_name
+
+    def subir(self, file_data, filename, content_type=None, folder='uploads', callback=None):
+        return self.servicio.upload_file(file_data, filename, content_type, folder=folder, callback=callback)
+
+    def get_range(self, key, inicio=0, fin=None):
+        cuerpo = self._get_object(key, inicio, fin)
+        return cuerpo.read() if cuerpo else b''
+
+    def stream(self, key, inicio=0, fin=None, tamano_bloque=TAMANO_BLOQUE):
+        cuerpo = self._get_object(key, inicio, fin)
+        if cuerpo is None:
+            return
+        try:
+            yield from cuerpo.iter_chunks(tamano_bloque)
+        finally:
+            cuerpo.close()
+
+    def stat(self, key):
+        return self.servicio.get_file_info(key)
+
+    def listar(self, prefijo=''):
+        return storage_inventory.recorrer_bucket(self.servicio.s3_client, self.servicio.bucket_name, prefijo)
+
+    def url(self, key):
+        return self.servicio.get_public_url(key)
+
+    def responder(self, key, nombre=None, mime_type=None, as_attachment=False):
+        """Redirigir a una URL firmada: los bytes van de S3 al cliente sin pasar por el servidor"""
+        parametros = {
+            'Bucket': self.servicio.bucket_name,
+            'Key': key,
+            'ResponseContentDisposition': content_disposition(nombre or os.path.basename(key), as_attachment)
+        }
+        if mime_type:
+            parametros['ResponseContentType'] = mime_type
+        return redirect(self.servicio.s3_client.generate_presigned_url('get_object', Params=parametros, ExpiresIn=3600))
+
+    def _put(self, key, file_data, content_type, callback):
+        return self.servicio.put_object(key, file_data, content_type, callback=callback)
+
+    def _delete(self, key):
+        self.servicio.s3_client.delete_object(Bucket=self.servicio.bucket_name, Key=key)
+
+    def _get_object(self, key, inicio, fin):
+        """Cuerpo de get_object para [inicio, fin), o None si el intervalo está vacío"""
+        if fin is not None and fin <= inicio:
+            return None
+        rango = f"bytes={inicio}-{'' if fin is None else fin - 1}"
+        try:
+            return self.servicio.s3_client.get_object(Bucket=self.servicio.bucket_name, Key=key, Range=rango)['Body']
+        except ClientError as e:
+            codigo = e.response['Error']['Code']
+            if codigo in ('NoSuchKey', '404'):
+                raise ObjetoNoEncontrado(key)
+            if codigo == 'InvalidRange':
+                return None
+            raise
+
+
+class BackendSistemaArchivos(BackendAlmacenamiento):
+    """Directorio local: lecturas por mmap y descargas con sendfile.
+
+    Las descargas usan send_file sobre la ruta del archivo; con un servidor
+    que implementa wsgi.file_wrapper (gunicorn, uWSGI) el kernel copia el
+    archivo al socket sin pasar por Python. `get_range` y `stream` leen de
+    un mmap del archivo, sin read() intermedios.
+    """
+    nombre = 'filesystem'
+
+    def __init__(self, raiz=RUTA_LOCAL_POR_DEFECTO, url_base=URL_LOCAL_POR_DEFECTO):
+        self.raiz = os.path.realpath(raiz)
+        self.url_base = url_base.rstrip('/')
+        os.makedirs(self.raiz, exist_ok=True)
+
+    @property
+    def ubicacion(self):
+        return 'local'
+
+    def ruta(self, key):
+        """Ruta absoluta de una clave; rechaza claves fuera de la raíz"""
+        ruta = os.path.realpath(os.path.join(self.raiz, *key.split('/')))
+        if not key or os.path.commonpath([self.raiz, ruta]) != self.raiz or ruta == self.raiz:
+            raise ClaveInvalida(f'Clave no válida: {key}')
+        return ruta
+
+    def get_range(self, key, inicio=0, fin=None):
+        with self._mapa(key) as mapa:
+            return mapa[inicio:fin] if mapa is not None else b''
+
+    def stream(self, key, inicio=0, fin=None, tamano_bloque=TAMANO_BLOQUE):
+        with self._mapa(key) as mapa:
+            if mapa is None:
+                return
+            fin = len(mapa) if fin is None else min(fin, len(mapa))
+            if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                mapa.madvise(mmap.MADV_SEQUENTIAL)
+            for posicion in range(inicio, fin, tamano_bloque):
+                yield mapa[posicion:min(posicion + tamano_bloque, fin)]
+
+    def stat(self, key):
+        try:
+            info = os.stat(self.ruta(key))
+        except FileNotFoundError:
+            return None
+        return {
+            'size': info.st_size,
+            'content_type': _tipo_contenido(key),
+            'last_modified': datetime.fromtimestamp(info.st_mtime),
+            'etag': f'{info.st_mtime_ns:x}-{info.st_size:x}'
+        }
+
+    def listar(self, prefijo=''):
+        for directorio, subdirectorios, archivos in os.walk(self.raiz):
+            subdirectorios.sort()
+            for archivo in sorted(archivos):
+                if archivo.startswith('.tmp-'):
+                    continue
+                ruta = os.path.join(directorio, archivo)
+                key = os.path.relpath(ruta, self.raiz).replace(os.sep, '/')
+                if key.startswith(prefijo):
+                    info = os.stat(ruta)
+                    yield key, info.st_size, datetime.fromtimestamp(info.st_mtime)
+
+    def url(self, key):
+        return f'{self.url_base}/{key}'
+
+    def responder(self, key, nombre=None, mime_type=None, as_attachment=False):
+        ruta = self.ruta(key)
+        if not os.path.isfile(ruta):
+            return jsonify({'error': 'Archivo no encontrado'}), 404
+        # conditional=True: ETag, If-None-Match y Range los resuelve Werkzeug
+        return send_file(
+            ruta,
+            mimetype=mime_type or _tipo_contenido(key),
+            as_attachment=as_attachment,
+            download_name=nombre or os.path.basename(key),
+            conditional=True,
+            max_age=86400
+        )
+
+    def _put(self, key, file_data, content_type, callback):
+        ruta = self.ruta(key)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        # Escribir en un temporal del mismo directorio y renombrar: nadie ve el archivo a medias
+        descriptor, temporal = tempfile.mkstemp(prefix='.tmp-', dir=os.path.dirname(ruta))
+        try:
+            tamano = 0
+            with os.fdopen(descriptor, 'wb') as destino:
+                for bloque in _leer_bloques(file_data, callback):
+                    destino.write(bloque)
+                    tamano += len(bloque)
+            os.replace(temporal, ruta)
+            return tamano
+        except BaseException:
+            os.unlink(temporal)
+            raise
+
+    def _delete(self, key):
+        ruta = self.ruta(key)
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            return
+        # Quitar los directorios de fecha que queden vacíos
+        directorio = os.path.dirname(ruta)
+        while directorio != self.raiz:
+            try:
+                os.rmdir(directorio)
+            except OSError:
+                break
+            directorio = os.path.dirname(directorio)
+
+    def _mapa(self, key):
+        return _MapaArchivo(self.ruta(key), key)
+
+
+class _MapaArchivo:
+    """Context manager: mmap de solo lectura de un archivo (None si está vacío)"""
+
+    def __init__(self, ruta, key):
+        self.ruta = ruta
+        self.key = key
+        self.mapa = None
+
+    def __enter__(self):
+        try:
+            with open(self.ruta, 'rb') as archivo:
+                # El mapa sigue válido después de cerrar el descriptor
+                if os.fstat(archivo.fileno()).st_size:
+                    self.mapa = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            raise ObjetoNoEncontrado(self.key)
+        return self.mapa
+
+    def __exit__(self, *exc):
+        if self.mapa is not None:
+            self.mapa.close()
+
+
+class BackendMemoria(BackendAlmacenamiento):
+    """Objetos en un dict del proceso: pruebas y benchmarks de I/O sin red ni disco"""
+    nombre = 'memoria'
+    inventariar = False
+
+    def __init__(self, url_base=URL_LOCAL_POR_DEFECTO):
+        self.url_base = url_base.rstrip('/')
+        self._objetos = {}
+        self._lock = threading.Lock()
+
+    @property
+    def ubicacion(self):
+        return 'memoria'
+
+    def get_range(self, key, inicio=0, fin=None):
+        return bytes(self._datos(key)[inicio:fin])
+
+    def stream(self, key, inicio=0, fin=None, tamano_bloque=TAMANO_BLOQUE):
+        datos = self._datos(key)
+        fin = len(datos) if fin is None else min(fin, len(datos))
+        for posicion in range(inicio, fin, tamano_bloque):
+            yield bytes(datos[posicion:min(posicion + tamano_bloque, fin)])
+
+    def stat(self, key):
+        objeto = self._objetos.get(key)
+        if objeto is None:
+            return None
+        datos, content_type, fecha, etag = objeto
+        return {'size': len(datos), 'content_type': content_type, 'last_modified': fecha, 'etag': etag}
+
+    def listar(self, prefijo=''):
+        with self._lock:
+            objetos = sorted(self._objetos.items())
+        for key, (datos, _, fecha, _) in objetos:
+            if key.startswith(prefijo):
+                yield key, len(datos), fecha
+
+    def url(self, key):
+        return f'{self.url_base}/{key}'
+
+    def tamano_total(self, exacto=False):
+        return sum(tamano for _, tamano, _ in self.listar())
+
+    def _put(self, key, file_data, content_type, callback):
+        datos = b''.join(_leer_bloques(file_data, callback))
+        with self._lock:
+            self._objetos[key] = (datos, content_type, datetime.utcnow(), hashlib.md5(datos).hexdigest())
+        return len(datos)
+
+    def _delete(self, key):
+        with self._lock:
+            self._objetos.pop(key, None)
+
+    def _datos(self, key):
+        objeto = self._objetos.get(key)
+        if objeto is None:
+            raise ObjetoNoEncontrado(key)
+        # memoryview: los cortes no copian hasta convertirlos a bytes
+        return memoryview(objeto[0])
+
+
+_almacenamiento = None
+_lock = threading.Lock()
+
+
+def crear_backend(nombre=None):
+    """
+    Crear el backend indicado (por defecto STORAGE_BACKEND: s3, filesystem o memoria)
+
+    filesystem usa STORAGE_LOCAL_PATH como raíz y STORAGE_PUBLIC_URL como
+    base de las URLs públicas (p. ej. un nginx que sirva el directorio).
+    """
+    nombre = (nombre or os.getenv('STORAGE_BACKEND', 's3')).lower()
+    url_base = os.getenv('STORAGE_PUBLIC_URL') or URL_LOCAL_POR_DEFECTO
+    if nombre == 's3':
+        return BackendS3()
+    if nombre == 'filesystem':
+        return BackendSistemaArchivos(os.getenv('STORAGE_LOCAL_PATH') or RUTA_LOCAL_POR_DEFECTO, url_base)
+    if nombre == 'memoria':
+        return BackendMemoria(url_base)
+    raise ValueError(f'Backend de almacenamiento desconocido: {nombre}')
+
+
+def obtener_almacenamiento():
+    """Backend de almacenamiento del proceso, creado la primera vez que se usa"""
+    global _almacenamiento
+    if _almacenamiento is None:
+        with _lock:
+            if _almacenamiento is None:
+                _almacenamiento = crear_backend()
+    return _almacenamiento
+
+
+def configurar_almacenamiento(backend):
+    """Reemplazar el backend del proceso (pruebas, benchmarks); None vuelve al configurado"""
+    global _almacenamiento
+    with _lock:
+        _almacenamiento = backend
+
+
+def almacenamiento_de(ubicacion):
+    """
+    Backend que guarda los objetos de una ubicación (Recurso.s3_bucket)
+
+    Los recursos subidos a S3 antes de cambiar STORAGE_BACKEND siguen en el
+    bucket configurado; para otra ubicación desconocida devuelve None.
+    """
+    backend = obtener_almacenamiento()
+    if ubicacion in (None, backend.ubicacion):
+        return backend
+    if ubicacion == s3_service.bucket_name:
+        return BackendS3()
+    return None
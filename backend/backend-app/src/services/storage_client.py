@@ -0,0 +1,61 @@
+import os
+import threading
+import boto3
+from botocore.config import Config
+
+# Conexiones HTTP reutilizables por cliente; debe cubrir S3_MAX_CONCURRENCY
+# de las transferencias multiparte más las peticiones simultáneas de los hilos
+MAX_POOL_CONNECTIONS = int(os.getenv('S3_MAX_POOL_CONNECTIONS', '32'))
+
+_cliente = None
+_pid = None
+_lock = threading.Lock()
+
+
+def configuracion_cliente():
+    """Config de botocore compartida por todas las llamadas al almacenamiento"""
+    return Config(
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        # Reintentos con backoff por petición (incluye cada parte de una subida multiparte)
+        retries={'max_attempts': 5, 'mode': 'standard'},
+        # Mantener vivas las conexiones TLS entre peticiones (e invocaciones de Lambda)
+        tcp_keepalive=True,
+        connect_timeout=5,
+        read_timeout=60
+    )
+
+
+def obtener_cliente_s3():
+    """
+    Cliente S3 único por proceso, creado la primera vez que se usa
+
+    Construir un cliente cuesta decenas de milisegundos y cada uno tiene su
+    propio pool de conexiones; compartirlo evita repetir ese costo y los
+    handshakes TLS. Los clientes de boto3 son seguros entre hilos. En Lambda
+    el módulo sobrevive entre invocaciones calientes, así que el cliente (y
+    sus conexiones) también. Tras un fork se crea uno nuevo.
+
+    S3_ENDPOINT_URL permite usar un S3 local (MinIO, moto).
+    """
+    global _cliente, _pid
+    if _cliente is not None and _pid == os.getpid():
+        return _cliente
+    with _lock:
+        if _cliente is None or _pid != os.getpid():
+            _cliente = boto3.client(
+                's3',
+                aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
+                aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
+                region_name=os.getenv('AWS_REGION', 'us-east-1'),
+                endpoint_url=os.getenv('S3_ENDPOINT_URL') or None,
+                config=configuracion_cliente()
+            )
+            _pid = os.getpid()
+    return _cliente
+
+
+def reiniciar_cliente():
+    """Descartar el cliente compartido (p. ej. tras cambiar credenciales)"""
+    global _cliente
+    with _lock:
+        _cliente = None
@@ -0,0 +1,123 @@
+import logging
+import posixpath
+from flask import has_app_context
+from sqlalchemy import func, or_
+from src.models import db, InventarioAlmacenamiento
+
+logger = logging.getLogger(__name__)
+
+# Objetos por página al listar el bucket (máximo de S3)
+TAMANO_PAGINA = 1000
+
+
+def prefijo_de(s3_key):
+    """Prefijo (directorio) de una clave: 'uploads/2025/03/14/x.pdf' -> 'uploads/2025/03/14'"""
+    return posixpath.dirname(s3_key)
+
+
+def registrar_subida(s3_key, tamano):
+    """Sumar un objeto nuevo al inventario"""
+    _registrar({prefijo_de(s3_key): (1, tamano or 0)})
+
+
+def registrar_eliminacion(s3_key, tamano):
+    """Restar un objeto eliminado del inventario"""
+    _registrar({prefijo_de(s3_key): (-1, -(tamano or 0))})
+
+
+def _registrar(deltas):
+    """Aplicar deltas en una transacción propia; el inventario nunca hace fallar la operación"""
+    if not has_app_context():
+        logger.warning("Inventario de almacenamiento sin contexto de aplicación; cambio omitido")
+        return
+    try:
+        with db.engine.begin() as conexion:
+            InventarioAlmacenamiento.aplicar_deltas(conexion, deltas)
+    except Exception as e:
+        logger.error(f"Error actualizando inventario de almacenamiento: {str(e)}")
+
+
+def recorrer_bucket(s3_client, bucket, prefijo=''):
+    """Todos los objetos del bucket (todas las páginas de list_objects_v2): (clave, tamaño, fecha)"""
+    paginador = s3_client.get_paginator('list_objects_v2')
+    for pagina in paginador.paginate(Bucket=bucket, Prefix=prefijo, PaginationConfig={'PageSize': TAMANO_PAGINA}):
+        for obj in pagina.get('Contents', []):
+            yield obj['Key'], obj['Size'], obj['LastModified']
+
+
+def reconstruir(objetos):
+    """
+    Recalcular el inventario completo a partir de un listado del almacenamiento
+
+    Args:
+        objetos: Iterable de (clave, tamaño, fecha), p. ej. recorrer_bucket()
+            o BackendAlmacenamiento.listar()
+
+    Reemplaza todas las filas en una transacción, así que las lecturas ven el
+    inventario anterior hasta que termina.
+
+    Returns:
+        tuple: (objetos, bytes) del bucket
+    """
+    deltas = {}
+    for s3_key, tamano, _ in objetos:
+        cantidad, total = deltas.get(prefijo_de(s3_key), (0, 0))
+        deltas[prefijo_de(s3_key)] = (cantidad + 1, total + tamano)
+
+    with db.engine.begin() as conexion:
+        conexion.execute(InventarioAlmacenamiento.__table__.delete())
+        InventarioAlmacenamiento.aplicar_deltas(conexion, deltas)
+    return sum(o for o, _ in deltas.values()), sum(b for _, b in deltas.values())
+
+
+def _filtro_prefijo(prefijo):
+    prefijo = prefijo.strip('/')
+    if not prefijo:
+        return None
+    escapado = prefijo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return or_(
+        InventarioAlmacenamiento.prefijo == prefijo,
+        InventarioAlmacenamiento.prefijo.like(f'{escapado}/%', escape='\\')
+    )
+
+
+def inventariado():
+    """True si el inventario tiene datos (ya se construyó al menos una vez)"""
+    return db.session.query(InventarioAlmacenamiento.prefijo).first() is not None
+
+
+def totales(prefijo=''):
+    """(objetos, bytes) bajo un prefijo ('' = todo el bucket), sin listar el bucket"""
+    query = db.session.query(
+        func.coalesce(func.sum(InventarioAlmacenamiento.objetos), 0),
+        func.coalesce(func.sum(InventarioAlmacenamiento.bytes), 0)
+    )
+    filtro = _filtro_prefijo(prefijo)
+    if filtro is not None:
+        query = query.filter(filtro)
+    objetos, total = query.one()
+    return int(objetos), int(total)
+
+
+def resumen(niveles=2):
+    """
+    Objetos y bytes agrupados por los primeros `niveles` segmentos del prefijo
+
+    Con niveles=2: 'content/video', 'content/documento', 'uploads/2025', ...
+
+    Returns:
+        list: [{'prefijo', 'objetos', 'bytes'}] ordenada por bytes (desc)
+    """
+    grupos = {}
+    for prefijo, objetos, total in db.session.query(
+        InventarioAlmacenamiento.prefijo, InventarioAlmacenamiento.objetos, InventarioAlmacenamiento.bytes
+    ):
+        grupo = '/'.join(prefijo.split('/')[:niveles])
+        acumulado = grupos.setdefault(grupo, [0, 0])
+        acumulado[0] += objetos
+        acumulado[1] += total
+    return sorted(
+        ({'prefijo': grupo, 'objetos': objetos, 'bytes': total} for grupo, (objetos, total) in grupos.items() if objetos),
+        key=lambda g: g['bytes'],
+        reverse=True
+    )
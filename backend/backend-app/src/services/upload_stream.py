@@ -0,0 +1,129 @@
+import tempfile
+from werkzeug.sansio.multipart import MultipartDecoder, Field, File, Data, Epilogue, NeedData  # pyright: ignore[reportMissingImports]
+
+# Tamaño de lectura del cuerpo de la petición
+CHUNK_SIZE = 64 * 1024
+# Por encima de este tamaño cada archivo se vuelca a disco
+SPOOL_MAX_MEMORIA = 1024 * 1024
+# Límite para campos de texto (no archivos)
+MAX_BYTES_CAMPO = 64 * 1024
+
+
+class ArchivoDemasiadoGrande(Exception):
+    """Una parte del formulario supera el tamaño permitido"""
+    def __init__(self, campo, limite):
+        super().__init__(f'El archivo {campo} supera el límite de {limite} bytes')
+        self.campo = campo
+        self.limite = limite
+
+
+class FormularioInvalido(Exception):
+    """El cuerpo multipart no se pudo interpretar"""
+
+
+class ArchivoSubido:
+    """Archivo recibido en streaming, guardado en un SpooledTemporaryFile"""
+
+    def __init__(self, campo, nombre, content_type=None):
+        self.campo = campo
+        self.nombre = nombre
+        self.content_type = content_type
+        self.tamano = 0
+        self.archivo = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORIA)
+
+    def escribir(self, datos):
+        self.tamano += len(datos)
+        self.archivo.write(datos)
+
+    def __len__(self):
+        return self.tamano
+
+    def leer(self):
+        """Leer el contenido completo (para guardarlo en el almacén de documentos)"""
+        self.archivo.seek(0)
+        return self.archivo.read()
+
+    def cerrar(self):
+        self.archivo.close()
+
+
+def leer_multipart(stream, boundary, max_bytes_archivo, chunk_size=CHUNK_SIZE):
+    """
+    Leer un cuerpo multipart/form-data en streaming
+
+    Cada archivo se escribe por trozos en un archivo temporal y se rechaza en
+    cuanto supera `max_bytes_archivo`, sin terminar de leerlo ni acumularlo
+    en memoria.
+
+    Args:
+        stream: Flujo de entrada (request.stream)
+        boundary: Delimitador multipart (bytes o str)
+        max_bytes_archivo: Tamaño máximo por archivo en bytes
+        chunk_size: Tamaño de cada lectura del flujo
+
+    Returns:
+        tuple: (campos, archivos) con dict {nombre: str} y dict {nombre: ArchivoSubido}
+
+    Raises:
+        ArchivoDemasiadoGrande: si algún archivo supera el límite
+        FormularioInvalido: si el cuerpo está mal formado
+    """
+    if not boundary:
+        raise FormularioInvalido('Falta el delimitador del formulario multipart')
+    if isinstance(boundary, str):
+        boundary = boundary.encode('latin-1')
+
+    # Los límites se aplican por parte más abajo, no sobre el búfer del decodificador
+    decoder = MultipartDecoder(boundary)
+    campos = {}
+    archivos = {}
+    actual = None  # ('campo', nombre, bytearray) o ('archivo', ArchivoSubido)
+
+    try:
+        while True:
+            event = decoder.next_event()
+            if isinstance(event, NeedData):
+                chunk = stream.read(chunk_size)
+                # Un trozo vacío indica fin del flujo
+                decoder.receive_data(chunk or None)
+                continue
+            if isinstance(event, Epilogue):
+                break
+            if isinstance(event, File):
+                subido = ArchivoSubido(event.name, event.filename, event.headers.get('Content-Type'))
+                archivos[event.name] = subido
+                actual = ('archivo', subido)
+            elif isinstance(event, Field):
+                actual = ('campo', event.name, bytearray())
+            elif isinstance(event, Data):
+                if actual is None:
+                    raise FormularioInvalido('Datos fuera de una parte del formulario')
+                if actual[0] == 'archivo':
+                    subido = actual[1]
+                    if subido.tamano + len(event.data) > max_bytes_archivo:
+                        raise ArchivoDemasiadoGrande(subido.campo, max_bytes_archivo)
+                    subido.escribir(event.data)
+                else:
+                    valor = actual[2]
+                    if len(valor) + len(event.data) > MAX_BYTES_CAMPO:
+                        raise FormularioInvalido(f'El campo {actual[1]} es demasiado largo')
+                    valor.extend(event.data)
+                    if not event.more_data:
+                        campos[actual[1]] = valor.decode('utf-8')
+    except (ArchivoDemasiadoGrande, FormularioInvalido):
+        for subido in archivos.values():
+            subido.cerrar()
+        raise
+    except ValueError as e:
+        for subido in archivos.values():
+            subido.cerrar()
+        raise FormularioInvalido(f'Formulario multipart inválido: {str(e)}')
+
+    return campos, archivos
+
+
+def tamano_base64(valor):
+    """Tamaño decodificado aproximado de una cadena base64, sin decodificarla"""
+    if not isinstance(valor, str):
+        return 0
+    return (len(valor) * 3) // 4 - valor.count('=', len(valor) - 2)
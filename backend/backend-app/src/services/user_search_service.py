@@ -0,0 +1,119 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, func, or_
+from src.models import db, User
+
+# Límite de usuarios por página en el listado por cursor
+MAX_POR_PAGINA = 100
+
+# Orden del directorio; coincide con el índice idx_user_directorio
+ORDEN_DIRECTORIO = (User.fecha_creacion.desc().nullslast(), User.id.desc())
+
+
+def filtrar_busqueda(query, termino):
+    """
+    Filtrar por nombre, apellido, email o número de documento (contiene, sin mayúsculas)
+
+    Cada columna tiene un índice GIN pg_trgm (scripts/create_user_search_indexes.sql),
+    así que PostgreSQL resuelve el OR con un BitmapOr de índices en lugar de
+    recorrer toda la tabla. Con menos de 3 caracteres el índice no ayuda.
+    """
+    patron = f"%{termino}%"
+    return query.filter(
+        (User.nombre.ilike(patron)) |
+        (User.apellido.ilike(patron)) |
+        (User.email.ilike(patron)) |
+        (User.numero_documento.ilike(patron))
+    )
+
+
+def codificar_cursor(user):
+    """Cursor opaco con la posición (fecha_creacion, id) del último usuario de la página"""
+    fecha = user.fecha_creacion.isoformat() if user.fecha_creacion else None
+    datos = json.dumps([fecha, user.id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(datos).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """
+    Leer un cursor de `codificar_cursor`
+
+    Raises:
+        ValueError: si el cursor no es válido
+    """
+    try:
+        datos = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        fecha, user_id = json.loads(datos)
+        return (datetime.fromisoformat(fecha) if fecha else None), int(user_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Cursor no válido') from e
+
+
+def despues_de(query, cursor):
+    """Filtrar las filas posteriores al cursor según ORDEN_DIRECTORIO (sin OFFSET)"""
+    fecha, user_id = decodificar_cursor(cursor)
+    if fecha is None:
+        # Los usuarios sin fecha van al final, ordenados por id
+        return query.filter(User.fecha_creacion.is_(None), User.id < user_id)
+    return query.filter(or_(
+        User.fecha_creacion < fecha,
+        and_(User.fecha_creacion == fecha, User.id < user_id),
+        User.fecha_creacion.is_(None)
+    ))
+
+
+def pagina_por_cursor(query, cursor=None, por_pagina=20):
+    """
+    Obtener una página del directorio por keyset
+
+    Se pide una fila de más para saber si hay página siguiente, así que no
+    hace falta un COUNT.
+
+    Args:
+        query: Consulta de User ya filtrada
+        cursor: Cursor devuelto en la página anterior (None o '' para la primera)
+        por_pagina: Tamaño de página (máximo MAX_POR_PAGINA)
+
+    Returns:
+        tuple: (usuarios, siguiente_cursor o None)
+    """
+    por_pagina = max(1, min(por_pagina, MAX_POR_PAGINA))
+    if cursor:
+        query = despues_de(query, cursor)
+    filas = query.order_by(*ORDEN_DIRECTORIO).limit(por_pagina + 1).all()
+
+    siguiente = None
+    if len(filas) > por_pagina:
+        filas = filas[:por_pagina]
+        siguiente = codificar_cursor(filas[-1])
+    return filas, siguiente
+
+
+def contar_exacto(query):
+    """COUNT(*) con los mismos filtros, sin las columnas ni subconsultas del listado"""
+    return query.order_by(None).with_entities(func.count(User.id)).scalar()
+
+
+def contar_aproximado(query):
+    """
+    Estimación de filas del planificador de PostgreSQL (EXPLAIN), sin ejecutar la consulta
+
+    En otros motores se hace un COUNT exacto.
+
+    Returns:
+        int: Número estimado de filas
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return contar_exacto(query)
+
+    compilado = query.order_by(None).with_entities(User.id).statement.compile(
+        dialect=db.engine.dialect,
+        compile_kwargs={'render_postcompile': True}
+    )
+    plan = db.session.connection().exec_driver_sql(
+        f'EXPLAIN (FORMAT JSON) {compilado}', compilado.params
+    ).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
@@ -5,8 +5,10 @@ const ActivityLogs = () => {
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState(null)
   const [pagination, setPagination] = useState({})
+  // Cursores de las páginas anteriores (la API pagina por keyset, sin total)
+  const [anteriores, setAnteriores] = useState([])
   const [filters, setFilters] = useState({
-    page: 1,
+    cursor: '',
     per_page: 50,
     usuario_id: '',
     accion: ''
@@ -42,12 +44,19 @@ const ActivityLogs = () => {
     setFilters(prev => ({
       ...prev,
       [key]: value,
-      page: 1
+      cursor: ''
     }))
+    setAnteriores([])
   }
 
-  const handlePageChange = (page) => {
-    setFilters(prev => ({ ...prev, page }))
+  const handleNextPage = () => {
+    setAnteriores(prev => [...prev, filters.cursor])
+    setFilters(prev => ({ ...prev, cursor: pagination.next_cursor }))
+  }
+
+  const handlePrevPage = () => {
+    setFilters(prev => ({ ...prev, cursor: anteriores[anteriores.length - 1] }))
+    setAnteriores(prev => prev.slice(0, -1))
   }
 
   const getActionIcon = (action) => {
@@ -226,27 +235,25 @@ const ActivityLogs = () => {
       </div>
 
       {/* Paginación */}
-      {pagination.pages > 1 && (
+      {(pagination.has_next || anteriores.length > 0) && (
         <div className="bg-white rounded-lg shadow-sm p-4">
           <div className="flex items-center justify-between">
             <div className="text-sm text-gray-700">
-              Mostrando {((pagination.page - 1) * pagination.per_page) + 1} a{' '}
-              {Math.min(pagination.page * pagination.per_page, pagination.total)} de{' '}
-              {pagination.total} resultados
+              Mostrando {logs.length} registros
             </div>
             <div className="flex space-x-2">
               <button
-                onClick={() => handlePageChange(pagination.page - 1)}
-                disabled={!pagination.has_prev}
+                onClick={handlePrevPage}
+                disabled={anteriores.length === 0}
                 className="px-3 py-2 border border-gray-300 rounded-lg text-sm font-medium text-gray-700 hover:bg-gray-50 disabled:opacity-50 disabled:cursor-not-allowed"
               >
                 Anterior
               </button>
               <span className="px-3 py-2 text-sm text-gray-700">
-                Página {pagination.page} de {pagination.pages}
+                Página {anteriores.length + 1}
               </span>
               <button
-                onClick={() => handlePageChange(pagination.page + 1)}
+                onClick={handleNextPage}
                 disabled={!pagination.has_next}
                 className="px-3 py-2 border border-gray-300 rounded-lg text-sm font-medium text-gray-700 hover:bg-gray-50 disabled:opacity-50 disabled:cursor-not-allowed"
               >
@@ -265,15 +272,15 @@ const ActivityLogs = () => {
           </h3>
           <div className="space-y-3">
             <div className="flex justify-between items-center">
-              <span className="text-sm text-gray-600">Total de logs</span>
+              <span className="text-sm text-gray-600">Logs en esta página</span>
               <span className="text-sm font-medium text-gray-900">
-                {pagination.total?.toLocaleString() || 0}
+                {logs.length}
               </span>
             </div>
             <div className="flex justify-between items-center">
               <span className="text-sm text-gray-600">Página actual</span>
               <span className="text-sm font-medium text-gray-900">
-                {pagination.page} de {pagination.pages}
+                {anteriores.length + 1}{pagination.has_next ? '' : ' (última)'}
               </span>
             </div>
             <div className="flex justify-between items-center">
@@ -314,7 +321,7 @@ const ActivityLogs = () => {
           </h3>
           <div className="space-y-2">
             <button
-              onClick={() => setFilters({ page: 1, per_page: 50, usuario_id: '', accion: '' })}
+              onClick={() => { setFilters({ cursor: '', per_page: 50, usuario_id: '', accion: '' }); setAnteriores([]) }}
               className="w-full bg-green-600 hover:bg-green-700 text-white px-3 py-2 rounded-lg text-sm font-medium"
             >
               🔄 Limpiar Filtros
@@ -3,6 +3,7 @@ import { Button } from '@/components/ui/button'
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card'
 import { Input } from '@/components/ui/input'
 import { Label } from '@/components/ui/label'
+import { exportarArchivo } from '@/lib/exportaciones'
 
 const CuposConfig = () => {
   const [modo, setModo] = useState('abierto')
@@ -17,6 +18,7 @@ const CuposConfig = () => {
   const [sortDir, setSortDir] = useState('desc') // asc | desc
   const [loading, setLoading] = useState(false)
   const [msg, setMsg] = useState('')
+  const [exportando, setExportando] = useState(false)
 
   const loadData = async () => {
     try {
@@ -84,6 +86,18 @@ const CuposConfig = () => {
     }
   }
 
+  const exportarEstado = async () => {
+    setExportando(true)
+    setMsg('')
+    try {
+      await exportarArchivo('/api/admin/cupos/estado/export')
+    } catch (e) {
+      setMsg(e.message || 'Error al exportar')
+    } finally {
+      setExportando(false)
+    }
+  }
+
   const updateItem = (idx, value) => {
     setItems(prev => prev.map((it, i) => i === idx ? { ...it, cupo_max: value } : it))
   }
@@ -239,7 +253,7 @@ const CuposConfig = () => {
             </table>
           </div>
           <Button onClick={saveMunicipios} disabled={loading}>{loading ? 'Guardando...' : 'Guardar Cupos por Municipio'}</Button>
-          <a href="/api/admin/cupos/estado/export" className="inline-block ml-3 text-sm text-green-700 underline">Exportar Excel</a>
+          <button type="button" onClick={exportarEstado} disabled={exportando} className="inline-block ml-3 text-sm text-green-700 underline">{exportando ? 'Exportando...' : 'Exportar Excel'}</button>
         </CardContent>
       </Card>
     </div>
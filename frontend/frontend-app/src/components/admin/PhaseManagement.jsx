@@ -6,6 +6,7 @@ import { Input } from '../ui/input'
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '../ui/select'
 import { Badge } from '../ui/badge'
 import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from '../ui/table'
+import { exportarArchivo } from '@/lib/exportaciones'
 
 const PhaseManagement = () => {
   const [users, setUsers] = useState([])
@@ -76,23 +77,9 @@ const PhaseManagement = () => {
 
   const exportPhaseReport = async () => {
     try {
-      const response = await fetch('/api/admin/export/phases', {
-        credentials: 'include'
-      })
-
-      if (response.ok) {
-        const blob = await response.blob()
-        const url = window.URL.createObjectURL(blob)
-        const a = document.createElement('a')
-        a.href = url
-        a.download = `reporte_fases_${new Date().toISOString().split('T')[0]}.xlsx`
-        document.body.appendChild(a)
-        a.click()
-        window.URL.revokeObjectURL(url)
-        document.body.removeChild(a)
-      }
+      await exportarArchivo('/api/admin/export/phases')
     } catch (error) {
-      alert('Error al exportar reporte')
+      alert(error.message || 'Error al exportar reporte')
     }
   }
 
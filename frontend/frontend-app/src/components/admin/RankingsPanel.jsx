@@ -4,6 +4,7 @@ import { Button } from '@/components/ui/button';
 import { Badge } from '@/components/ui/badge';
 import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from '@/components/ui/table';
 import { toast } from 'sonner';
+import { exportarArchivo } from '@/lib/exportaciones';
 import { Download, Trophy, Medal, Award, User, Calendar, MapPin } from 'lucide-react';
 
 const RankingsPanel = () => {
@@ -37,26 +38,10 @@ const RankingsPanel = () => {
   const exportarExcel = async () => {
     try {
       setExporting(true);
-      const response = await fetch('/api/admin/evaluaciones/exportar', {
-        credentials: 'include'
-      });
-
-      if (response.ok) {
-        const blob = await response.blob();
-        const url = window.URL.createObjectURL(blob);
-        const a = document.createElement('a');
-        a.href = url;
-        a.download = `rankings_evaluaciones_${new Date().toISOString().split('T')[0]}.xlsx`;
-        document.body.appendChild(a);
-        a.click();
-        window.URL.revokeObjectURL(url);
-        document.body.removeChild(a);
-        toast.success('Archivo exportado exitosamente');
-      } else {
-        toast.error('Error al exportar archivo');
-      }
+      await exportarArchivo('/api/admin/evaluaciones/exportar');
+      toast.success('Archivo exportado exitosamente');
     } catch (error) {
-      toast.error('Error de conexión');
+      toast.error(error.message || 'Error al exportar archivo');
     } finally {
       setExporting(false);
     }
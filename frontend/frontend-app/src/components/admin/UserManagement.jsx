@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react'
 import SearchInput from '../common/SearchInput'
+import { exportarArchivo } from '@/lib/exportaciones'
 
 const UserManagement = () => {
   const [users, setUsers] = useState([])
@@ -124,23 +125,9 @@ const UserManagement = () => {
 
   const handleExport = async () => {
     try {
-      const response = await fetch('/api/admin/users/export', {
-        credentials: 'include'
-      })
-      
-      if (response.ok) {
-        const blob = await response.blob()
-        const url = window.URL.createObjectURL(blob)
-        const a = document.createElement('a')
-        a.href = url
-        a.download = 'usuarios_registrados.xlsx'
-        document.body.appendChild(a)
-        a.click()
-        window.URL.revokeObjectURL(url)
-        document.body.removeChild(a)
-      }
+      await exportarArchivo('/api/admin/users/export')
     } catch (error) {
-      setError('Error al exportar')
+      setError(error.message || 'Error al exportar')
     }
   }
 
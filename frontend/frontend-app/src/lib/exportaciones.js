@@ -0,0 +1,37 @@
+// Exportaciones en segundo plano: el endpoint encola el trabajo (202), se
+// consulta su estado hasta que el worker lo completa y se descarga el archivo.
+
+const INTERVALO_CONSULTA_MS = 2000
+
+const esperar = (ms) => new Promise((resolve) => setTimeout(resolve, ms))
+
+const leerTrabajo = async (response) => {
+  const data = await response.json().catch(() => ({}))
+  if (!response.ok) {
+    throw new Error(data.error || 'Error al exportar')
+  }
+  return data.trabajo
+}
+
+export async function exportarArchivo(url, { onProgreso } = {}) {
+  let trabajo = await leerTrabajo(await fetch(url, { credentials: 'include' }))
+
+  while (trabajo.estado === 'pendiente' || trabajo.estado === 'en_proceso') {
+    onProgreso?.(trabajo.progreso || 0)
+    await esperar(INTERVALO_CONSULTA_MS)
+    trabajo = await leerTrabajo(await fetch(`/api/admin/exportaciones/${trabajo.id}`, { credentials: 'include' }))
+  }
+
+  if (trabajo.estado !== 'completado') {
+    throw new Error(trabajo.mensaje || 'La exportación falló')
+  }
+
+  // El servidor responde con Content-Disposition: attachment
+  const a = document.createElement('a')
+  a.href = `/api/admin/exportaciones/${trabajo.id}/descarga`
+  a.download = trabajo.nombre_archivo || ''
+  document.body.appendChild(a)
+  a.click()
+  document.body.removeChild(a)
+  return trabajo
+}